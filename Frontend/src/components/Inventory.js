@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import axios from 'axios';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, CartesianGrid, ResponsiveContainer } from 'recharts';
 import '../Css/Inventory.css'; // Include the CSS file for styling
+import { fromTable } from '../tableShape';
 
 const Inventory = () => {
   const [products, setProducts] = useState([]);
@@ -10,25 +11,17 @@ const Inventory = () => {
   const [rebateItems, setRebateItems] = useState([]);
 
   useEffect(() => {
-    // Fetch all products
-    axios.get('http://localhost:3001/inventory/products')
-      .then(response => setProducts(response.data))
-      .catch(error => console.error('Failed to fetch products:', error));
-
-    // Fetch bar chart data
-    axios.get('http://localhost:3001/inventory/products/bar-chart')
-      .then(response => setChartData(response.data))
-      .catch(error => console.error('Error fetching chart data:', error));
-
-    // Fetch discounted products
-    axios.get('http://localhost:3001/inventory/products/sale')
-      .then(response => setDiscountedProducts(response.data))
-      .catch(error => console.error('Error fetching discounted products:', error));
-
-    // Fetch rebate products
-    axios.get('http://localhost:3001/inventory/products/rebates')
-      .then(response => setRebateItems(response.data))
-      .catch(error => console.error('Error fetching rebate items:', error));
+    // One scan for the whole page; the chart and the sale/rebate lists are
+    // cut from the same rows
+    axios.get('http://localhost:3001/inventory/query?fields=name,price,stock,discount,rebate&shape=table')
+      .then(response => {
+        const rows = fromTable(response.data);
+        setProducts(rows);
+        setChartData(rows.map(({ name, stock }) => ({ name, stock })));
+        setDiscountedProducts(rows.filter(row => row.discount !== null));
+        setRebateItems(rows.filter(row => row.rebate !== null));
+      })
+      .catch(error => console.error('Failed to fetch inventory:', error));
   }, []);
 
   return (
@@ -22,6 +22,7 @@ const LoginForm = () => {
           const userName = response.data.name;
 
           // Storing user data in localStorage
+          localStorage.setItem('sessionToken', response.data.token);  // Sent as a Bearer token
           localStorage.setItem('userId', response.data.id);  // Storing user ID
           localStorage.setItem('userRole', userRole);  // Storing user role
           localStorage.setItem('userEmail', userEmail);  // Storing user email
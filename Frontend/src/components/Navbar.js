@@ -45,6 +45,14 @@ const Navbar = () => {
   };
 
   const handleLogout = () => {
+    // The request interceptor runs after the token below is removed, so pass it here
+    const token = localStorage.getItem('sessionToken');
+    if (token) {
+      axios.post('http://localhost:3001/logout', null, {
+        headers: { Authorization: `Bearer ${token}` },
+      }).catch(() => {});
+    }
+    localStorage.removeItem('sessionToken');
     localStorage.removeItem('userId');
     localStorage.removeItem('userName');
     localStorage.removeItem('userRole');
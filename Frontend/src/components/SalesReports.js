@@ -10,6 +10,8 @@ import {
   ResponsiveContainer,
 } from "recharts";
 import "../Css/SalesReport.css"; // New CSS file for modern design
+import { fromTable } from "../tableShape";
+import { subscribeLive, applyDailySalesDeltas } from "../liveUpdates";
 
 const SalesReport = () => {
   const [soldItems, setSoldItems] = useState([]);
@@ -27,55 +29,49 @@ const SalesReport = () => {
   const [seasonalSalesData, setSeasonalSalesData] = useState([]);
   const [purchaseFrequencyData, setPurchaseFrequencyData] = useState([]);
 
+  // Daily sales follow order changes live; the token goes in the URL
+  // because EventSource cannot send an Authorization header
   useEffect(() => {
-    // Fetch all sold products
-    axios
-      .get("http://localhost:3001/sales-report/products-sold")
-      .then((response) => {
-        setSoldItems(response.data);
-      })
-      .catch((error) => {
-        console.error("Error fetching sold products:", error);
-      });
-
-    // Fetch sales data for the bar chart
-    axios
-      .get("http://localhost:3001/sales-report/products-sales-chart")
-      .then((response) => {
-        setChartData(response.data);
-      })
-      .catch((error) => {
-        console.error("Error fetching sales chart data:", error);
-      });
-
-    // Fetch daily sales transactions
-    axios
-      .get("http://localhost:3001/sales-report/daily-sales")
-      .then((response) => {
-        setDailyTransactions(response.data);
-      })
-      .catch((error) => {
-        console.error("Error fetching daily transactions:", error);
-      });
+    const token = encodeURIComponent(localStorage.getItem("sessionToken") || "");
+    return subscribeLive(`/live/sales?token=${token}`, (delta) => {
+      if (delta.daily_sales) {
+        setDailyTransactions((rows) => applyDailySalesDeltas(rows, delta.daily_sales));
+      }
+    }, () => {
+      axios
+        .get("http://localhost:3001/sales-report/daily-sales?shape=table")
+        .then((response) => setDailyTransactions(fromTable(response.data)))
+        .catch((error) => console.error("Error fetching daily transactions:", error));
+    });
+  }, []);
 
-    // Fetch top customers data
+  useEffect(() => {
+    // The sales report tables and charts come back from one batched request
+    const reportSetters = [
+      ["/sales-report/products-sold", setSoldItems, "sold products"],
+      ["/sales-report/products-sales-chart?shape=table", (data) => setChartData(fromTable(data)), "sales chart data"],
+      ["/sales-report/daily-sales?shape=table", (data) => setDailyTransactions(fromTable(data)), "daily transactions"],
+      ["/sales-report/top-customers", setTopCustomers, "top customers"],
+      // Customers who haven't placed an order in the last 30 days
+      ["/customers/inactive", setInactiveCustomers, "inactive customers"],
+    ];
     axios
-      .get("http://localhost:3001/sales-report/top-customers")
-      .then((response) => {
-        setTopCustomers(response.data);
+      .post("http://localhost:3001/batch", {
+        requests: reportSetters.map(([path]) => path),
+        parallel: true,
       })
-      .catch((error) => {
-        console.error("Error fetching top customers:", error);
-      });
-
-    // Fetch customers who haven't placed an order in the last 30 days
-    axios
-      .get("http://localhost:3001/customers/inactive")
       .then((response) => {
-        setInactiveCustomers(response.data);
+        response.data.responses.forEach(({ status, body }, i) => {
+          const [, setter, label] = reportSetters[i];
+          if (status === 200) {
+            setter(body);
+          } else {
+            console.error(`Error fetching ${label}:`, body);
+          }
+        });
       })
       .catch((error) => {
-        console.error("Error fetching inactive customers:", error);
+        console.error("Error fetching sales reports:", error);
       });
 
     //Retention rate of 2 days interval
@@ -126,8 +122,8 @@ const SalesReport = () => {
 
     const fetchSeasonalSalesData = async () => {
       try {
-        const response = await axios.get('http://localhost:3001/analytics/seasonal-sales-analysis');
-        setSeasonalSalesData(response.data);
+        const response = await axios.get('http://localhost:3001/analytics/seasonal-sales-analysis?shape=table');
+        setSeasonalSalesData(fromTable(response.data));
       } catch (err) {
         console.error('Error fetching seasonal sales data:', err);
         setError('Failed to fetch seasonal sales data');
@@ -137,8 +133,8 @@ const SalesReport = () => {
 
     const fetchPurchaseFrequencyData = async () => {
       try {
-        const response = await axios.get("http://localhost:3001/analytics/purchase-frequency");
-        setPurchaseFrequencyData(response.data);
+        const response = await axios.get("http://localhost:3001/analytics/purchase-frequency?shape=table");
+        setPurchaseFrequencyData(fromTable(response.data));
       } catch (err) {
         console.error("Error fetching purchase frequency data:", err);
         setError("Failed to fetch purchase frequency data");
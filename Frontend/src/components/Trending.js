@@ -1,8 +1,9 @@
-import React, { useEffect, useState } from 'react';
+import React, { useEffect, useRef, useState } from 'react';
 import { BarChart, Bar, XAxis, YAxis, Tooltip, CartesianGrid, ResponsiveContainer } from 'recharts';
 import { PieChart, Pie, Cell, Tooltip as PieTooltip } from 'recharts';
 import '../Css/Trending.css'; 
 import axios from 'axios';
+import { subscribeLive, applyTopDeltas } from '../liveUpdates';
 
 const COLOR_PALETTE = ['#0088FE', '#00C49F', '#FFBB28', '#FF8042', '#FF3333'];
 
@@ -65,6 +66,43 @@ const Trending = () => {
     fetchTrendingInfo();
   }, []);
 
+  // Keep the location and most-sold charts current from /live/trending
+  const zipCodeRef = useRef([]);
+  const soldProductsRef = useRef([]);
+  zipCodeRef.current = zipCodeData;
+  soldProductsRef.current = soldProductsData;
+
+  useEffect(() => {
+    const fetchZipCodes = () => axios.get('http://localhost:3001/trending/top-zipcodes')
+      .then((response) => setZipCodeData(response.data))
+      .catch((error) => console.error('Error fetching top zip codes:', error));
+    const fetchMostSold = () => axios.get('http://localhost:3001/trending/most-sold')
+      .then((response) => setSoldProductsData(response.data))
+      .catch((error) => console.error('Error fetching most sold products:', error));
+
+    return subscribeLive('/live/trending', (delta) => {
+      if (delta.top_zipcodes) {
+        const next = applyTopDeltas(zipCodeRef.current, delta.top_zipcodes, 'store_location', 'totalOrders');
+        if (next) {
+          setZipCodeData(next);
+        } else {
+          fetchZipCodes();
+        }
+      }
+      if (delta.most_sold) {
+        const next = applyTopDeltas(soldProductsRef.current, delta.most_sold, 'orderName', 'totalSold');
+        if (next) {
+          setSoldProductsData(next);
+        } else {
+          fetchMostSold();
+        }
+      }
+    }, () => {
+      fetchZipCodes();
+      fetchMostSold();
+    });
+  }, []);
+
   // Data for the Pie Chart (Most Sold Products)
   const pieChartData = soldProductsData.map((product) => ({
     name: product.orderName,
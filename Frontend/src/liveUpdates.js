@@ -0,0 +1,36 @@
+// Subscribe to a /live/* server-sent event channel. onDelta gets each delta
+// payload; onResync is called when the stream missed events and the data
+// should be fetched again. Returns a function that closes the stream.
+export const subscribeLive = (path, onDelta, onResync) => {
+  const source = new EventSource(`http://localhost:3001${path}`);
+  source.addEventListener('delta', (event) => onDelta(JSON.parse(event.data)));
+  source.addEventListener('resync', onResync);
+  return () => source.close();
+};
+
+// Apply count deltas to a top-N list. Returns null when the list has to be
+// fetched again: an entry outside it may have moved in, or one in it may have
+// dropped below the next one.
+export const applyTopDeltas = (rows, deltas, keyField, countField) => {
+  const next = rows.map((row) => ({ ...row }));
+  for (const delta of deltas) {
+    const row = next.find((candidate) => candidate[keyField] === delta[keyField]);
+    if (!row || delta[countField] < 0) {
+      return null;
+    }
+    row[countField] = Number(row[countField]) + delta[countField];
+  }
+  return next.sort((a, b) => b[countField] - a[countField]);
+};
+
+// Apply daily sales deltas to the /sales-report/daily-sales rows (newest first)
+export const applyDailySalesDeltas = (rows, deltas) => {
+  const byDate = new Map(rows.map((row) => [row.date, Number(row.total_sales)]));
+  for (const { date, total_sales } of deltas) {
+    byDate.set(date, (byDate.get(date) || 0) + Number(total_sales));
+  }
+  return [...byDate]
+    .filter(([, total]) => total > 0.005)
+    .map(([date, total]) => ({ date, total_sales: total.toFixed(2) }))
+    .sort((a, b) => new Date(b.date) - new Date(a.date));
+};
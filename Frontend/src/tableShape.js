@@ -0,0 +1,3 @@
+// Turn a ?shape=table response ({columns, rows}) back into row objects
+export const fromTable = ({ columns, rows }) =>
+  rows.map((row) => Object.fromEntries(columns.map((column, i) => [column, row[i]])));
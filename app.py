@@ -1,35 +1,604 @@
-from flask import Flask, request, jsonify
-import mysql.connector
+from flask import Flask, request, jsonify, Response, stream_with_context, g, has_request_context
 from mysql.connector import Error
 from flask_cors import CORS
+from werkzeug.exceptions import HTTPException
 import os
-from dotenv import load_dotenv
+import sys
+import signal
+import atexit
+import hashlib
+from functools import wraps
 from datetime import datetime
-
-# Load environment variables from .env
-load_dotenv()
+from decimal import Decimal
+from config import db_config
+from db_pool import ConnectionPool
+from catalog_cache import CatalogCache
+from typeahead import TypeaheadIndex
+from result_cache import ResultCache
+from sessions import SessionStore, PasswordHasher, Principal
+from write_behind import WriteBehindQueue
+import sales_rollups
+import cross_sell
+import reservations
+import metrics
+import queries
+import inventory_query
+import serialization
+import batch
+import compression
+import live_updates
+import snapshots
+import db_routing
+import cohorts
 
 app = Flask(__name__)
-CORS(app)
-
-# Database connection configuration
-db_config = {
-    'host': 'localhost',
-    'user': 'root',
-    'password': 'rishabh',  # Replace with your MySQL root password
-    'database': 'project'
-}
-
-# Connect to the MySQL database
+CORS(app, expose_headers=['X-Next-After-Id', 'X-Computed-At'])
+metrics.init_app(app)
+
+# gzip/brotli for response bodies of at least COMPRESS_MIN_SIZE bytes
+compressor = compression.Compressor(
+    min_size=int(os.getenv('COMPRESS_MIN_SIZE', 1024)),
+    gzip_level=int(os.getenv('COMPRESS_LEVEL', 6)),
+    brotli_quality=int(os.getenv('BROTLI_QUALITY', 5)),
+)
+compressor.init_app(app)
+
+# Shared connection pool; connection.close() in the routes returns the
+# connection to the pool instead of closing the socket
+db_pool = ConnectionPool(
+    db_config,
+    size=int(os.getenv('DB_POOL_SIZE', 10)),
+    timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+    recycle=int(os.getenv('DB_POOL_RECYCLE', 3600)),
+    ping_after=int(os.getenv('DB_POOL_PING_AFTER', 30)),
+    on_wait=lambda seconds: metrics.POOL_WAIT.observe(seconds, 'primary'),
+    wrap_cursor=metrics.TimedCursor,
+)
+
+# Read replicas for the routes tagged @read_only: MYSQL_REPLICAS=host[:port],...
+# They use the primary's user, password and database unless
+# MYSQL_REPLICA_USER / MYSQL_REPLICA_PASSWORD are set.
+def replica_pool(endpoint):
+    host, _, port = endpoint.partition(':')
+    config = dict(
+        db_config,
+        host=host,
+        user=os.getenv('MYSQL_REPLICA_USER', db_config['user']),
+        password=os.getenv('MYSQL_REPLICA_PASSWORD', db_config['password']),
+        connection_timeout=int(os.getenv('REPLICA_CONNECT_TIMEOUT', 2)),
+    )
+    if port:
+        config['port'] = int(port)
+    return db_routing.Replica(endpoint, ConnectionPool(
+        config,
+        size=int(os.getenv('DB_REPLICA_POOL_SIZE', os.getenv('DB_POOL_SIZE', 10))),
+        timeout=float(os.getenv('DB_POOL_TIMEOUT', 5)),
+        recycle=int(os.getenv('DB_POOL_RECYCLE', 3600)),
+        ping_after=int(os.getenv('DB_POOL_PING_AFTER', 30)),
+        on_wait=lambda seconds: metrics.POOL_WAIT.observe(seconds, endpoint),
+        wrap_cursor=metrics.TimedCursor,
+    ))
+
+# Reads fall back to the primary while a replica is down or more than
+# REPLICA_MAX_LAG seconds behind (see db_routing.py)
+db_router = db_routing.ReadRouter(
+    db_pool,
+    [replica_pool(endpoint.strip()) for endpoint in os.getenv('MYSQL_REPLICAS', '').split(',') if endpoint.strip()],
+    max_lag=float(os.getenv('REPLICA_MAX_LAG', 5)),
+    check_interval=float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5)),
+    retry_after=float(os.getenv('REPLICA_RETRY_AFTER', 10)),
+    sticky=float(os.environ['REPLICA_STICKY']) if os.getenv('REPLICA_STICKY') else None,
+)
+
+# Tag a route read-only: its queries may go to a replica. Untagged routes
+# are read-write and use the primary; so do the catalog-cached routes, so
+# that a refill after an invalidation never caches a lagging replica's rows.
+def read_only(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_only = True
+        return view(*args, **kwargs)
+    wrapper.read_only = True
+    return wrapper
+
+# Users whose recent writes this request should see: the session's user
+# and a user_id in the path or query string
+def request_users():
+    principal = g.get('principal')
+    return (principal.user_id if principal else None,
+            (request.view_args or {}).get('user_id'),
+            request.args.get('user_id'))
+
+# Borrow a connection from the MySQL pools: a replica for read-only routes,
+# else the primary (or, inside POST /batch, the connection the batch shares
+# between its sub-requests)
 def get_db_connection():
+    shared = batch.current_connection()
+    if shared is not None:
+        return shared
     try:
-        connection = mysql.connector.connect(**db_config)
-        if connection.is_connected():
-            return connection
+        if has_request_context() and g.get('db_read_only'):
+            return db_router.get_connection(read_only=True, keys=request_users())
+        return db_pool.get_connection()
     except Error as e:
         print(f"Error connecting to MySQL: {e}")
         return None
 
+# The primary, for work that must not read stale data or that writes
+# (background loaders and jobs started from read-only routes)
+def get_primary_connection():
+    try:
+        return db_pool.get_connection()
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
+
+# After a signed-in user's write, send their reads to the primary for a while
+@app.after_request
+def note_user_write(response):
+    if request.method not in ('GET', 'HEAD', 'OPTIONS') and response.status_code < 400:
+        principal = g.get('principal')
+        if principal is not None:
+            db_router.note_write(principal.user_id)
+    return response
+
+# Connection pool counters (wait time, saturation, recycling)
+@app.route('/pool-stats', methods=['GET'])
+def get_pool_stats():
+    return jsonify(db_pool.stats()), 200
+
+# Replica routing: per-replica health and lag, replica reads and fallbacks
+@app.route('/replica-stats', methods=['GET'])
+def get_replica_stats():
+    return jsonify(db_router.stats()), 200
+
+# Session tokens issued by /login. Role-gated routes authorize from this
+# in-memory store instead of reading the users table on every call.
+session_store = SessionStore(
+    ttl=int(os.getenv('SESSION_TTL', 8 * 3600)),
+    max_entries=int(os.getenv('SESSION_MAX_ENTRIES', 100000)),
+)
+password_hasher = PasswordHasher(
+    workers=int(os.getenv('BCRYPT_WORKERS', 4)),
+    rounds=int(os.getenv('BCRYPT_ROUNDS', 10)),
+)
+
+def bearer_token():
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    return token.strip() if scheme.lower() == 'bearer' and token.strip() else None
+
+# Require a valid session whose role is one of `roles` (any role when empty);
+# the principal is available to the view as g.principal
+def require_role(*roles):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            token = bearer_token()
+            principal = session_store.get(token) if token else None
+            if principal is None:
+                return jsonify({"message": "Authentication required"}), 401
+            if roles and principal.role not in roles:
+                return jsonify({"message": "Forbidden"}), 403
+            g.principal = principal
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Roles allowed to read the sales reports
+REPORT_ROLES = ('storeManager', 'salesman')
+
+# In-process cache of serialized catalog responses, invalidated by the
+# product write routes and by /place-order (stock changes)
+catalog_cache = CatalogCache(
+    max_entries=int(os.getenv('CATALOG_CACHE_ENTRIES', 256)),
+    max_bytes=int(os.getenv('CATALOG_CACHE_BYTES', 16 * 1024 * 1024)),
+)
+
+# Run a read query on a pooled connection and return all rows as dicts
+def fetch_all(query, params=()):
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(query, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+        connection.close()
+
+# Respond with `data` in the format (Accept) and shape (?shape=) the client
+# asked for; see serialization.py
+def send(data, status=200):
+    mimetype, shape = serialization.negotiate(request)
+    response = Response(serialization.encode(data, mimetype, shape), status=status, mimetype=mimetype)
+    response.vary.add('Accept')
+    return response
+
+# Serve `key` from the catalog cache, calling `load` on a miss. Each format
+# and shape is cached separately, and the compressed body is kept next to it
+# so a repeat hit is sent without compressing again. The response carries an
+# ETag (one per encoding) so browsers can revalidate with If-None-Match and
+# get a 304.
+# Returns None when `load` finds nothing.
+def cached_response(key, load):
+    mimetype, shape = serialization.negotiate(request)
+    key = key + (mimetype, shape)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        generation = catalog_cache.generation
+        data = load()
+        if data is None:
+            return None
+        body = serialization.encode(data, mimetype, shape)
+        etag = hashlib.md5(body).hexdigest()
+        catalog_cache.put(key, body, etag, generation)
+        variants = {}
+    else:
+        body, etag, variants = entry
+
+    response = Response(body, mimetype=mimetype)
+    response.vary.add('Accept')
+    response.vary.add('Accept-Encoding')
+    encoding = compressor.choose(mimetype, len(body))
+    if encoding is not None:
+        compressed = variants.get(encoding)
+        from_cache = compressed is not None
+        if not from_cache:
+            compressed = compressor.compress(body, encoding)
+            catalog_cache.put_variant(key, etag, encoding, compressed)
+        if len(compressed) < len(body):
+            compressor.record(len(body), len(compressed), from_cache)
+            compressor.apply(response, compressed, encoding)
+            etag = f"{etag}-{encoding}"
+    response.set_etag(etag)
+    return response.make_conditional(request)
+
+# In-memory product name index behind /autocomplete, kept in sync by the
+# product write routes and /place-order (popularity)
+typeahead_index = TypeaheadIndex()
+
+def load_typeahead_index():
+    products = fetch_all("SELECT id, name FROM products")
+    sold = fetch_all("""
+        SELECT product_id, SUM(quantity) AS units
+        FROM orders
+        GROUP BY product_id
+    """)
+    typeahead_index.build(
+        [(row['id'], row['name']) for row in products],
+        {row['product_id']: int(row['units'] or 0) for row in sold}
+    )
+
+# Catalog cache counters (hits, misses, evictions)
+@app.route('/catalog-cache-stats', methods=['GET'])
+def get_catalog_cache_stats():
+    return jsonify(catalog_cache.stats()), 200
+
+metrics.register(metrics.Gauge(
+    'db_pool_connections', "Pool state and counters (open, in_use, idle, timeouts, ...)", ('pool', 'stat'),
+    lambda: dict(
+        [(('primary', key), value) for key, value in db_pool.stats().items()]
+        + [((replica.name, key), value) for replica in db_router.replicas for key, value in replica.pool.stats().items()]
+    )
+))
+metrics.register(metrics.Gauge(
+    'db_routing', "Replica reads, read-your-writes and fallbacks to the primary", ('stat',),
+    lambda: {(key,): value for key, value in db_router.stats().items() if key != 'replicas'}
+))
+metrics.register(metrics.Gauge(
+    'catalog_cache', "Catalog cache state and counters", ('stat',),
+    lambda: {(key,): value for key, value in catalog_cache.stats().items()}
+))
+
+# Compression counters (responses compressed, bytes saved, time spent)
+@app.route('/compression-stats', methods=['GET'])
+def get_compression_stats():
+    return jsonify(compressor.stats()), 200
+
+metrics.register(compression.COMPRESSION_DURATION)
+metrics.register(metrics.Gauge(
+    'compression', "Response compression counters (bytes_in, bytes_out, bytes_saved, seconds, ...)", ('stat',),
+    lambda: {(key,): value for key, value in compressor.stats().items()}
+))
+
+# Results of the heavy /analytics/* queries, with single-flight loading and
+# stale-while-revalidate
+analytics_cache = ResultCache(
+    ttl=float(os.getenv('ANALYTICS_CACHE_TTL', 60)),
+    stale_ttl=float(os.getenv('ANALYTICS_CACHE_STALE', 300)),
+)
+
+# Analytics cache counters, and purge (all entries or ?key=<endpoint name>)
+@app.route('/analytics/cache', methods=['GET'])
+def get_analytics_cache_stats():
+    return jsonify(analytics_cache.stats()), 200
+
+@app.route('/analytics/cache', methods=['DELETE'])
+@require_role('storeManager')
+def purge_analytics_cache():
+    dropped = analytics_cache.purge(request.args.get('key'))
+    return jsonify({"message": "Analytics cache purged", "purged": dropped}), 200
+
+metrics.register(metrics.Gauge(
+    'analytics_cache', "Analytics result cache state and counters", ('stat',),
+    lambda: {(key,): value for key, value in analytics_cache.stats().items()}
+))
+
+# Seasonal sales and customer lifetime value are recomputed in the background
+# every SNAPSHOT_INTERVAL seconds (see snapshots.py); their endpoints serve the
+# latest snapshot
+snapshot_scheduler = snapshots.SnapshotScheduler(
+    get_db_connection,
+    snapshots.default_jobs(),
+    interval=float(os.getenv('SNAPSHOT_INTERVAL', 300)),
+    jitter=float(os.getenv('SNAPSHOT_JITTER', 0.1)),
+    workers=int(os.getenv('SNAPSHOT_WORKERS', 2)),
+)
+atexit.register(snapshot_scheduler.close)
+
+# Per-customer order-day bitmaps behind the retention and cohort reports
+# (see cohorts.py), kept in sync by /place-order and the order deletes
+cohort_index = cohorts.CohortIndex(
+    get_primary_connection,
+    max_age=float(os.getenv('COHORT_MAX_AGE', 300)),
+)
+COHORT_MAX_WINDOW = 366
+
+# Cohort index size and reloads
+@app.route('/cohort-stats', methods=['GET'])
+def get_cohort_stats():
+    return jsonify(cohort_index.stats()), 200
+
+metrics.register(metrics.Gauge(
+    'cohort_index', "Customer activity bitmap index state and counters", ('stat',),
+    lambda: {(key,): value for key, value in cohort_index.stats().items() if value is not None}
+))
+
+# Started by the first request, so it runs in the process that serves
+# requests and not in the debug reloader's parent
+@app.before_request
+def start_snapshot_scheduler():
+    snapshot_scheduler.start()
+
+# ANALYTICS_ENGINE=columnar serves the order reports below from an in-memory
+# NumPy copy of orders, users and products (see columnar.py; needs numpy)
+if os.getenv('ANALYTICS_ENGINE', 'sql') == 'columnar':
+    import columnar
+    analytics_engine = columnar.ColumnarEngine(get_primary_connection)
+else:
+    analytics_engine = None
+
+# Answer a report route from analytics_engine.<method>() when it is enabled
+def served_by_engine(method, label):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if analytics_engine is None:
+                return view(*args, **kwargs)
+            try:
+                return send(getattr(analytics_engine, method)())
+            except Error as e:
+                print(f"Error {label}: {e}")
+                return jsonify({"message": f"Error {label}", "error": str(e)}), 500
+        return wrapper
+    return decorator
+
+# Columnar engine state (orders held, appends, deletes, load time)
+@app.route('/analytics/engine-stats', methods=['GET'])
+def get_analytics_engine_stats():
+    if analytics_engine is None:
+        return jsonify({"engine": "sql"}), 200
+    return jsonify(dict(analytics_engine.stats(), engine="columnar")), 200
+
+if analytics_engine is not None:
+    metrics.register(metrics.Gauge(
+        'analytics_engine', "Columnar analytics engine state and counters", ('stat',),
+        lambda: {(key,): value for key, value in analytics_engine.stats().items()}
+    ))
+
+# Respond with a job's latest snapshot; X-Computed-At says when it was computed
+def snapshot_response(name):
+    data, computed_at = snapshot_scheduler.jobs[name].latest(get_primary_connection)
+    response = send(data)
+    response.headers['X-Computed-At'] = computed_at.isoformat()
+    return response
+
+# Snapshot job status: last run, duration, error, computed_at, next run
+@app.route('/analytics/snapshots', methods=['GET'])
+def get_snapshot_status():
+    return jsonify(snapshot_scheduler.status()), 200
+
+# Recompute a snapshot now
+@app.route('/analytics/snapshots/<name>/run', methods=['POST'])
+@require_role('storeManager')
+def run_snapshot(name):
+    if name not in snapshot_scheduler.jobs:
+        return jsonify({"message": "Unknown snapshot", "snapshots": list(snapshot_scheduler.jobs)}), 404
+    if not snapshot_scheduler.trigger(name):
+        return jsonify({"message": "Snapshot is already being computed"}), 409
+    return jsonify({"message": "Snapshot run started"}), 202
+
+# Read-only GETs a dashboard may combine into one POST /batch
+BATCH_PREFIXES = ('/sales-report/', '/trending/', '/analytics/', '/inventory/', '/customers/',
+                  '/products', '/store-locations', '/past-orders/')
+
+batch_runner = batch.BatchRunner(
+    app, db_pool.get_connection, BATCH_PREFIXES,
+    max_requests=int(os.getenv('BATCH_MAX_REQUESTS', 20)),
+    workers=int(os.getenv('BATCH_WORKERS', 4)),
+)
+
+# A batch shares a replica connection only when every sub-request's route is
+# tagged read-only and none reads a user who has just written
+def batch_connect(paths):
+    adapter = app.url_map.bind('localhost')
+    token = bearer_token()
+    principal = session_store.get(token) if token else None
+    users = [principal.user_id if principal else None]
+    for path in paths:
+        try:
+            endpoint, view_args = adapter.match(path.partition('?')[0], method='GET')
+        except HTTPException:
+            return None
+        if not getattr(app.view_functions[endpoint], 'read_only', False):
+            return None
+        users.append(view_args.get('user_id'))
+    return lambda: db_router.get_connection(read_only=True, keys=users)
+
+# API: Run several read-only GETs in one round trip.
+# Body: {"requests": ["/trending/most-sold", ...], "parallel": false}
+# Returns {"responses": [{"path", "status", "body"}, ...]} in request order
+@app.route('/batch', methods=['POST'])
+def run_batch():
+    data = request.get_json(silent=True) or {}
+    paths = data.get('requests')
+    if not isinstance(paths, list) or not paths or not all(isinstance(path, str) for path in paths):
+        return jsonify({"message": "requests must be a non-empty list of paths"}), 400
+    if len(paths) > batch_runner.max_requests:
+        return jsonify({"message": f"At most {batch_runner.max_requests} requests per batch"}), 400
+
+    # Sub-requests answer in JSON; the batch itself follows the client's Accept
+    headers = {'Accept': serialization.JSON}
+    if request.headers.get('Authorization'):
+        headers['Authorization'] = request.headers['Authorization']
+    return send({"responses": batch_runner.run(paths, headers, parallel=bool(data.get('parallel')),
+                                               connect=batch_connect(paths))})
+
+# CustomerOrder audit rows are written behind the checkout transaction:
+# /place-order spools them locally and a background thread inserts them in
+# batches. Unflushed rows are drained at shutdown or replayed on next start.
+# Each process spools into its own directory under AUDIT_SPOOL_DIR.
+audit_queue = WriteBehindQueue(
+    'customer_order',
+    """
+        INSERT INTO CustomerOrder (userName, orderName, orderPrice, userAddress, creditCardNo)
+        VALUES (%s, %s, %s, %s, %s)
+    """,
+    get_db_connection,
+    spool_dir=os.getenv('AUDIT_SPOOL_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool',
+                                                        db_config['database'])),
+    batch_size=int(os.getenv('AUDIT_BATCH_SIZE', 500)),
+    flush_interval=float(os.getenv('AUDIT_FLUSH_INTERVAL', 1.0)),
+    max_pending=int(os.getenv('AUDIT_MAX_PENDING', 10000)),
+    fsync=os.getenv('AUDIT_FSYNC', '1') != '0',
+)
+atexit.register(audit_queue.close)
+
+# How long /place-order waits for room in a full audit queue before shedding load
+AUDIT_PUT_TIMEOUT = float(os.getenv('AUDIT_PUT_TIMEOUT', 2))
+
+# Audit queue counters (pending, flushed, batches, flush errors)
+@app.route('/audit-queue-stats', methods=['GET'])
+def get_audit_queue_stats():
+    return jsonify(audit_queue.stats()), 200
+
+metrics.register(metrics.Gauge(
+    'audit_queue', "CustomerOrder write-behind queue state and counters", ('stat',),
+    lambda: {(key,): value for key, value in audit_queue.stats().items()}
+))
+
+# Stock is reserved from sharded counters (see reservations.py); products.stock
+# and the cached catalog catch up once per RESERVATION_SYNC_INTERVAL
+RESERVATION_TTL = int(os.getenv('RESERVATION_TTL', 600))
+
+stock_syncer = reservations.StockSyncer(
+    get_db_connection,
+    interval=float(os.getenv('RESERVATION_SYNC_INTERVAL', 1.0)),
+    reap_interval=float(os.getenv('RESERVATION_REAP_INTERVAL', 10.0)),
+    on_sync=lambda product_ids: catalog_cache.invalidate(*product_ids),
+)
+
+# Stock sync counters (syncs, products synced, expired holds reaped)
+@app.route('/reservation-stats', methods=['GET'])
+def get_reservation_stats():
+    return jsonify(stock_syncer.stats()), 200
+
+metrics.register(metrics.Gauge(
+    'stock_sync', "Stock reservation sync state and counters", ('stat',),
+    lambda: {(key,): value for key, value in stock_syncer.stats().items()}
+))
+
+# Live dashboard channels (server-sent events). The order routes push what
+# each change did to /trending/top-zipcodes and /trending/most-sold on
+# /live/trending, and to /sales-report/daily-sales on /live/sales.
+def live_channel(name):
+    channel = live_updates.Broadcaster(
+        name,
+        backlog=int(os.getenv('LIVE_BACKLOG', 256)),
+        heartbeat=float(os.getenv('LIVE_HEARTBEAT', 15)),
+        max_subscribers=int(os.getenv('LIVE_MAX_SUBSCRIBERS', 1000)),
+    )
+    atexit.register(channel.close)
+    return channel
+
+live_trending = live_channel('trending')
+live_sales = live_channel('sales')
+
+# Push order count and sales changes to the live dashboards: `locations` and
+# `sold` map a store location or product name to a change in its order
+# count, `sales` maps a sale date to a change in its total sales
+def publish_order_deltas(locations=None, sold=None, sales=None):
+    locations = {location: n for location, n in (locations or {}).items() if location is not None and n}
+    sold = {name: n for name, n in (sold or {}).items() if n}
+    sales = {sale_date: total for sale_date, total in (sales or {}).items() if total}
+    trending = {}
+    if locations:
+        trending["top_zipcodes"] = [{"store_location": location, "totalOrders": n}
+                                    for location, n in locations.items()]
+    if sold:
+        trending["most_sold"] = [{"orderName": name, "totalSold": n} for name, n in sold.items()]
+    if trending:
+        live_trending.publish('delta', trending)
+    if sales:
+        live_sales.publish('delta', {"daily_sales": [{"date": sale_date, "total_sales": total}
+                                                     for sale_date, total in sales.items()]})
+
+def live_response(channel):
+    last_id = request.headers.get('Last-Event-ID', '')
+    try:
+        stream = channel.subscribe(int(last_id) if last_id.isdigit() else None)
+    except live_updates.TooManySubscribers:
+        return jsonify({"message": "Too many live subscribers, please retry"}), 503
+    response = Response(stream, mimetype='text/event-stream')
+    # Frees the subscriber slot even if the stream is never sent
+    response.call_on_close(stream.close)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# API: Live deltas for the trending page
+@app.route('/live/trending', methods=['GET'])
+def live_trending_updates():
+    return live_response(live_trending)
+
+# API: Live deltas for the sales report. EventSource cannot set headers, so
+# the session token may also come as ?token=
+@app.route('/live/sales', methods=['GET'])
+def live_sales_updates():
+    token = bearer_token() or request.args.get('token')
+    principal = session_store.get(token) if token else None
+    if principal is None:
+        return jsonify({"message": "Authentication required"}), 401
+    if principal.role not in REPORT_ROLES:
+        return jsonify({"message": "Forbidden"}), 403
+    return live_response(live_sales)
+
+# Live channel counters (subscribers, events published, resyncs)
+@app.route('/live-stats', methods=['GET'])
+def get_live_stats():
+    return jsonify({"trending": live_trending.stats(), "sales": live_sales.stats()}), 200
+
+metrics.register(metrics.Gauge(
+    'live_updates', "Live dashboard channel state and counters", ('channel', 'stat'),
+    lambda: {(channel.name, key): value
+             for channel in (live_trending, live_sales) for key, value in channel.stats().items()}
+))
+
+# Prometheus scrape endpoint
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 # Endpoint to register a new user
 @app.route('/signup', methods=['POST'])
 def signup():
@@ -42,12 +611,15 @@ def signup():
     if not all([name, email, password, role]):
         return jsonify({"message": "All fields are required"}), 400
 
+    # Hash before borrowing a connection; bcrypt takes tens of milliseconds
+    password_hash = password_hasher.hash(password)
+
     query = "INSERT INTO users (name, email, password, role) VALUES (%s, %s, %s, %s)"
     connection = get_db_connection()
     cursor = connection.cursor()
 
     try:
-        cursor.execute(query, (name, email, password, role))
+        cursor.execute(query, (name, email, password_hash, role))
         connection.commit()
         return jsonify({"message": "User registered successfully"}), 200
     except Error as e:
@@ -57,7 +629,7 @@ def signup():
         cursor.close()
         connection.close()
 
-# Endpoint to log in a user
+# Endpoint to log in a user; returns a session token for the Authorization header
 @app.route('/login', methods=['POST'])
 def login():
     data = request.get_json()
@@ -67,59 +639,90 @@ def login():
     if not all([email, password]):
         return jsonify({"message": "Email and password are required"}), 400
 
-    query = "SELECT * FROM users WHERE email = %s"
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
     try:
-        cursor.execute(query, (email,))
-        user = cursor.fetchone()
-
-        if not user or user['password'] != password:
-            return jsonify({"message": "Invalid email or password"}), 401
-
-        return jsonify({
-            "message": "Login successful",
-            "id": user['id'],
-            "role": user['role'],
-            "email": user['email'],
-            "name": user['name']
-        }), 200
+        rows = fetch_all(queries.LOGIN_QUERY, (email,))
     except Error as e:
         print(f"Error logging in user: {e}")
         return jsonify({"message": "Internal server error", "error": str(e)}), 500
+
+    # The connection is back in the pool before the password check runs
+    user = rows[0] if rows else None
+    if not user or not password_hasher.verify(password, user['password']):
+        return jsonify({"message": "Invalid email or password"}), 401
+
+    if password_hasher.needs_rehash(user['password']):
+        upgrade_password_hash(user['id'], user['password'], password)
+
+    principal = Principal(user['id'], user['email'], user['name'], user['role'])
+    return jsonify({
+        "message": "Login successful",
+        "token": session_store.issue(principal),
+        "id": user['id'],
+        "role": user['role'],
+        "email": user['email'],
+        "name": user['name']
+    }), 200
+
+# Replace a legacy plaintext password with its bcrypt hash after a successful login
+def upgrade_password_hash(user_id, stored, password):
+    password_hash = password_hasher.hash(password)
+    connection = get_db_connection()
+    cursor = connection.cursor()
+    try:
+        cursor.execute("UPDATE users SET password = %s WHERE id = %s AND password = %s",
+                       (password_hash, user_id, stored))
+        connection.commit()
+    except Error as e:
+        print(f"Error upgrading password hash: {e}")
     finally:
         cursor.close()
         connection.close()
 
+# End the current session
+@app.route('/logout', methods=['POST'])
+def logout():
+    token = bearer_token()
+    if not token or not session_store.revoke(token):
+        return jsonify({"message": "Not logged in"}), 401
+    return jsonify({"message": "Logged out"}), 200
+
+# Who the current session belongs to
+@app.route('/session', methods=['GET'])
+@require_role()
+def get_session():
+    return jsonify(g.principal._asdict()), 200
+
+# Session store counters (issued, hits, expirations, evictions)
+@app.route('/session-stats', methods=['GET'])
+def get_session_stats():
+    return jsonify(session_store.stats()), 200
+
+metrics.register(metrics.Gauge(
+    'sessions', "Session store state and counters", ('stat',),
+    lambda: {(key,): value for key, value in session_store.stats().items()}
+))
+
 
 # Get all products or filter by category
 @app.route('/products', methods=['GET'])
 def get_products():
     category = request.args.get('category')
-    query = "SELECT * FROM products"
+    query = queries.PRODUCTS_QUERY
     params = ()
 
     if category:
-        query += " WHERE category = %s"
+        query = queries.PRODUCTS_BY_CATEGORY_QUERY
         params = (category,)
 
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
     try:
-        cursor.execute(query, params)
-        results = cursor.fetchall()
-        return jsonify(results), 200
+        return cached_response(('products', category), lambda: fetch_all(query, params))
     except Error as e:
         print(f"Error fetching products: {e}")
         return jsonify({"message": "Error fetching products", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
 # Add a new product
 @app.route('/products', methods=['POST'])
+@require_role('storeManager')
 def add_product():
     data = request.get_json()
     required_fields = ['name', 'price', 'description', 'category', 'accessories', 'image', 'discount', 'rebate', 'warranty']
@@ -141,6 +744,8 @@ def add_product():
     try:
         cursor.execute(query, params)
         connection.commit()
+        catalog_cache.invalidate()
+        typeahead_index.add(cursor.lastrowid, data['name'])
         return jsonify({"message": "Product added successfully", "productId": cursor.lastrowid}), 201
     except Error as e:
         print(f"Error adding product: {e}")
@@ -149,8 +754,10 @@ def add_product():
         cursor.close()
         connection.close()
 
-# Update a product
+# Update a product; an optional "stock" (a count, or null to stop tracking it)
+# restocks it
 @app.route('/products/<int:id>', methods=['PUT'])
+@require_role('storeManager')
 def update_product(id):
     data = request.get_json()
     required_fields = ['name', 'price', 'description', 'category', 'accessories', 'image']
@@ -159,24 +766,39 @@ def update_product(id):
     if not all(field in data for field in required_fields):
         return jsonify({"message": "All fields are required"}), 400
 
-    query = """
+    restock = 'stock' in data
+    if restock and data['stock'] is not None and (
+            not isinstance(data['stock'], int) or isinstance(data['stock'], bool) or data['stock'] < 0):
+        return jsonify({"message": "stock must be a non-negative integer or null"}), 400
+
+    query = f"""
         UPDATE products
         SET name = %s, price = %s, description = %s, category = %s, accessories = %s, image = %s
+            {", stock = %s" if restock else ""}
         WHERE id = %s
     """
     params = (data['name'], data['price'], data['description'], data['category'],
-              data['accessories'], data['image'], id)
+              data['accessories'], data['image'], *((data['stock'],) if restock else ()), id)
 
     connection = get_db_connection()
     cursor = connection.cursor()
 
     try:
         cursor.execute(query, params)
-        connection.commit()
-
         if cursor.rowcount == 0:
+            connection.rollback()
             return jsonify({"message": "Product not found"}), 404
 
+        if restock:
+            # The sellable stock is in the shards; products.stock alone would be
+            # overwritten by the next stock sync
+            reservations.set_stock(cursor, id, data['stock'])
+        connection.commit()
+
+        catalog_cache.invalidate(id)
+        typeahead_index.add(id, data['name'])
+        if analytics_engine is not None:
+            analytics_engine.invalidate_products(id)
         return jsonify({"message": "Product updated successfully"}), 200
     except Error as e:
         print(f"Error updating product: {e}")
@@ -187,6 +809,7 @@ def update_product(id):
 
 # Delete a product
 @app.route('/products/<int:id>', methods=['DELETE'])
+@require_role('storeManager')
 def delete_product(id):
     query = "DELETE FROM products WHERE id = %s"
     connection = get_db_connection()
@@ -194,11 +817,16 @@ def delete_product(id):
 
     try:
         cursor.execute(query, (id,))
-        connection.commit()
-
         if cursor.rowcount == 0:
+            connection.rollback()
             return jsonify({"message": "Product not found"}), 404
 
+        reservations.drop_product(cursor, id)
+        connection.commit()
+        catalog_cache.invalidate(id)
+        typeahead_index.remove(id)
+        if analytics_engine is not None:
+            analytics_engine.invalidate_products(id)
         return jsonify({"message": "Product deleted successfully"}), 200
     except Error as e:
         print(f"Error deleting product: {e}")
@@ -227,55 +855,177 @@ def place_order():
         delivery_method == 'inStorePickup' and not store_location):
         return jsonify({"message": "Missing required order information"}), 400
 
-    today_date = datetime.today().strftime('%Y-%m-%d')
+    today = datetime.today().date()
+    today_date = today.strftime('%Y-%m-%d')
     order_query = """
         INSERT INTO orders (user_id, name, total_price, delivery_method, store_location, status, delivery_date, product_id, quantity, order_date)
-        VALUES (%s, %s, %s, %s, %s, 'pending', %s, %s, %s, %s)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
 
+    # Total quantity per product, so a product listed twice is checked once
+    quantities = {}
+    try:
+        for item in cart_items:
+            product_id = int(item['product_id'])
+            quantities[product_id] = quantities.get(product_id, 0) + int(item['quantity'])
+    except (KeyError, TypeError, ValueError):
+        return jsonify({"message": "Invalid cart items"}), 400
+    if any(quantity <= 0 for quantity in quantities.values()):
+        return jsonify({"message": "Invalid cart items"}), 400
+    # The audit rows and sold counts use name and price after the order has
+    # committed, when a missing one could no longer fail the request cleanly
+    if any(not isinstance(item.get('name'), str) or item.get('price') is None for item in cart_items):
+        return jsonify({"message": "Invalid cart items"}), 400
+    product_ids = list(quantities)
+
+    # Shed load while the audit queue is full rather than grow it without bound
+    try:
+        if not audit_queue.wait_for_capacity(AUDIT_PUT_TIMEOUT):
+            return jsonify({"message": "Server busy, please retry"}), 503
+    except (OSError, RuntimeError) as e:
+        print(f"Error opening audit queue: {e}")
+        return jsonify({"message": "Error placing order", "error": str(e)}), 500
+
+    # A reservation made earlier through POST /reservations, or one taken here
+    token = data.get('reservationToken')
+    own_reservation = token is None
+
     connection = get_db_connection()
     cursor = connection.cursor()
 
     try:
-        for item in cart_items:
-            # Insert each cart item into the orders table
-            cursor.execute(order_query, (
-                user_id, name, total_price, delivery_method, store_location,
-                delivery_date, item['product_id'], item['quantity'], today_date
-            ))
-            connection.commit()
-
-            # Update product stock
-            stock_update_query = "UPDATE products SET stock = stock - %s WHERE id = %s"
-            cursor.execute(stock_update_query, (item['quantity'], item['product_id']))
-            connection.commit()
-
-            # Insert into CustomerOrder table
-            customer_order_query = """
-                INSERT INTO CustomerOrder (userName, orderName, orderPrice, userAddress, creditCardNo)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            cursor.execute(customer_order_query, (
-                name, item['name'], item['price'], address, credit_card
-            ))
-            connection.commit()
+        if own_reservation:
+            token, _ = reservations.reserve(connection, quantities, RESERVATION_TTL)
+            stock_syncer.mark(*product_ids)
+
+        connection.start_transaction()
+        if reservations.confirm(cursor, token) != quantities:
+            raise reservations.ReservationInvalid("Reservation does not match the cart")
+
+        # executemany() sends each INSERT as a single multi-row statement
+        cursor.executemany(order_query, [
+            (user_id, name, total_price, delivery_method, store_location, 'pending',
+             delivery_date, item['product_id'], item['quantity'], today_date)
+            for item in cart_items
+        ])
+        # A multi-row INSERT takes consecutive ids starting at lastrowid
+        first_order_id = cursor.lastrowid
+        sales_rollups.apply_orders(cursor, [
+            (today_date, int(item['product_id']), user_id, total_price)
+            for item in cart_items
+        ])
+        cross_sell.record_basket(cursor, product_ids)
+        cohort_changes = cohorts.record_orders(cursor, [(user_id, today)])
 
+        connection.commit()
+        cohort_index.add(cohort_changes)
+        # The user's next reads (past orders, reports) go to the primary
+        db_router.note_write(user_id)
+        sold = {}
+        try:
+            audit_queue.put([
+                (name, item['name'], item['price'], address, credit_card)
+                for item in cart_items
+            ])
+            for item in cart_items:
+                sold[item['name']] = sold.get(item['name'], 0) + 1
+        except (OSError, ValueError) as e:
+            # The order is committed; a lost audit row must not fail the checkout
+            print(f"Error spooling CustomerOrder rows: {e}")
+        for product_id, quantity in quantities.items():
+            typeahead_index.record_sale(product_id, quantity)
+        if analytics_engine is not None:
+            analytics_engine.append_orders([
+                (first_order_id + i, int(user_id), int(item['product_id']), total_price, today)
+                for i, item in enumerate(cart_items)
+            ])
+        publish_order_deltas(
+            locations={store_location: len(cart_items)},
+            sold=sold,
+            sales={today: Decimal(str(total_price)) * len(cart_items)},
+        )
         return jsonify({"message": "Order placed successfully"}), 200
+    except reservations.ProductNotFound as e:
+        return jsonify({"message": e.message, "products": e.products}), 404
+    except reservations.InsufficientStock as e:
+        return jsonify({"message": e.message, "products": e.products}), 409
+    except reservations.ReservationError as e:
+        connection.rollback()
+        release_reservation(connection, token if own_reservation else None)
+        return jsonify({"message": e.message, "products": e.products}), 409
     except Error as e:
+        connection.rollback()
+        release_reservation(connection, token if own_reservation else None)
         print(f"Error placing order: {e}")
         return jsonify({"message": "Error placing order", "error": str(e)}), 500
     finally:
         cursor.close()
         connection.close()
 
+# Give a reservation's stock back now instead of when its TTL runs out
+def release_reservation(connection, token):
+    if token is None:
+        return
+    try:
+        released = reservations.release(connection, token)
+        if released:
+            stock_syncer.mark(*released)
+    except Error as e:
+        print(f"Error releasing reservation: {e}")
+
+# Hold stock for a cart while the customer checks out; pass the token to
+# /place-order as reservationToken
+@app.route('/reservations', methods=['POST'])
+def create_reservation():
+    data = request.get_json()
+    quantities = {}
+    try:
+        for item in data.get('items', []):
+            product_id = int(item['product_id'])
+            quantities[product_id] = quantities.get(product_id, 0) + int(item['quantity'])
+    except (AttributeError, KeyError, TypeError, ValueError):
+        return jsonify({"message": "Invalid items"}), 400
+    if not quantities or any(quantity <= 0 for quantity in quantities.values()):
+        return jsonify({"message": "Invalid items"}), 400
+
+    connection = get_db_connection()
+
+    try:
+        token, expires_at = reservations.reserve(connection, quantities, RESERVATION_TTL)
+        stock_syncer.mark(*quantities)
+        return jsonify({"token": token, "expiresAt": expires_at.isoformat()}), 201
+    except reservations.ProductNotFound as e:
+        return jsonify({"message": e.message, "products": e.products}), 404
+    except reservations.InsufficientStock as e:
+        return jsonify({"message": e.message, "products": e.products}), 409
+    except Error as e:
+        print(f"Error reserving stock: {e}")
+        return jsonify({"message": "Error reserving stock", "error": str(e)}), 500
+    finally:
+        connection.close()
+
+# Release a held reservation
+@app.route('/reservations/<token>', methods=['DELETE'])
+def delete_reservation(token):
+    connection = get_db_connection()
+
+    try:
+        released = reservations.release(connection, token)
+        if released is None:
+            return jsonify({"message": "Reservation not found or no longer held"}), 404
+        stock_syncer.mark(*released)
+        return jsonify({"message": "Reservation released"}), 200
+    except Error as e:
+        print(f"Error releasing reservation: {e}")
+        return jsonify({"message": "Error releasing reservation", "error": str(e)}), 500
+    finally:
+        connection.close()
+
 # Get past orders for a specific user
 @app.route('/past-orders/<int:user_id>', methods=['GET'])
+@read_only
 def get_past_orders(user_id):
-    query = """
-        SELECT id, name, total_price, delivery_method, status, delivery_date
-        FROM orders
-        WHERE user_id = %s
-    """
+    query = queries.PAST_ORDERS_QUERY
 
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
@@ -283,7 +1033,7 @@ def get_past_orders(user_id):
     try:
         cursor.execute(query, (user_id,))
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching past orders: {e}")
         return jsonify({"message": "Error fetching past orders", "error": str(e)}), 500
@@ -291,6 +1041,12 @@ def get_past_orders(user_id):
         cursor.close()
         connection.close()
 
+# store_location of an orders row already locked by lock_order_row
+def order_location(cursor, order_id):
+    cursor.execute("SELECT store_location FROM orders WHERE id = %s", (order_id,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
 # Cancel an order
 @app.route('/cancel-order/<int:order_id>', methods=['DELETE'])
 def cancel_order(order_id):
@@ -303,14 +1059,26 @@ def cancel_order(order_id):
     cursor = connection.cursor()
 
     try:
-        cursor.execute(query, (order_id,))
-        connection.commit()
+        connection.start_transaction()
+        order = sales_rollups.lock_order_row(cursor, order_id)
 
-        if cursor.rowcount == 0:
+        if order is None:
+            connection.rollback()
             return jsonify({"message": "Order not found"}), 404
 
+        location = order_location(cursor, order_id)
+        cursor.execute(query, (order_id,))
+        sales_rollups.apply_orders(cursor, [order], sign=-1)
+        cohort_changes = cohorts.refresh_users(cursor, [order[2]])
+        connection.commit()
+        cohort_index.replace(cohort_changes)
+        publish_order_deltas(locations={location: -1}, sales={order[0]: -Decimal(str(order[3] or 0))})
+        if analytics_engine is not None:
+            analytics_engine.delete_orders([order_id])
+
         return jsonify({"message": "Order deleted successfully"}), 200
     except Error as e:
+        connection.rollback()
         print(f"Error deleting order: {e}")
         return jsonify({"message": "Error deleting order", "error": str(e)}), 500
     finally:
@@ -348,18 +1116,74 @@ def add_order():
         cursor.close()
         connection.close()
 
-# Fetch all orders
+# Largest page GET /orders will return in one response
+ORDERS_MAX_PAGE = 1000
+
+# Fetch orders, oldest first. Supports keyset pagination (after_id, limit),
+# filters (status, user_id, from/to on order_date) and ?stream=1, which
+# writes rows to the response as they are read from an unbuffered cursor.
+# When a page is full, X-Next-After-Id holds the after_id of the next page.
 @app.route('/orders', methods=['GET'])
+@read_only
 def fetch_orders():
+    conditions = []
+    params = []
+
+    def int_arg(name):
+        value = request.args.get(name)
+        return int(value) if value not in (None, '') else None
+
+    try:
+        after_id = int_arg('after_id')
+        limit = int_arg('limit')
+        user_id = int_arg('user_id')
+        date_from = request.args.get('from')
+        date_to = request.args.get('to')
+        if date_from:
+            datetime.strptime(date_from, '%Y-%m-%d')
+        if date_to:
+            datetime.strptime(date_to, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({"message": "Invalid pagination or filter parameters"}), 400
+
+    if after_id is not None:
+        conditions.append("id > %s")
+        params.append(after_id)
+    if request.args.get('status'):
+        conditions.append("status = %s")
+        params.append(request.args['status'])
+    if user_id is not None:
+        conditions.append("user_id = %s")
+        params.append(user_id)
+    if date_from:
+        conditions.append("order_date >= %s")
+        params.append(date_from)
+    if date_to:
+        conditions.append("order_date < DATE_ADD(%s, INTERVAL 1 DAY)")
+        params.append(date_to)
+
     query = "SELECT * FROM orders"
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += " ORDER BY id"
+    if limit is not None:
+        limit = max(1, min(limit, ORDERS_MAX_PAGE))
+        query += " LIMIT %s"
+        params.append(limit)
+
+    if request.args.get('stream') in ('1', 'true'):
+        return stream_orders(query, params)
 
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
-        cursor.execute(query)
+        cursor.execute(query, params)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        response = send(results)
+        if limit is not None and len(results) == limit:
+            response.headers['X-Next-After-Id'] = str(results[-1]['id'])
+        return response
     except Error as e:
         print(f"Error fetching orders: {e}")
         return jsonify({"message": "Error fetching orders", "error": str(e)}), 500
@@ -367,6 +1191,43 @@ def fetch_orders():
         cursor.close()
         connection.close()
 
+# Stream a JSON array of order rows without materializing the result set
+def stream_orders(query, params, batch_size=500):
+    connection = get_db_connection()
+    cursor = connection.cursor(dictionary=True)
+
+    try:
+        cursor.execute(query, params)
+    except Error as e:
+        cursor.close()
+        connection.close()
+        print(f"Error fetching orders: {e}")
+        return jsonify({"message": "Error fetching orders", "error": str(e)}), 500
+
+    def generate():
+        try:
+            yield b'['
+            first = True
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                chunk = b','.join(serialization.dumps_json(row) for row in rows)
+                yield chunk if first else b',' + chunk
+                first = False
+            yield b']'
+        except Error as e:
+            # Headers are already sent; log and end with a truncated body
+            print(f"Error streaming orders: {e}")
+        finally:
+            try:
+                cursor.close()
+            except Error:
+                pass
+            connection.close()
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
 # Update an order
 @app.route('/orders/<int:id>', methods=['PUT'])
 def update_order(id):
@@ -389,14 +1250,32 @@ def update_order(id):
     cursor = connection.cursor()
 
     try:
+        connection.start_transaction()
+        order = sales_rollups.lock_order_row(cursor, id)
+
+        if order is None:
+            connection.rollback()
+            return jsonify({"message": "Order not found"}), 404
+
+        old_location = order_location(cursor, id)
         cursor.execute(query, (total_price, delivery_method, store_location, delivery_date, status, id))
+        # Move the order's old total out of the rollups and the new one in
+        sales_rollups.apply_orders(cursor, [order], sign=-1)
+        sales_rollups.apply_orders(cursor, [order[:3] + (total_price,)])
         connection.commit()
 
-        if cursor.rowcount == 0:
-            return jsonify({"message": "Order not found"}), 404
+        locations = {old_location: -1}
+        locations[store_location] = locations.get(store_location, 0) + 1
+        publish_order_deltas(
+            locations=locations,
+            sales={order[0]: Decimal(str(total_price)) - Decimal(str(order[3] or 0))},
+        )
+        if analytics_engine is not None:
+            analytics_engine.update_order_price(id, total_price)
 
         return jsonify({"message": "Order updated successfully"}), 200
     except Error as e:
+        connection.rollback()
         print(f"Error updating order: {e}")
         return jsonify({"message": "Error updating order", "error": str(e)}), 500
     finally:
@@ -412,14 +1291,26 @@ def delete_order(id):
     cursor = connection.cursor()
 
     try:
-        cursor.execute(query, (id,))
-        connection.commit()
+        connection.start_transaction()
+        order = sales_rollups.lock_order_row(cursor, id)
 
-        if cursor.rowcount == 0:
+        if order is None:
+            connection.rollback()
             return jsonify({"message": "Order not found"}), 404
 
+        location = order_location(cursor, id)
+        cursor.execute(query, (id,))
+        sales_rollups.apply_orders(cursor, [order], sign=-1)
+        cohort_changes = cohorts.refresh_users(cursor, [order[2]])
+        connection.commit()
+        cohort_index.replace(cohort_changes)
+        publish_order_deltas(locations={location: -1}, sales={order[0]: -Decimal(str(order[3] or 0))})
+        if analytics_engine is not None:
+            analytics_engine.delete_orders([id])
+
         return jsonify({"message": "Order deleted successfully"}), 200
     except Error as e:
+        connection.rollback()
         print(f"Error deleting order: {e}")
         return jsonify({"message": "Error deleting order", "error": str(e)}), 500
     finally:
@@ -429,44 +1320,35 @@ def delete_order(id):
 # Fetch product details by ID
 @app.route('/products/<int:id>', methods=['GET'])
 def fetch_product_by_id(id):
-    query = "SELECT * FROM products WHERE id = %s"
+    query = queries.PRODUCT_BY_ID_QUERY
 
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+    def load():
+        results = fetch_all(query, (id,))
+        return results[0] if results else None
 
     try:
-        cursor.execute(query, (id,))
-        result = cursor.fetchone()
+        response = cached_response(('product', id), load)
 
-        if not result:
+        if response is None:
             return jsonify({"message": "Product not found"}), 404
 
-        return jsonify(result), 200
+        return response
     except Error as e:
         print(f"Error fetching product details: {e}")
         return jsonify({"message": "Error fetching product details", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
 # Top five zip codes with maximum product sales
 @app.route('/trending/top-zipcodes', methods=['GET'])
+@read_only
 def get_top_zipcodes():
-    query = """
-        SELECT store_location, COUNT(store_location) AS totalOrders
-        FROM orders
-        GROUP BY store_location
-        ORDER BY totalOrders DESC
-        LIMIT 5
-    """
+    query = queries.TOP_ZIPCODES_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        print('Top zip codes query results:', results)  # Log the results for debugging
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching top zip codes: {e}")
         return jsonify({"message": "Error fetching top zip codes", "error": str(e)}), 500
@@ -476,22 +1358,16 @@ def get_top_zipcodes():
 
 # Top five most sold products
 @app.route('/trending/most-sold', methods=['GET'])
+@read_only
 def get_most_sold_products():
-    query = """
-        SELECT orderName, COUNT(orderName) AS totalSold
-        FROM CustomerOrder
-        GROUP BY orderName
-        ORDER BY totalSold DESC
-        LIMIT 5
-    """
+    query = queries.MOST_SOLD_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        print('Most sold products query results:', results)  # Log the results for debugging
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching most sold products: {e}")
         return jsonify({"message": "Error fetching most sold products", "error": str(e)}), 500
@@ -501,15 +1377,16 @@ def get_most_sold_products():
 
 # Fetch all store locations
 @app.route('/store-locations', methods=['GET'])
+@read_only
 def get_store_locations():
-    query = "SELECT * FROM store_locations"
+    query = queries.STORE_LOCATIONS_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching store locations: {e}")
         return jsonify({"message": "Error fetching store locations", "error": str(e)}), 500
@@ -520,6 +1397,7 @@ def get_store_locations():
 
 # Get accessories for a specific product
 @app.route('/accessories', methods=['GET'])
+@read_only
 def get_accessories():
     product_id = request.args.get('productId')  # Get productId from query parameters
     if not product_id:
@@ -532,7 +1410,7 @@ def get_accessories():
     try:
         cursor.execute(query, (product_id,))
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching accessories: {e}")
         return jsonify({"message": "Error fetching accessories", "error": str(e)}), 500
@@ -540,113 +1418,58 @@ def get_accessories():
         cursor.close()
         connection.close()
 
-# Get a table of all products and available stock
-@app.route('/inventory/products', methods=['GET'])
-def get_products_inventory():
-    query = """
-        SELECT name, price, stock 
-        FROM products
-        ORDER BY name
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
+# Serve an inventory_query spec through the catalog cache
+def inventory_response(query_spec):
+    query, params = inventory_query.build(query_spec)
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return jsonify(results), 200
+        return cached_response(('inventory',) + query_spec, lambda: fetch_all(query, params))
     except Error as e:
         print(f"Error fetching inventory: {e}")
         return jsonify({"message": "Error fetching inventory", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
+
+# API: Query products with field projection, filters, sort and limit
+# (e.g. ?fields=name,stock&filter=stock<10&sort=stock); see inventory_query.py
+@app.route('/inventory/query', methods=['GET'])
+def query_inventory():
+    try:
+        query_spec = inventory_query.parse(request.args)
+    except ValueError as e:
+        return jsonify({"message": "Invalid inventory query", "error": str(e)}), 400
+    return inventory_response(query_spec)
+
+# Get a table of all products and available stock
+@app.route('/inventory/products', methods=['GET'])
+def get_products_inventory():
+    return inventory_response(inventory_query.OVERVIEW)
 
 # Get data for Bar Chart (product names and stock levels)
 @app.route('/inventory/products/bar-chart', methods=['GET'])
 def get_bar_chart_data():
-    query = """
-        SELECT name, stock 
-        FROM products
-        ORDER BY name
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return jsonify(results), 200
-    except Error as e:
-        print(f"Error fetching bar chart data: {e}")
-        return jsonify({"message": "Error fetching bar chart data", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
+    return inventory_response(inventory_query.BAR_CHART)
 
 # Get all products currently on sale (with a discount)
 @app.route('/inventory/products/sale', methods=['GET'])
 def get_products_on_sale():
-    query = """
-        SELECT name, price, discount
-        FROM products
-        WHERE discount IS NOT NULL
-        ORDER BY name
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return jsonify(results), 200
-    except Error as e:
-        print(f"Error fetching products on sale: {e}")
-        return jsonify({"message": "Error fetching products on sale", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
+    return inventory_response(inventory_query.ON_SALE)
 
 # API: Get all products with manufacturer rebates
 @app.route('/inventory/products/rebates', methods=['GET'])
 def get_products_with_rebates():
-    query = """
-        SELECT name, price, rebate
-        FROM products
-        WHERE rebate IS NOT NULL
-        ORDER BY name
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
-    try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return jsonify(results), 200
-    except Error as e:
-        print(f"Error fetching products with rebates: {e}")
-        return jsonify({"message": "Error fetching products with rebates", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
+    return inventory_response(inventory_query.WITH_REBATES)
 
 # API: Fetch product sales (name, price, total sales)
 @app.route('/sales-report/products-sold', methods=['GET'])
+@read_only
+@require_role(*REPORT_ROLES)
 def get_products_sold():
-    query = """
-        SELECT p.name, p.price, COUNT(o.id) AS items_sold, 
-               SUM(o.total_price) AS total_sales
-        FROM orders o
-        JOIN products p ON o.product_id = p.id
-        GROUP BY p.name, p.price
-    """
+    query = sales_rollups.PRODUCTS_SOLD_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching sold products: {e}")
         return jsonify({"message": "Error fetching sold products", "error": str(e)}), 500
@@ -656,20 +1479,17 @@ def get_products_sold():
 
 # API: Fetch product sales chart (product names and total sales)
 @app.route('/sales-report/products-sales-chart', methods=['GET'])
+@read_only
+@require_role(*REPORT_ROLES)
 def get_products_sales_chart():
-    query = """
-        SELECT p.name, SUM(o.total_price) AS total_sales
-        FROM orders o
-        JOIN products p ON o.product_id = p.id
-        GROUP BY p.name
-    """
+    query = sales_rollups.PRODUCTS_SALES_CHART_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching sales chart data: {e}")
         return jsonify({"message": "Error fetching sales chart data", "error": str(e)}), 500
@@ -679,20 +1499,18 @@ def get_products_sales_chart():
 
 # API: Fetch total daily sales transactions
 @app.route('/sales-report/daily-sales', methods=['GET'])
+@read_only
+@require_role(*REPORT_ROLES)
+@served_by_engine('daily_sales', "fetching daily sales")
 def get_daily_sales():
-    query = """
-        SELECT DATE(o.order_date) AS date, SUM(o.total_price) AS total_sales
-        FROM orders o
-        GROUP BY DATE(o.order_date)
-        ORDER BY date DESC
-    """
+    query = sales_rollups.DAILY_SALES_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching daily sales: {e}")
         return jsonify({"message": "Error fetching daily sales", "error": str(e)}), 500
@@ -702,22 +1520,18 @@ def get_daily_sales():
 
 # API: Get top 5 customers by total purchase amount
 @app.route('/sales-report/top-customers', methods=['GET'])
+@read_only
+@require_role(*REPORT_ROLES)
+@served_by_engine('top_customers', "fetching top customers")
 def get_top_customers():
-    query = """
-        SELECT u.name AS customer_name, u.email, SUM(o.total_price) AS total_spent
-        FROM orders o
-        JOIN users u ON o.user_id = u.id
-        GROUP BY u.id
-        ORDER BY total_spent DESC
-        LIMIT 5
-    """
+    query = sales_rollups.TOP_CUSTOMERS_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching top customers: {e}")
         return jsonify({"message": "Error fetching top customers", "error": str(e)}), 500
@@ -727,25 +1541,17 @@ def get_top_customers():
 
 # API: Get popular products by category
 @app.route('/trending/popular-products-by-category', methods=['GET'])
+@read_only
+@served_by_engine('popular_products_by_category', "fetching popular products by category")
 def get_popular_products_by_category():
-    query = """
-        SELECT 
-          p.category AS category_name,
-          p.name AS product_name,
-          COUNT(o.id) AS items_sold,
-          SUM(o.total_price) AS total_revenue
-        FROM orders o
-        JOIN products p ON o.product_id = p.id
-        GROUP BY p.category, p.name
-        ORDER BY p.category ASC, items_sold DESC
-    """
+    query = queries.POPULAR_PRODUCTS_BY_CATEGORY_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching popular products by category: {e}")
         return jsonify({"message": "Error fetching popular products by category", "error": str(e)}), 500
@@ -756,21 +1562,17 @@ def get_popular_products_by_category():
 
 # API: Get customers who haven't placed an order in the last 30 days
 @app.route('/customers/inactive', methods=['GET'])
+@read_only
+@require_role(*REPORT_ROLES)
 def get_inactive_customers():
-    query = """
-        SELECT u.name AS customer_name, u.email
-        FROM users u
-        LEFT JOIN orders o ON u.id = o.user_id 
-              AND o.order_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
-        WHERE o.id IS NULL
-    """
+    query = queries.INACTIVE_CUSTOMERS_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching inactive customers: {e}")
         return jsonify({"message": "Error fetching inactive customers", "error": str(e)}), 500
@@ -778,60 +1580,55 @@ def get_inactive_customers():
         cursor.close()
         connection.close()
 
-# API: Retention data for 2 interval days
+# API: Retention between two periods of ?window= days (default 2): customers
+# who ordered in the earlier period and again in the latest one
 @app.route('/sales-report/customer-retention', methods=['GET'])
+@require_role(*REPORT_ROLES)
 def get_customer_retention():
-    query = """
-        WITH CurrentPeriodCustomers AS (
-          SELECT DISTINCT user_id
-          FROM orders
-          WHERE order_date >= CURDATE() - INTERVAL 2 DAY
-        ),
-        PreviousPeriodCustomers AS (
-          SELECT DISTINCT user_id
-          FROM orders
-          WHERE order_date >= CURDATE() - INTERVAL 4 DAY
-            AND order_date < CURDATE() - INTERVAL 2 DAY
-        )
-        SELECT 
-          COUNT(DISTINCT cmc.user_id) AS RetainedCustomers,
-          COUNT(DISTINCT pmc.user_id) AS PreviousPeriodCustomers,
-          (COUNT(DISTINCT cmc.user_id) / COUNT(DISTINCT pmc.user_id)) * 100 AS RetentionRate,
-          GROUP_CONCAT(DISTINCT u.name) AS RetainedCustomerNames
-        FROM PreviousPeriodCustomers pmc
-        LEFT JOIN CurrentPeriodCustomers cmc ON pmc.user_id = cmc.user_id
-        LEFT JOIN users u ON cmc.user_id = u.id
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+    window = request.args.get('window', 2, type=int)
+    if not 1 <= window <= COHORT_MAX_WINDOW:
+        return jsonify({"message": f"window must be between 1 and {COHORT_MAX_WINDOW} days"}), 400
 
+    connection = get_primary_connection()
     try:
-        cursor.execute(query)
-        results = cursor.fetchone()  # Fetch the first result
-        return jsonify(results or {}), 200
+        return send(cohorts.with_names(connection, cohort_index.retention(window)))
     except Error as e:
         print(f"Error calculating customer retention rate: {e}")
         return jsonify({"message": "Error calculating customer retention rate", "error": str(e)}), 500
     finally:
-        cursor.close()
         connection.close()
 
+# API: Cohort table: customers grouped by the period of their first order,
+# with how many ordered again in each following period.
+# ?period=day|week|month (default month), ?periods= (default 12),
+# ?from=/to= (YYYY-MM-DD) limit the cohorts by first order date
+@app.route('/sales-report/cohorts', methods=['GET'])
+@require_role(*REPORT_ROLES)
+def get_cohorts():
+    try:
+        since = datetime.strptime(request.args['from'], '%Y-%m-%d').date() if request.args.get('from') else None
+        until = datetime.strptime(request.args['to'], '%Y-%m-%d').date() if request.args.get('to') else None
+        periods = int(request.args.get('periods', 12))
+        return send(cohort_index.matrix(request.args.get('period', 'month'), periods, since, until))
+    except ValueError as e:
+        return jsonify({"message": "Invalid cohort query", "error": str(e)}), 400
+    except Error as e:
+        print(f"Error calculating cohorts: {e}")
+        return jsonify({"message": "Error calculating cohorts", "error": str(e)}), 500
+
 # API: 2 days average sale
 @app.route('/sales-report/average-sales', methods=['GET'])
+@read_only
+@require_role(*REPORT_ROLES)
 def get_average_sales():
-    query = """
-        SELECT 
-          ROUND(SUM(total_price) / 2, 2) AS average_sales
-        FROM orders
-        WHERE order_date >= CURDATE() - INTERVAL 2 DAY
-    """
+    query = queries.AVERAGE_SALES_QUERY
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
         cursor.execute(query)
         result = cursor.fetchone()  # Fetch the first result
-        return jsonify(result or {"average_sales": 0}), 200
+        return send(result or {"average_sales": 0})
     except Error as e:
         print(f"Error fetching average sales: {e}")
         return jsonify({"message": "Error fetching average sales", "error": str(e)}), 500
@@ -841,61 +1638,30 @@ def get_average_sales():
 
 # API: Customer Segmentation Analysis
 @app.route('/analytics/customer-segmentation', methods=['GET'])
+@read_only
+@served_by_engine('customer_segmentation', "fetching customer segmentation data")
 def customer_segmentation():
-    query = """
-        SELECT 
-          CASE 
-            WHEN TotalSpent < 1500 THEN 'Low Spender'
-            WHEN TotalSpent BETWEEN 1500 AND 3500 THEN 'Medium Spender'
-            ELSE 'High Spender'
-          END AS CustomerSegment,
-          COUNT(*) AS CustomerCount,
-          AVG(TotalSpent) AS AvgSpend
-        FROM (
-          SELECT u.id AS CustomerID, u.name AS CustomerName, SUM(o.total_price) AS TotalSpent
-          FROM users u
-          JOIN orders o ON u.id = o.user_id
-          GROUP BY u.id, u.name
-        ) AS CustomerSpend
-        GROUP BY CustomerSegment WITH ROLLUP
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+    query = queries.CUSTOMER_SEGMENTATION_QUERY
 
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return jsonify(results), 200
+        results = analytics_cache.get('customer_segmentation', lambda: fetch_all(query))
+        return send(results)
     except Error as e:
         print(f"Error fetching customer segmentation data: {e}")
         return jsonify({"message": "Error fetching customer segmentation data", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
-# API: Product Cross-Sell Analysis
+# API: Product Cross-Sell Analysis (top co-purchased product pairs)
 @app.route('/analytics/product-cross-sell', methods=['GET'])
+@read_only
 def product_cross_sell():
-    query = """
-        SELECT 
-            p1.name AS Product1,
-            p2.name AS Product2,
-            COUNT(*) AS CoOccurrence
-        FROM orders o1
-        JOIN orders o2 ON o1.order_id = o2.order_id AND o1.product_id < o2.product_id
-        JOIN products p1 ON o1.product_id = p1.id
-        JOIN products p2 ON o2.product_id = p2.id
-        GROUP BY p1.name, p2.name, p1.id, p2.id
-        ORDER BY CoOccurrence DESC
-        LIMIT 10
-    """
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
-        cursor.execute(query)
+        cursor.execute(cross_sell.TOP_PAIRS_QUERY, (limit,))
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
         print(f"Error fetching cross-sell data: {e}")
         return jsonify({"message": "Error fetching cross-sell data", "error": str(e)}), 500
@@ -903,100 +1669,56 @@ def product_cross_sell():
         cursor.close()
         connection.close()
 
-# API: Customer Lifetime Value Calculation
-@app.route('/analytics/customer-lifetime-value', methods=['GET'])
-def customer_lifetime_value():
-    query = """
-        SELECT 
-          u.id AS CustomerID,
-          u.name AS CustomerName,
-          COUNT(DISTINCT o.id) AS TotalOrders,
-          SUM(o.total_price) AS TotalSpent,
-          AVG(o.total_price) AS AvgOrderValue,
-          IFNULL(DATEDIFF(MAX(o.order_date), MIN(o.order_date)) / 365.0, 0) AS YearsActive,
-          IFNULL(SUM(o.total_price) / (DATEDIFF(MAX(o.order_date), MIN(o.order_date)) / 365.0), 0) AS AnnualValue
-        FROM users u
-        JOIN orders o ON u.id = o.user_id
-        GROUP BY u.id, u.name
-        ORDER BY AnnualValue DESC
-        LIMIT 10
-    """
+# API: Products frequently bought with a given product
+@app.route('/analytics/product-cross-sell/<int:product_id>', methods=['GET'])
+@read_only
+def product_bought_with(product_id):
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
     connection = get_db_connection()
     cursor = connection.cursor(dictionary=True)
 
     try:
-        cursor.execute(query)
+        cursor.execute(cross_sell.BOUGHT_WITH_QUERY, (product_id, limit))
         results = cursor.fetchall()
-        return jsonify(results), 200
+        return send(results)
     except Error as e:
-        print(f"Error fetching customer lifetime value data: {e}")
-        return jsonify({"message": "Error fetching customer lifetime value data", "error": str(e)}), 500
+        print(f"Error fetching frequently bought together products: {e}")
+        return jsonify({"message": "Error fetching frequently bought together products", "error": str(e)}), 500
     finally:
         cursor.close()
         connection.close()
 
+# API: Customer Lifetime Value Calculation
+@app.route('/analytics/customer-lifetime-value', methods=['GET'])
+def customer_lifetime_value():
+    try:
+        return snapshot_response('customer_lifetime_value')
+    except Error as e:
+        print(f"Error fetching customer lifetime value data: {e}")
+        return jsonify({"message": "Error fetching customer lifetime value data", "error": str(e)}), 500
+
 # API: Seasonal Sales Analysis
 @app.route('/analytics/seasonal-sales-analysis', methods=['GET'])
 def seasonal_sales_analysis():
-    query = """
-        SELECT 
-          YEAR(order_date) AS Year,
-          QUARTER(order_date) AS Quarter,
-          SUM(total_price) AS Quarterly_Sales,
-          SUM(SUM(total_price)) OVER (PARTITION BY YEAR(order_date) ORDER BY QUARTER(order_date)) AS Cumulative_Yearly_Sales
-        FROM orders
-        GROUP BY Year, Quarter WITH ROLLUP
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        return jsonify(results), 200
+        return snapshot_response('seasonal_sales_analysis')
     except Error as e:
         print(f"Error fetching seasonal sales analysis data: {e}")
         return jsonify({"message": "Error fetching seasonal sales analysis data", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
 # API: Customer Purchase Frequency Distribution
 @app.route('/analytics/purchase-frequency', methods=['GET'])
+@read_only
+@served_by_engine('purchase_frequency', "fetching purchase frequency data")
 def purchase_frequency():
-    query = """
-        WITH PurchaseFrequency AS (
-          SELECT user_id, COUNT(DISTINCT id) AS OrderCount
-          FROM orders
-          GROUP BY user_id
-        )
-        SELECT 
-          CASE 
-            WHEN OrderCount = 1 THEN 'One-time'
-            WHEN OrderCount BETWEEN 2 AND 5 THEN '2-5 times'
-            WHEN OrderCount BETWEEN 6 AND 10 THEN '6-10 times'
-            ELSE 'More than 10 times'
-          END AS PurchaseFrequency,
-          COUNT(*) AS CustomerCount,
-          AVG(OrderCount) AS AvgOrders
-        FROM PurchaseFrequency
-        GROUP BY PurchaseFrequency
-        ORDER BY MIN(OrderCount)
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
+    query = queries.PURCHASE_FREQUENCY_QUERY
 
     try:
-        cursor.execute(query)
-        results = cursor.fetchall()
-        print('Purchase Frequency Query Results:', results)  # Log the results
-        return jsonify(results), 200
+        results = analytics_cache.get('purchase_frequency', lambda: fetch_all(query))
+        return send(results)
     except Error as e:
         print(f"Error fetching purchase frequency data: {e}")
         return jsonify({"message": "Error fetching purchase frequency data", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
 # API: Auto-completion search
 @app.route('/autocomplete', methods=['GET'])
@@ -1006,26 +1728,22 @@ def autocomplete():
     if not search_term:
         return jsonify({"message": "Search term is required"}), 400
 
-    query = """
-        SELECT id, name 
-        FROM products 
-        WHERE name LIKE %s 
-        LIMIT 10
-    """
-    connection = get_db_connection()
-    cursor = connection.cursor(dictionary=True)
-
     try:
-        cursor.execute(query, (f"%{search_term}%",))
-        results = cursor.fetchall()
-        return jsonify(results), 200
+        # Normally built at startup; this covers servers started without __main__
+        if not typeahead_index.loaded:
+            load_typeahead_index()
+
+        return jsonify(typeahead_index.search(search_term, limit=10)), 200
     except Error as e:
         print(f"Error fetching autocomplete suggestions: {e}")
         return jsonify({"message": "Error fetching autocomplete suggestions", "error": str(e)}), 500
-    finally:
-        cursor.close()
-        connection.close()
 
 # Start the server
 if __name__ == '__main__':
+    # Exit normally on SIGTERM so atexit hooks (the audit queue drain) run
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        load_typeahead_index()
+    except Error as e:
+        print(f"Error building autocomplete index: {e}")
     app.run(port=3001, debug=True)
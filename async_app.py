@@ -0,0 +1,181 @@
+"""Asyncio serving mode for the I/O-bound read endpoints.
+
+    pip install quart quart-cors aiomysql hypercorn
+    hypercorn async_app:app --bind 0.0.0.0:3002     # or: python async_app.py
+
+Serves the catalog, /past-orders/<user_id>, /store-locations and the
+public report endpoints (/inventory/*, /trending/*, /analytics/*) with the
+same SQL (see queries.py) and the same JSON as app.py, on an aiomysql pool.
+A request waiting on MySQL holds no thread, so one process can keep
+thousands of slow clients open; only the pool size bounds how many queries
+run at once. Writes stay on app.py, which also owns
+the catalog cache, so this process reads products straight from MySQL.
+
+Not served here, unlike when this mode was added: /sales-report/* and
+/customers/inactive. They now require a storeManager or salesman session
+token, and sessions live only in app.py's in-memory store (sessions.py), so
+this process cannot check one. Send those requests to app.py.
+"""
+import asyncio
+import os
+
+import aiomysql
+from pymysql.err import MySQLError
+from quart import Quart, jsonify, request
+from quart_cors import cors
+
+import cross_sell
+import inventory_query
+import queries
+from config import db_config
+
+app = cors(Quart(__name__), allow_origin='*')
+
+POOL_SIZE = int(os.getenv('DB_ASYNC_POOL_SIZE', 50))
+POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 5))
+POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 3600))
+
+
+@app.before_serving
+async def open_pool():
+    app.db_pool = await aiomysql.create_pool(
+        host=db_config['host'],
+        user=db_config['user'],
+        password=db_config['password'],
+        db=db_config['database'],
+        minsize=1,
+        maxsize=POOL_SIZE,
+        pool_recycle=POOL_RECYCLE,
+        # Every statement here is a read; autocommit avoids stale snapshots
+        autocommit=True,
+    )
+
+
+@app.after_serving
+async def close_pool():
+    app.db_pool.close()
+    await app.db_pool.wait_closed()
+
+
+# Run a read query on a pooled connection; returns one row or all rows as dicts
+async def fetch(query, params=(), one=False):
+    try:
+        connection = await asyncio.wait_for(app.db_pool.acquire(), POOL_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise MySQLError(f"Timed out after {POOL_TIMEOUT}s waiting for a database connection")
+    try:
+        async with connection.cursor(aiomysql.DictCursor) as cursor:
+            await cursor.execute(query, params)
+            return await cursor.fetchone() if one else await cursor.fetchall()
+    finally:
+        app.db_pool.release(connection)
+
+
+def _error(label, e):
+    print(f"Error {label}: {e}")
+    return jsonify({"message": f"Error {label}", "error": str(e)}), 500
+
+
+# Get all products or filter by category
+@app.route('/products', methods=['GET'])
+async def get_products():
+    category = request.args.get('category')
+    try:
+        if category:
+            results = await fetch(queries.PRODUCTS_BY_CATEGORY_QUERY, (category,))
+        else:
+            results = await fetch(queries.PRODUCTS_QUERY)
+        return jsonify(results), 200
+    except MySQLError as e:
+        return _error("fetching products", e)
+
+
+# Fetch product details by ID
+@app.route('/products/<int:id>', methods=['GET'])
+async def fetch_product_by_id(id):
+    try:
+        result = await fetch(queries.PRODUCT_BY_ID_QUERY, (id,), one=True)
+        if not result:
+            return jsonify({"message": "Product not found"}), 404
+        return jsonify(result), 200
+    except MySQLError as e:
+        return _error("fetching product details", e)
+
+
+# Get past orders for a specific user
+@app.route('/past-orders/<int:user_id>', methods=['GET'])
+async def get_past_orders(user_id):
+    try:
+        return jsonify(await fetch(queries.PAST_ORDERS_QUERY, (user_id,))), 200
+    except MySQLError as e:
+        return _error("fetching past orders", e)
+
+
+# Top co-purchased product pairs, and products bought with one product
+@app.route('/analytics/product-cross-sell', methods=['GET'])
+async def product_cross_sell():
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    try:
+        return jsonify(await fetch(cross_sell.TOP_PAIRS_QUERY, (limit,))), 200
+    except MySQLError as e:
+        return _error("fetching cross-sell data", e)
+
+
+@app.route('/analytics/product-cross-sell/<int:product_id>', methods=['GET'])
+async def product_bought_with(product_id):
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    try:
+        return jsonify(await fetch(cross_sell.BOUGHT_WITH_QUERY, (product_id, limit))), 200
+    except MySQLError as e:
+        return _error("fetching frequently bought together products", e)
+
+
+# Products with field projection, filters, sort and limit; see inventory_query.py
+@app.route('/inventory/query', methods=['GET'])
+async def query_inventory():
+    try:
+        query, params = inventory_query.build(inventory_query.parse(request.args))
+    except ValueError as e:
+        return jsonify({"message": "Invalid inventory query", "error": str(e)}), 400
+    try:
+        return jsonify(await fetch(query, params)), 200
+    except MySQLError as e:
+        return _error("fetching inventory", e)
+
+
+# Parameterless list endpoints: (rule, query, error label)
+LIST_ROUTES = [
+    ('/store-locations', queries.STORE_LOCATIONS_QUERY, "fetching store locations"),
+    ('/inventory/products', queries.INVENTORY_QUERY, "fetching inventory"),
+    ('/inventory/products/bar-chart', queries.INVENTORY_BAR_CHART_QUERY, "fetching bar chart data"),
+    ('/inventory/products/sale', queries.PRODUCTS_ON_SALE_QUERY, "fetching products on sale"),
+    ('/inventory/products/rebates', queries.PRODUCTS_WITH_REBATES_QUERY, "fetching products with rebates"),
+    ('/trending/top-zipcodes', queries.TOP_ZIPCODES_QUERY, "fetching top zip codes"),
+    ('/trending/most-sold', queries.MOST_SOLD_QUERY, "fetching most sold products"),
+    ('/trending/popular-products-by-category', queries.POPULAR_PRODUCTS_BY_CATEGORY_QUERY,
+     "fetching popular products by category"),
+    ('/analytics/customer-segmentation', queries.CUSTOMER_SEGMENTATION_QUERY,
+     "fetching customer segmentation data"),
+    ('/analytics/customer-lifetime-value', queries.CUSTOMER_LIFETIME_VALUE_QUERY,
+     "fetching customer lifetime value data"),
+    ('/analytics/seasonal-sales-analysis', queries.SEASONAL_SALES_QUERY,
+     "fetching seasonal sales analysis data"),
+    ('/analytics/purchase-frequency', queries.PURCHASE_FREQUENCY_QUERY, "fetching purchase frequency data"),
+]
+
+
+def _list_view(query, label):
+    async def view():
+        try:
+            return jsonify(await fetch(query)), 200
+        except MySQLError as e:
+            return _error(label, e)
+    return view
+
+
+for rule, query, label in LIST_ROUTES:
+    app.add_url_rule(rule, rule, _list_view(query, label), methods=['GET'])
+
+
+if __name__ == '__main__':
+    app.run(port=int(os.getenv('ASYNC_PORT', 3002)))
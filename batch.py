@@ -0,0 +1,101 @@
+"""Several read-only GET requests in one round trip (POST /batch).
+
+Each sub-request is dispatched to its Flask view inside its own request
+context, so routing, role checks and caching behave exactly as for a direct
+call. All the sub-requests a thread runs share one pooled connection:
+get_db_connection() hands out current_connection() while a batch is
+running on that thread, and close() on it does nothing until the batch is
+done. With `parallel`, the sub-requests are spread over up to `workers`
+threads, each with its own connection (a MySQL connection cannot run two
+queries at once). run() may be given its own `connect`, e.g. to borrow
+from a replica when every sub-request is read-only.
+"""
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from mysql.connector import Error
+from werkzeug.exceptions import HTTPException
+
+_local = threading.local()
+
+
+# A pooled connection lent to every sub-request a batch thread runs
+class SharedConnection:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        pass  # returned to the pool by the batch once all its sub-requests ran
+
+
+def current_connection():
+    """The connection shared by the batch running on this thread, if any."""
+    return getattr(_local, 'connection', None)
+
+
+class BatchRunner:
+    def __init__(self, app, connect, prefixes, max_requests=20, workers=4):
+        self.app = app
+        self.connect = connect
+        self.prefixes = tuple(prefixes)
+        self.max_requests = max_requests
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='batch')
+
+    def _dispatch(self, path, headers):
+        if not path.startswith(self.prefixes):
+            return {"path": path, "status": 400, "body": {"message": "Path cannot be batched"}}
+        with self.app.test_request_context(path, method='GET', headers=headers):
+            try:
+                response = self.app.make_response(self.app.dispatch_request())
+            except HTTPException as e:
+                response = e.get_response()
+            except Exception as e:
+                print(f"Error in batched request {path}: {e}")
+                return {"path": path, "status": 500, "body": {"message": "Error in batched request", "error": str(e)}}
+            body = response.get_json(silent=True)
+            if body is None:
+                body = response.get_data(as_text=True)
+            return {"path": path, "status": response.status_code, "body": body}
+
+    def _drain(self, items, results, lock, headers, connect):
+        # Run queued sub-requests on one borrowed connection until none are left
+        try:
+            connection = connect()
+        except Error as e:
+            print(f"Error borrowing a connection for a batch: {e}")
+            connection = None  # each sub-request borrows its own
+        _local.connection = SharedConnection(connection) if connection is not None else None
+        try:
+            while True:
+                with lock:
+                    if not items:
+                        return
+                    index, path = items.popleft()
+                results[index] = self._dispatch(path, headers)
+        finally:
+            _local.connection = None
+            if connection is not None:
+                connection.close()
+
+    def run(self, paths, headers, parallel=False, connect=None):
+        """Run GET `paths` with `headers`; returns one {path, status, body} per path, in order."""
+        connect = connect or self.connect
+        items = deque(enumerate(paths))
+        results = [None] * len(paths)
+        lock = threading.Lock()
+        if not parallel or len(paths) < 2:
+            self._drain(items, results, lock, headers, connect)
+            return results
+        futures = [self._executor.submit(self._drain, items, results, lock, headers, connect)
+                   for _ in range(min(self.workers, len(paths)))]
+        for future in futures:
+            future.result()
+        return results
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
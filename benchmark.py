@@ -0,0 +1,557 @@
+"""Load test and latency benchmark for the Flask API.
+
+    python benchmark.py --seed --scale 1 --duration 60 --concurrency 16 --output bench_results.json
+    python benchmark.py --url http://localhost:3001 --mix browse --duration 30
+    python benchmark.py --compare bench_results_old.json bench_results.json
+
+--seed (re)creates a scratch database (default project_bench, never the
+app's own database) filled with synthetic users, products and orders
+scaled by --scale, then loads it with the bulk import tool. Unless --url is
+given, the app is started in a subprocess pointed at that database.
+
+Worker threads then drive a weighted mix of scenarios (browse, checkout,
+account, manager dashboards, admin writes) for --duration seconds. The
+result file holds throughput, error counts and p50/p95/p99 latency per
+endpoint, plus the git commit, so runs can be compared across commits
+with --compare.
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+import bulk_data
+
+BENCH_DATABASE = 'project_bench'
+
+CATEGORIES = ['Smartphones', 'Laptops', 'Wearables', 'Accessories', 'Home Gadgets']
+WORDS = ['Pro', 'Max', 'Mini', 'Ultra', 'Smart', 'Wireless', 'Air', 'Plus', 'Lite', 'Gaming',
+         'Galaxy', 'Pixel', 'Zen', 'Vivo', 'Echo', 'Nest', 'Watch', 'Buds', 'Book', 'Tab']
+STORES = ['123 Elm St', '456 Maple Ave', '789 Oak Dr', '404 Willow St', '12 Pine Rd',
+          '88 Cedar Ln', '5 Birch Blvd', '61 Spruce Way', '9 Aspen Ct', '300 Main St']
+
+SCHEMA = [
+    """CREATE TABLE users (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        name VARCHAR(255) NOT NULL,
+        email VARCHAR(255) UNIQUE NOT NULL,
+        password VARCHAR(255) NOT NULL,
+        role VARCHAR(50) NOT NULL
+    )""",
+    """CREATE TABLE products (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        name VARCHAR(255) NOT NULL,
+        price DECIMAL(10, 2) NOT NULL,
+        description TEXT,
+        category VARCHAR(100),
+        accessories VARCHAR(255),
+        image VARCHAR(255),
+        discount DECIMAL(5, 2),
+        rebate DECIMAL(5, 2),
+        warranty VARCHAR(50),
+        stock INT
+    )""",
+    """CREATE TABLE CustomerOrder (
+        orderid INT AUTO_INCREMENT,
+        userName VARCHAR(255) NOT NULL,
+        orderName VARCHAR(255) NOT NULL,
+        orderPrice DECIMAL(10, 2) NOT NULL,
+        userAddress TEXT NOT NULL,
+        creditCardNo VARCHAR(16) NOT NULL,
+        PRIMARY KEY (orderid, userName, orderName)
+    )""",
+    """CREATE TABLE orders (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        user_id INT NOT NULL,
+        total_price DECIMAL(10, 2) NOT NULL,
+        delivery_method VARCHAR(50) NOT NULL,
+        store_location VARCHAR(100),
+        status VARCHAR(50) NOT NULL,
+        order_date DATETIME NOT NULL,
+        delivery_date DATETIME NOT NULL,
+        product_id INT NOT NULL,
+        quantity INT NOT NULL,
+        store_id INT,
+        name VARCHAR(50)
+    )""",
+    """CREATE TABLE store_locations (
+        storeID INT PRIMARY KEY,
+        street VARCHAR(255) NOT NULL,
+        city VARCHAR(100) NOT NULL,
+        state VARCHAR(50) NOT NULL,
+        zipcode VARCHAR(10) NOT NULL
+    )""",
+    """CREATE TABLE accessories (
+        id INT PRIMARY KEY AUTO_INCREMENT,
+        product_id INT NOT NULL,
+        name VARCHAR(255) NOT NULL
+    )""",
+]
+
+
+# ---------------------------------------------------------------------------
+# Seeding
+
+def _write_csv(path, header, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        writer = csv.writer(handle, delimiter=';', quotechar='"', quoting=csv.QUOTE_NONNUMERIC,
+                            lineterminator='\n')
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def generate_dataset(data_dir, scale, rng):
+    """Write synthetic CSVs in the bulk_data format; returns row counts."""
+    n_users = int(1000 * scale)
+    n_products = max(20, int(200 * scale))
+    n_baskets = int(5000 * scale)
+
+    # Every user's password is "password"; user 1 is the store manager
+    import bcrypt
+    password_hash = bcrypt.hashpw(b'password', bcrypt.gensalt(10)).decode('ascii')
+    _write_csv(os.path.join(data_dir, 'users.csv'), ['id', 'name', 'email', 'password', 'role'], (
+        (i, f"User {i}", f"user{i}@bench.local", password_hash,
+         'storeManager' if i == 1 else 'salesman' if i % 50 == 0 else 'customer')
+        for i in range(1, n_users + 1)
+    ))
+
+    prices = {}
+    def products():
+        for i in range(1, n_products + 1):
+            prices[i] = round(rng.uniform(20, 2500), 2)
+            yield (i, f"{rng.choice(WORDS)} {rng.choice(WORDS)} {i}", prices[i], "Benchmark product",
+                   CATEGORIES[i % len(CATEGORIES)], 'case', f"/images/{i}.png",
+                   rng.choice([0, 5, 10]), rng.choice([0, 0, 20]), '1 year', 10 ** 6)
+    _write_csv(os.path.join(data_dir, 'products.csv'),
+               ['id', 'name', 'price', 'description', 'category', 'accessories', 'image', 'discount',
+                'rebate', 'warranty', 'stock'], products())
+
+    _write_csv(os.path.join(data_dir, 'store_locations.csv'), ['storeID', 'street', 'city', 'state', 'zipcode'], (
+        (i, street, 'Chicago', 'IL', f"606{i:02d}") for i, street in enumerate(STORES, 1)
+    ))
+
+    # Popular products follow a long tail, baskets hold 1-4 products
+    weights = [1 / rank for rank in range(1, n_products + 1)]
+    now = datetime.now().replace(microsecond=0)
+    order_count = [0]
+    def orders():
+        order_id = 0
+        for _ in range(n_baskets):
+            user_id = rng.randint(1, n_users)
+            order_date = now - timedelta(days=rng.randint(0, 365), seconds=rng.randint(0, 86399))
+            basket = set(rng.choices(range(1, n_products + 1), weights=weights, k=rng.randint(1, 4)))
+            total = round(sum(prices[p] for p in basket), 2)
+            store = rng.choice(STORES)
+            for product_id in basket:
+                order_id += 1
+                order_count[0] = order_id
+                yield (order_id, user_id, total, 'inStorePickup', store, rng.choice(['pending', 'delivered']),
+                       order_date.strftime('%Y-%m-%d %H:%M:%S'),
+                       (order_date + timedelta(days=7)).strftime('%Y-%m-%d %H:%M:%S'),
+                       product_id, rng.randint(1, 3), 0, '')
+    _write_csv(os.path.join(data_dir, 'orders.csv'),
+               ['id', 'user_id', 'total_price', 'delivery_method', 'store_location', 'status', 'order_date',
+                'delivery_date', 'product_id', 'quantity', 'store_id', 'name'], orders())
+
+    _write_csv(os.path.join(data_dir, 'customerorder.csv'),
+               ['orderid', 'userName', 'orderName', 'orderPrice', 'userAddress', 'creditCardNo'], (
+        (i, str(rng.randint(1, n_users)), f"Product {rng.randint(1, n_products)}", 99.0, '1 Bench St', '4111111111111111')
+        for i in range(1, order_count[0] + 1)
+    ))
+    return {'users': n_users, 'products': n_products, 'orders': order_count[0]}
+
+
+def seed_database(db_config, database, scale, seed):
+    import mysql.connector
+    import cross_sell
+    import migrations
+    import reservations
+    import sales_rollups
+
+    if database == db_config.get('database'):
+        raise SystemExit(f"Refusing to seed the app's own database {database!r}; pick another --database")
+
+    server = {key: value for key, value in db_config.items() if key != 'database'}
+    connection = mysql.connector.connect(**server)
+    cursor = connection.cursor()
+    cursor.execute(f"DROP DATABASE IF EXISTS `{database}`")
+    # Audit rows spooled against the old database must not replay into the new one
+    shutil.rmtree(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'spool', database), ignore_errors=True)
+    cursor.execute(f"CREATE DATABASE `{database}`")
+    cursor.execute(f"USE `{database}`")
+    for statement in SCHEMA + [bulk_data.CREATE_PROGRESS_TABLE]:
+        cursor.execute(statement)
+    cursor.close()
+
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as data_dir:
+        started = time.monotonic()
+        counts = generate_dataset(data_dir, scale, rng)
+        print(f"Generated {counts} in {time.monotonic() - started:.1f}s")
+        for table in bulk_data.TABLES:
+            bulk_data.import_table(connection, table, data_dir, 5000, resume=False, skip_invalid=False)
+
+    cursor = connection.cursor()
+    cursor.executemany("INSERT INTO accessories (product_id, name) VALUES (%s, %s)",
+                       [(i, f"Accessory for {i}") for i in range(1, counts['products'] + 1)])
+    connection.commit()
+    cursor.close()
+
+    # Indexes are built after the bulk load, as on a migrated production schema
+    migrations.migrate(connection)
+    reservations.init_all(connection)
+    sales_rollups.rebuild(connection)
+    cross_sell.rebuild(connection)
+    connection.close()
+    return counts
+
+
+# ---------------------------------------------------------------------------
+# Traffic
+
+class Client:
+    def __init__(self, base_url, recorder, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.timeout = timeout
+
+    def call(self, method, path, endpoint, body=None, token=None):
+        """Send one request, recording its latency under `endpoint`; returns parsed JSON or None."""
+        data = json.dumps(body).encode() if body is not None else None
+        headers = {'Content-Type': 'application/json'}
+        if token:
+            headers['Authorization'] = f"Bearer {token}"
+        req = urllib.request.Request(self.base_url + path, data=data, method=method, headers=headers)
+        started = time.perf_counter()
+        status = None
+        payload = None
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout) as response:
+                status = response.status
+                raw = response.read()
+            payload = json.loads(raw) if raw else None
+        except urllib.error.HTTPError as e:
+            status = e.code
+            e.read()
+        except (urllib.error.URLError, OSError, ValueError):
+            status = 0
+        self.recorder.record(endpoint, time.perf_counter() - started, status)
+        return payload if status and status < 400 else None
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, status):
+        with self._lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+            if not status or status >= 500:
+                self.errors[endpoint] += 1
+
+
+class Scenarios:
+    def __init__(self, client, rng, scale_info):
+        self.client = client
+        self.rng = rng
+        self.users = scale_info['users']
+        self.products = scale_info['products']
+        self._manager_token = None
+
+    def _manager(self):
+        # One store manager session per worker, reused like a browser would
+        if self._manager_token is None:
+            session = self.client.call('POST', '/login', 'POST /login',
+                                       {"email": "user1@bench.local", "password": "password"}) or {}
+            self._manager_token = session.get('token')
+        return self._manager_token
+
+    def _product(self):
+        # Same long tail as the seeded orders
+        return min(int(self.rng.paretovariate(1.2)), self.products)
+
+    def browse(self):
+        c = self.client
+        c.call('GET', '/products', 'GET /products')
+        c.call('GET', f"/products?category={self.rng.choice(CATEGORIES).replace(' ', '%20')}", 'GET /products?category')
+        product_id = self._product()
+        c.call('GET', f"/products/{product_id}", 'GET /products/<id>')
+        c.call('GET', f"/accessories?productId={product_id}", 'GET /accessories')
+        term = self.rng.choice(WORDS).lower()
+        for i in range(2, len(term) + 1):
+            c.call('GET', f"/autocomplete?q={term[:i]}", 'GET /autocomplete')
+
+    def checkout(self):
+        c = self.client
+        c.call('GET', '/store-locations', 'GET /store-locations')
+        items = [{"product_id": self._product(), "quantity": 1, "name": "Bench item", "price": 99.0}
+                 for _ in range(self.rng.randint(1, 4))]
+        c.call('POST', '/place-order', 'POST /place-order', {
+            "userId": self.rng.randint(1, self.users), "name": "Bench User", "totalPrice": 99.0 * len(items),
+            "deliveryMethod": "inStorePickup", "storeLocation": self.rng.choice(STORES),
+            "deliveryDate": (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d'),
+            "cartItems": items, "address": "1 Bench St", "creditCard": "4111111111111111",
+        })
+
+    def account(self):
+        c = self.client
+        user_id = self.rng.randint(1, self.users)
+        c.call('POST', '/login', 'POST /login', {"email": f"user{user_id}@bench.local", "password": "password"})
+        orders = c.call('GET', f"/past-orders/{user_id}", 'GET /past-orders/<user_id>') or []
+        if orders and self.rng.random() < 0.1:
+            c.call('DELETE', f"/cancel-order/{orders[-1]['id']}", 'DELETE /cancel-order/<id>')
+
+    def manager(self):
+        c = self.client
+        token = self._manager()
+        for path in ['/sales-report/products-sold', '/sales-report/products-sales-chart',
+                     '/sales-report/daily-sales', '/sales-report/top-customers',
+                     '/sales-report/customer-retention', '/sales-report/average-sales',
+                     '/customers/inactive']:
+            c.call('GET', path, f"GET {path}", token=token)
+        c.call('POST', '/batch', 'POST /batch', {
+            "requests": ['/sales-report/products-sold', '/sales-report/products-sales-chart',
+                         '/sales-report/daily-sales', '/sales-report/top-customers', '/customers/inactive'],
+            "parallel": True,
+        }, token=token)
+        for path in ['/analytics/customer-segmentation', '/analytics/product-cross-sell',
+                     '/analytics/customer-lifetime-value', '/analytics/seasonal-sales-analysis',
+                     '/analytics/purchase-frequency']:
+            c.call('GET', path, f"GET {path}")
+        c.call('GET', f"/analytics/product-cross-sell/{self._product()}", 'GET /analytics/product-cross-sell/<id>')
+        for path in ['/trending/top-zipcodes', '/trending/most-sold', '/trending/popular-products-by-category']:
+            c.call('GET', path, f"GET {path}")
+        for path in ['/inventory/products', '/inventory/products/bar-chart',
+                     '/inventory/products/sale', '/inventory/products/rebates']:
+            c.call('GET', path, f"GET {path}")
+        c.call('GET', '/inventory/query?fields=name,price,stock,discount,rebate', 'GET /inventory/query')
+
+    def admin(self):
+        c = self.client
+        page = c.call('GET', f"/orders?limit=100&after_id={self.rng.randint(0, self.users)}", 'GET /orders?limit') or []
+        c.call('GET', '/orders?limit=1000&stream=1', 'GET /orders?stream')
+        if page:
+            order = page[0]
+            c.call('PUT', f"/orders/{order['id']}", 'PUT /orders/<id>', {
+                "total_price": order['total_price'], "delivery_method": order['delivery_method'],
+                "store_location": order['store_location'] or STORES[0],
+                "delivery_date": (datetime.now() + timedelta(days=7)).strftime('%Y-%m-%d'),
+                "status": self.rng.choice(['pending', 'shipped', 'delivered']),
+            })
+        c.call('POST', '/orders', 'POST /orders', {
+            "user_id": self.rng.randint(1, self.users), "total_price": 10, "delivery_method": "homeDelivery",
+            "store_location": STORES[0], "delivery_date": datetime.now().strftime('%Y-%m-%d'),
+        })
+        suffix = f"{threading.get_ident()}-{time.time_ns()}"
+        c.call('POST', '/signup', 'POST /signup', {
+            "name": "Bench Signup", "email": f"signup-{suffix}@bench.local", "password": "password", "role": "customer",
+        })
+        token = self._manager()
+        created = c.call('POST', '/products', 'POST /products', {
+            "name": f"Bench Product {suffix}", "price": 10, "description": "tmp", "category": "Accessories",
+            "accessories": "", "image": "", "discount": 0, "rebate": 0, "warranty": "1 year",
+        }, token=token)
+        if created:
+            product_id = created['productId']
+            c.call('PUT', f"/products/{product_id}", 'PUT /products/<id>', {
+                "name": f"Bench Product {suffix} v2", "price": 11, "description": "tmp", "category": "Accessories",
+                "accessories": "", "image": "",
+            }, token=token)
+            c.call('DELETE', f"/products/{product_id}", 'DELETE /products/<id>', token=token)
+        if page and self.rng.random() < 0.05:
+            c.call('DELETE', f"/orders/{page[-1]['id']}", 'DELETE /orders/<id>')
+
+
+# Scenario weights per named traffic mix
+MIXES = {
+    'default': {'browse': 60, 'checkout': 10, 'account': 15, 'manager': 10, 'admin': 5},
+    'browse': {'browse': 100},
+    'checkout': {'checkout': 100},
+    'dashboards': {'manager': 100},
+}
+
+
+def run_load(base_url, mix, duration, concurrency, scale_info, seed):
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    names, weights = zip(*MIXES[mix].items())
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        scenarios = Scenarios(Client(base_url, recorder), rng, scale_info)
+        while time.monotonic() < deadline:
+            getattr(scenarios, rng.choices(names, weights=weights)[0])()
+
+    started = time.monotonic()
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return recorder, time.monotonic() - started
+
+
+# ---------------------------------------------------------------------------
+# Reporting
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return None
+    # Nearest-rank percentile
+    index = max(0, math.ceil(pct / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def summarize(recorder, elapsed):
+    endpoints = {}
+    total = 0
+    for endpoint, latencies in sorted(recorder.latencies.items()):
+        values = sorted(latencies)
+        total += len(values)
+        endpoints[endpoint] = {
+            'requests': len(values),
+            'errors': recorder.errors[endpoint],
+            'statuses': {str(status): count for status, count in recorder.statuses[endpoint].items()},
+            'throughput_rps': round(len(values) / elapsed, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 3),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+        }
+    return {'total_requests': total, 'throughput_rps': round(total / elapsed, 2), 'endpoints': endpoints}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], text=True,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(summary):
+    print(f"{'endpoint':<48}{'reqs':>8}{'err':>6}{'rps':>9}{'p50':>9}{'p95':>9}{'p99':>9}")
+    for endpoint, stats in summary['endpoints'].items():
+        print(f"{endpoint:<48}{stats['requests']:>8}{stats['errors']:>6}{stats['throughput_rps']:>9}"
+              f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['p99_ms']:>9}")
+    print(f"Total: {summary['total_requests']} requests, {summary['throughput_rps']} req/s")
+
+
+def compare(old_path, new_path, threshold):
+    with open(old_path) as handle:
+        old = json.load(handle)
+    with open(new_path) as handle:
+        new = json.load(handle)
+    print(f"{old.get('commit')} -> {new.get('commit')}")
+    regressions = 0
+    for endpoint, stats in new['summary']['endpoints'].items():
+        before = old['summary']['endpoints'].get(endpoint)
+        if not before:
+            continue
+        change = (stats['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0.0
+        flag = ' REGRESSION' if change > threshold else ''
+        regressions += bool(flag)
+        print(f"{endpoint:<48} p95 {before['p95_ms']:>9} -> {stats['p95_ms']:>9} ms ({change:+.1f}%){flag}")
+    return 1 if regressions else 0
+
+
+# ---------------------------------------------------------------------------
+
+def start_app(database, port):
+    env = dict(os.environ, MYSQL_DATABASE=database)
+    process = subprocess.Popen(
+        [sys.executable, '-c', f"from app import app; app.run(port={port}, threaded=True)"],
+        cwd=os.path.dirname(os.path.abspath(__file__)), env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base_url + '/store-locations', timeout=1).read()
+            return process, base_url
+        except (urllib.error.URLError, OSError):
+            if process.poll() is not None:
+                raise SystemExit("The app exited during startup")
+            time.sleep(0.2)
+    process.terminate()
+    raise SystemExit("The app did not start within 20s")
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Benchmark the API routes")
+    parser.add_argument('--url', help="benchmark an already running server instead of starting one")
+    parser.add_argument('--database', default=BENCH_DATABASE)
+    parser.add_argument('--seed', action='store_true', help="recreate and seed --database first")
+    parser.add_argument('--scale', type=float, default=1.0, help="1.0 = 1k users, 200 products, ~12k order rows")
+    parser.add_argument('--mix', choices=sorted(MIXES), default='default')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--port', type=int, default=3101)
+    parser.add_argument('--random-seed', type=int, default=425)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help="compare two result files and exit")
+    parser.add_argument('--threshold', type=float, default=10.0, help="p95 regression threshold in percent")
+    args = parser.parse_args(argv[1:])
+
+    if args.compare:
+        return compare(args.compare[0], args.compare[1], args.threshold)
+
+    from config import db_config
+
+    scale_info = {'users': int(1000 * args.scale), 'products': max(20, int(200 * args.scale))}
+    if args.seed:
+        started = time.monotonic()
+        scale_info.update(seed_database(db_config, args.database, args.scale, args.random_seed))
+        print(f"Seeded {args.database} in {time.monotonic() - started:.1f}s")
+
+    process = None
+    base_url = args.url
+    if not base_url:
+        process, base_url = start_app(args.database, args.port)
+    try:
+        recorder, elapsed = run_load(base_url, args.mix, args.duration, args.concurrency,
+                                     scale_info, args.random_seed)
+    finally:
+        if process is not None:
+            # SIGINT stops the server cleanly, so the audit queue drains
+            process.send_signal(signal.SIGINT)
+            try:
+                process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                process.wait()
+
+    summary = summarize(recorder, elapsed)
+    result = {
+        'commit': git_commit(),
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'config': {'mix': args.mix, 'duration': args.duration, 'concurrency': args.concurrency,
+                   'scale': args.scale, 'database': args.database, 'url': args.url},
+        'summary': summary,
+    }
+    with open(args.output, 'w') as handle:
+        json.dump(result, handle, indent=2)
+    print_summary(summary)
+    print(f"Results written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,340 @@
+"""Streaming import/export of the semicolon-delimited CSV datasets.
+
+    python bulk_data.py import [--dir DIR] [--tables users,orders] [--batch-size N]
+                               [--resume] [--skip-invalid] [--load-data]
+    python bulk_data.py export [--dir DIR] [--tables ...] [--batch-size N]
+
+Imports read each file as a stream and insert it in batches with
+executemany (one multi-row INSERT per batch), so memory stays flat however
+large the file is. Every value is checked against the column types the
+routes expect. Progress is committed per batch together with the rows in
+bulk_import_progress, so --resume continues an interrupted load exactly
+where it stopped. --load-data hands whole files to LOAD DATA LOCAL INFILE
+instead; it is faster but skips validation and resume.
+
+Exports write the same format (header row, ';' separated, strings quoted)
+from an unbuffered cursor.
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from mysql.connector import Error
+
+import reservations
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'SQL CSV Data')
+
+# Empty fields are NULL for typed columns; text columns only treat \N as NULL
+NULLS = ('', 'NULL', '\\N')
+
+
+def _int(value):
+    return int(value)
+
+
+def _decimal(value):
+    try:
+        return Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f"invalid decimal {value!r}")
+
+
+def _datetime(value):
+    return datetime.fromisoformat(value)
+
+
+def _str(value):
+    return value
+
+
+# Table -> (CSV file, primary key, [(column, parser, nullable)]), in load order
+TABLES = {
+    'users': ('users.csv', 'id', [
+        ('id', _int, False),
+        ('name', _str, False),
+        ('email', _str, False),
+        ('password', _str, False),
+        ('role', _str, False),
+    ]),
+    'products': ('products.csv', 'id', [
+        ('id', _int, False),
+        ('name', _str, False),
+        ('price', _decimal, False),
+        ('description', _str, True),
+        ('category', _str, True),
+        ('accessories', _str, True),
+        ('image', _str, True),
+        ('discount', _decimal, True),
+        ('rebate', _decimal, True),
+        ('warranty', _str, True),
+        ('stock', _int, True),
+    ]),
+    'store_locations': ('store_locations.csv', 'storeID', [
+        ('storeID', _int, False),
+        ('street', _str, False),
+        ('city', _str, False),
+        ('state', _str, False),
+        ('zipcode', _str, False),
+    ]),
+    'orders': ('orders.csv', 'id', [
+        ('id', _int, False),
+        ('user_id', _int, False),
+        ('total_price', _decimal, False),
+        ('delivery_method', _str, False),
+        ('store_location', _str, True),
+        ('status', _str, False),
+        ('order_date', _datetime, False),
+        ('delivery_date', _datetime, False),
+        ('product_id', _int, False),
+        ('quantity', _int, False),
+        ('store_id', _int, True),
+        ('name', _str, True),
+    ]),
+    'CustomerOrder': ('customerorder.csv', 'orderid', [
+        ('orderid', _int, False),
+        ('userName', _str, False),
+        ('orderName', _str, False),
+        ('orderPrice', _decimal, False),
+        ('userAddress', _str, False),
+        ('creditCardNo', _str, False),
+    ]),
+}
+
+CREATE_PROGRESS_TABLE = """
+    CREATE TABLE IF NOT EXISTS bulk_import_progress (
+        table_name VARCHAR(64) PRIMARY KEY,
+        rows_done BIGINT NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+"""
+
+SAVE_PROGRESS = """
+    INSERT INTO bulk_import_progress (table_name, rows_done, updated_at)
+    VALUES (%s, %s, NOW())
+    ON DUPLICATE KEY UPDATE rows_done = VALUES(rows_done), updated_at = VALUES(updated_at)
+"""
+
+
+class InvalidRow(ValueError):
+    pass
+
+
+def parse_row(table, line_no, row):
+    """Convert one CSV row to column values, raising InvalidRow on bad data."""
+    columns = TABLES[table][2]
+    if len(row) != len(columns):
+        raise InvalidRow(f"{table} line {line_no}: expected {len(columns)} fields, got {len(row)}")
+    values = []
+    for (column, parse, nullable), raw in zip(columns, row):
+        if raw == '\\N' or (parse is not _str and raw in NULLS):
+            if not nullable:
+                raise InvalidRow(f"{table} line {line_no}: {column} cannot be empty")
+            values.append(None)
+            continue
+        try:
+            values.append(parse(raw))
+        except ValueError as e:
+            raise InvalidRow(f"{table} line {line_no}: {column}: {e}")
+    return values
+
+
+def _reader(handle):
+    return csv.reader(handle, delimiter=';', quotechar='"')
+
+
+def _report(table, rows, started, final=False):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    label = "done" if final else "progress"
+    print(f"{table}: {label} {rows} rows in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/sec)")
+
+
+def import_table(connection, table, data_dir, batch_size, resume, skip_invalid):
+    filename, _, columns = TABLES[table]
+    names = [column for column, _, _ in columns]
+    insert = (
+        f"INSERT INTO {table} ({', '.join(names)}) "
+        f"VALUES ({', '.join(['%s'] * len(names))})"
+    )
+
+    cursor = connection.cursor()
+    try:
+        rows_done = 0
+        if resume:
+            cursor.execute("SELECT rows_done FROM bulk_import_progress WHERE table_name = %s", (table,))
+            saved = cursor.fetchone()
+            rows_done = saved[0] if saved else 0
+            if rows_done:
+                print(f"{table}: resuming after {rows_done} rows")
+
+        started = time.monotonic()
+        loaded = rejected = 0
+        next_index = rows_done
+        batch = []
+        last_report = started
+
+        with open(os.path.join(data_dir, filename), newline='', encoding='utf-8') as handle:
+            reader = _reader(handle)
+            header = next(reader, None)
+            if header != names:
+                raise InvalidRow(f"{filename}: header {header} does not match {names}")
+
+            for index, row in enumerate(reader):
+                # `index` counts data rows; resume skips the ones already committed
+                if index < rows_done:
+                    continue
+                next_index = index + 1
+                try:
+                    batch.append(parse_row(table, reader.line_num, row))
+                except InvalidRow as e:
+                    if not skip_invalid:
+                        raise
+                    rejected += 1
+                    print(f"Skipping {e}")
+
+                if len(batch) >= batch_size:
+                    cursor.executemany(insert, batch)
+                    loaded += len(batch)
+                    batch = []
+                    cursor.execute(SAVE_PROGRESS, (table, next_index))
+                    connection.commit()
+                    if time.monotonic() - last_report >= 5:
+                        _report(table, loaded, started)
+                        last_report = time.monotonic()
+
+            if batch:
+                cursor.executemany(insert, batch)
+                loaded += len(batch)
+            cursor.execute(SAVE_PROGRESS, (table, next_index))
+            connection.commit()
+
+        _report(table, loaded, started, final=True)
+        if rejected:
+            print(f"{table}: skipped {rejected} invalid rows")
+        return loaded
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def load_data_table(table, data_dir):
+    """Load a whole file with LOAD DATA LOCAL INFILE (no validation or resume)."""
+    import mysql.connector
+    from config import db_config
+
+    filename, _, columns = TABLES[table]
+    path = os.path.join(data_dir, filename)
+    connection = mysql.connector.connect(**db_config, allow_local_infile=True)
+    cursor = connection.cursor()
+    try:
+        started = time.monotonic()
+        cursor.execute(f"""
+            LOAD DATA LOCAL INFILE %s INTO TABLE {table}
+            FIELDS TERMINATED BY ';' OPTIONALLY ENCLOSED BY '"'
+            LINES TERMINATED BY '\\n'
+            IGNORE 1 LINES
+            ({', '.join(column for column, _, _ in columns)})
+        """, (path,))
+        connection.commit()
+        _report(table, cursor.rowcount, started, final=True)
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if isinstance(value, datetime):
+        return value.strftime('%Y-%m-%d %H:%M:%S')
+    return value
+
+
+def export_table(connection, table, data_dir, batch_size):
+    filename, key, columns = TABLES[table]
+    names = [column for column, _, _ in columns]
+    cursor = connection.cursor()
+    try:
+        started = time.monotonic()
+        exported = 0
+        cursor.execute(f"SELECT {', '.join(names)} FROM {table} ORDER BY {key}")
+        with open(os.path.join(data_dir, filename), 'w', newline='', encoding='utf-8') as handle:
+            writer = csv.writer(handle, delimiter=';', quotechar='"', quoting=csv.QUOTE_NONNUMERIC,
+                                lineterminator='\n')
+            writer.writerow(names)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                writer.writerows([_csv_value(value) for value in row] for row in rows)
+                exported += len(rows)
+        _report(table, exported, started, final=True)
+        return exported
+    finally:
+        cursor.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Import or export the CSV datasets")
+    parser.add_argument('command', choices=['import', 'export'])
+    parser.add_argument('--dir', default=DEFAULT_DIR, help="CSV directory")
+    parser.add_argument('--tables', default=','.join(TABLES), help="comma-separated tables, in load order")
+    parser.add_argument('--batch-size', type=int, default=5000)
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted import")
+    parser.add_argument('--skip-invalid', action='store_true', help="log and skip rows that fail validation")
+    parser.add_argument('--load-data', action='store_true', help="use LOAD DATA LOCAL INFILE")
+    args = parser.parse_args(argv[1:])
+
+    tables = [table for table in args.tables.split(',') if table]
+    unknown = [table for table in tables if table not in TABLES]
+    if unknown:
+        parser.error(f"unknown tables: {', '.join(unknown)}")
+
+    from config import connect
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        if args.command == 'export':
+            os.makedirs(args.dir, exist_ok=True)
+            for table in tables:
+                export_table(connection, table, args.dir, args.batch_size)
+            return 0
+
+        cursor = connection.cursor()
+        cursor.execute(CREATE_PROGRESS_TABLE)
+        if not args.resume:
+            cursor.executemany("DELETE FROM bulk_import_progress WHERE table_name = %s",
+                               [(table,) for table in tables])
+            connection.commit()
+        cursor.close()
+
+        for table in tables:
+            if args.load_data:
+                load_data_table(table, args.dir)
+            else:
+                import_table(connection, table, args.dir, args.batch_size, args.resume, args.skip_invalid)
+        if 'products' in tables:
+            # Otherwise the next stock sync puts the old shard totals back in products.stock
+            print(f"Rewrote stock shards for {reservations.resync(connection)} products")
+    except (Error, InvalidRow, OSError) as e:
+        print(f"Error during {args.command}: {e}")
+        return 1
+    finally:
+        connection.close()
+
+    if 'orders' in tables:
+        print("Orders changed: run `python sales_rollups.py rebuild`, `python cross_sell.py rebuild` "
+              "and `python cohorts.py rebuild`")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
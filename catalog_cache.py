@@ -0,0 +1,84 @@
+import threading
+from collections import OrderedDict
+
+
+def _size(entry):
+    body, _, variants = entry
+    return len(body) + sum(len(data) for data in variants.values())
+
+
+# Bounded LRU cache for serialized catalog responses. Each entry can also
+# hold compressed copies of its body (one per Content-Encoding), so repeat
+# hits do not compress again. Entries are evicted least-recently-used first
+# once either the entry count or the total size of the cached bodies and
+# their compressed copies goes over its limit.
+class CatalogCache:
+    def __init__(self, max_entries=256, max_bytes=16 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (body, etag, {encoding: compressed body})
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; a reader that loaded from the database
+        # before a write committed must not store its (now stale) result
+        self.generation = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+            return entry
+
+    def _evict(self):
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= _size(evicted)
+            self._stats["evictions"] += 1
+
+    def put(self, key, body, etag, generation, variants=None):
+        entry = (body, etag, dict(variants or {}))
+        size = _size(entry)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= _size(old)
+            self._entries[key] = entry
+            self._bytes += size
+            self._evict()
+
+    def put_variant(self, key, etag, encoding, data):
+        """Add a compressed copy to the entry for `key` if it still holds the body tagged `etag`."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != etag or encoding in entry[2]:
+                return
+            entry[2][encoding] = data
+            self._bytes += len(data)
+            self._evict()
+
+    def invalidate(self, *product_ids):
+        """Drop every list entry, plus the entries for the given product ids.
+
+        With no ids the whole cache is cleared.
+        """
+        with self._lock:
+            self.generation += 1
+            self._stats["invalidations"] += 1
+            for key in list(self._entries):
+                if key[0] != 'product' or not product_ids or key[1] in product_ids:
+                    self._bytes -= _size(self._entries.pop(key))
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entries": len(self._entries), "bytes": self._bytes})
+        return stats
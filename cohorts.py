@@ -0,0 +1,486 @@
+"""Customer retention and cohort tables from per-user activity bitmaps.
+
+customer_activity holds one row per customer: the day of their first order
+and a bitmap of the days they ordered on (bit i: an order on
+first_order_date + i days). /place-order sets the bit for today in the same
+transaction as its orders rows; cancelling or deleting an order recomputes
+that one customer's bitmap from their own orders (idx_orders_user_date).
+
+CohortIndex keeps the bitmaps in memory and answers any window or period
+question from them without reading `orders`:
+
+    retention(window=2)              the /sales-report/customer-retention
+                                     numbers for windows of `window` days
+    matrix('month', periods=12)      first-order cohort x period table
+
+Migration 6 creates and fills the table; `python cohorts.py rebuild`
+refills it from orders and `python cohorts.py verify` compares it (and the
+retention numbers) with fresh queries over orders.
+"""
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import queries
+from result_cache import Flight
+
+EPOCH = date(1970, 1, 1)
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS customer_activity (
+        user_id INT PRIMARY KEY,
+        first_order_date DATE NOT NULL,
+        active_days BLOB NOT NULL,
+        KEY idx_customer_activity_first_order (first_order_date)
+    )
+"""
+
+UPSERT_ACTIVITY = """
+    INSERT INTO customer_activity (user_id, first_order_date, active_days)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        first_order_date = VALUES(first_order_date),
+        active_days = VALUES(active_days)
+"""
+
+LOAD_ACTIVITY = "SELECT user_id, first_order_date, active_days FROM customer_activity"
+
+ORDER_DAYS_QUERY = """
+    SELECT user_id, DATE(order_date)
+    FROM orders
+    WHERE user_id IS NOT NULL AND order_date IS NOT NULL
+"""
+
+# {} is the list of user id placeholders in the three below
+LOCK_ACTIVITY = """
+    SELECT user_id, first_order_date, active_days FROM customer_activity
+    WHERE user_id IN ({}) FOR UPDATE
+"""
+
+USER_ORDER_DAYS_QUERY = """
+    SELECT user_id, DATE(order_date) FROM orders
+    WHERE user_id IN ({}) AND order_date IS NOT NULL
+"""
+
+USER_NAMES_QUERY = "SELECT name FROM users WHERE id IN ({})"
+
+PERIODS = ('day', 'week', 'month')
+MAX_PERIODS = 120
+
+
+def _day(value):
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+
+def _date(day):
+    return EPOCH + timedelta(days=day)
+
+
+def _encode(bits):
+    return bits.to_bytes((bits.bit_length() + 7) // 8, 'little')
+
+
+def _decode(blob):
+    return int.from_bytes(bytes(blob), 'little')
+
+
+def _from_days(days):
+    first = min(days)
+    bits = 0
+    for day in days:
+        bits |= 1 << (day - first)
+    return first, bits
+
+
+def _merge(state, other):
+    (first, bits), (other_first, other_bits) = state, other
+    start = min(first, other_first)
+    return start, (bits << (first - start)) | (other_bits << (other_first - start))
+
+
+def _active(state, start, end=None):
+    """Whether the customer ordered on any day from `start` to `end` (inclusive; None: open-ended)."""
+    first, bits = state
+    if end is not None and end < first:
+        return False
+    offset = max(start - first, 0)
+    bits >>= offset
+    if end is not None:
+        bits &= (1 << (end - first - offset + 1)) - 1
+    return bits != 0
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+# -- periods -------------------------------------------------------------------
+# A period is numbered so that consecutive periods have consecutive numbers
+
+def _period_of(day, period):
+    if period == 'day':
+        return day
+    if period == 'week':
+        return (day + 3) // 7  # weeks start on Monday; 1970-01-01 was a Thursday
+    value = _date(day)
+    return value.year * 12 + value.month - 1
+
+
+def _period_label(number, period):
+    if period == 'day':
+        return _date(number).isoformat()
+    if period == 'week':
+        return _date(number * 7 - 3).isoformat()
+    return f"{number // 12:04d}-{number % 12 + 1:02d}"
+
+
+# -- maintenance, inside the order routes' transactions -------------------------
+
+def record_orders(cursor, rows):
+    """Mark new orders, (user_id, order date) pairs, in the customers' bitmaps.
+
+    Must run inside the transaction that inserts the orders rows. Returns
+    {user_id: state} to hand to CohortIndex.add() once it has committed.
+    """
+    days = defaultdict(set)
+    for user_id, order_date in rows:
+        if user_id is not None:
+            days[int(user_id)].add(_day(order_date))
+    if not days:
+        return {}
+
+    user_ids = sorted(days)
+    cursor.execute(LOCK_ACTIVITY.format(_placeholders(user_ids)), user_ids)
+    states = {row[0]: (_day(row[1]), _decode(row[2])) for row in cursor.fetchall()}
+    for user_id, new_days in days.items():
+        added = _from_days(new_days)
+        states[user_id] = _merge(states[user_id], added) if user_id in states else added
+    cursor.executemany(UPSERT_ACTIVITY, [
+        (user_id, _date(first), _encode(bits)) for user_id, (first, bits) in states.items()
+    ])
+    return states
+
+
+def refresh_users(cursor, user_ids):
+    """Recompute these customers' bitmaps from their orders (after orders were removed).
+
+    Must run inside the transaction that removes the orders rows. Returns
+    {user_id: state or None} to hand to CohortIndex.replace() once it has committed.
+    """
+    user_ids = sorted({int(user_id) for user_id in user_ids if user_id is not None})
+    if not user_ids:
+        return {}
+    cursor.execute(USER_ORDER_DAYS_QUERY.format(_placeholders(user_ids)), user_ids)
+    days = defaultdict(set)
+    for user_id, order_day in cursor.fetchall():
+        days[user_id].add(_day(order_day))
+    states = {user_id: _from_days(days[user_id]) if days[user_id] else None for user_id in user_ids}
+
+    present = [(user_id, _date(state[0]), _encode(state[1])) for user_id, state in states.items() if state]
+    if present:
+        cursor.executemany(UPSERT_ACTIVITY, present)
+    gone = [(user_id,) for user_id, state in states.items() if state is None]
+    if gone:
+        cursor.executemany("DELETE FROM customer_activity WHERE user_id = %s", gone)
+    return states
+
+
+def order_states(cursor):
+    """Every customer's state computed from orders (for backfill and verify)."""
+    cursor.execute(ORDER_DAYS_QUERY)
+    days = defaultdict(set)
+    for user_id, order_day in cursor.fetchall():
+        days[user_id].add(_day(order_day))
+    return {user_id: _from_days(user_days) for user_id, user_days in days.items()}
+
+
+def backfill(cursor, batch_size=1000):
+    """Refill customer_activity from orders (migration step and `rebuild`)."""
+    states = order_states(cursor)
+    cursor.execute("DELETE FROM customer_activity")
+    rows = [(user_id, _date(first), _encode(bits)) for user_id, (first, bits) in states.items()]
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(UPSERT_ACTIVITY, rows[start:start + batch_size])
+
+
+# -- queries ---------------------------------------------------------------------
+
+def retention(states, window=2, today=None):
+    """Customers who ordered in the `window` days before the last `window` days
+    and again since then, as the old fixed two-day report computed it:
+    previous = [today - 2*window, today - window), current = today - window onwards.
+    `states` are (user_id, state) pairs."""
+    today = _day(today or date.today())
+    current_start, previous_start = today - window, today - 2 * window
+    previous = retained = 0
+    retained_ids = []
+    for user_id, state in states:
+        if _active(state, previous_start, current_start - 1):
+            previous += 1
+            if _active(state, current_start):
+                retained += 1
+                retained_ids.append(user_id)
+    rate = None
+    if previous:
+        # Same precision as MySQL's COUNT / COUNT * 100
+        rate = (Decimal(retained) / Decimal(previous)).quantize(Decimal('0.0001'), ROUND_HALF_UP) * 100
+    return {"RetainedCustomers": retained, "PreviousPeriodCustomers": previous, "RetentionRate": rate,
+            "RetainedCustomerIds": retained_ids}
+
+
+def matrix(states, period='month', periods=12, since=None, until=None):
+    """One row per first-order cohort (from `since` to `until`): its size and how many
+    of its customers ordered in each of its first `periods` periods (None for periods
+    that have not started yet)."""
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    if not 1 <= periods <= MAX_PERIODS:
+        raise ValueError(f"periods must be between 1 and {MAX_PERIODS}")
+    low = _day(since) if since else None
+    high = _day(until) if until else None
+    last = _period_of(_day(date.today()), period)
+
+    cohorts = {}
+    for _, (first, bits) in states:
+        if low is not None and first < low or high is not None and first > high:
+            continue
+        cohort = _period_of(first, period)
+        counts = cohorts.setdefault(cohort, [0] * periods)
+        offset = -1
+        while bits:
+            low_bit = bits & -bits
+            bits ^= low_bit
+            k = _period_of(first + low_bit.bit_length() - 1, period) - cohort
+            if k >= periods:
+                break
+            if k != offset:
+                counts[k] += 1
+                offset = k
+
+    rows = []
+    for cohort in sorted(cohorts):
+        counts = cohorts[cohort]
+        size = counts[0]
+        active = [count if cohort + k <= last else None for k, count in enumerate(counts)]
+        rows.append({
+            "cohort": _period_label(cohort, period),
+            "customers": size,
+            "active": active,
+            "retention": [None if count is None else round(count * 100 / size, 2) for count in active],
+        })
+    return rows
+
+
+# In-memory copy of customer_activity. Loaded on the first query and again
+# once it is `max_age` seconds old, so changes made by other app servers
+# show up; this server's own writes are applied as they commit.
+class CohortIndex:
+    def __init__(self, connect, max_age=300.0):
+        self.connect = connect
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._states = None  # user id -> (first day, bits)
+        self._loaded_at = None
+        self._flight = None  # the load in progress, if any
+        self._pending = []  # (merge, states) that arrived while loading
+        self._stats = {"loads": 0, "updates": 0, "load_seconds": 0.0, "errors": 0}
+
+    def load(self):
+        """Reload the bitmaps from customer_activity, or wait for the load already running."""
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._start()
+        if leader:
+            self._run(flight)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+
+    def _start(self):
+        # Called with the lock held
+        self._flight = Flight()
+        self._pending = []
+        return self._flight
+
+    def _run(self, flight, background=False):
+        started = time.perf_counter()
+        try:
+            connection = self.connect()
+            try:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(LOAD_ACTIVITY)
+                    states = {row[0]: (_day(row[1]), _decode(row[2])) for row in cursor.fetchall()}
+                finally:
+                    cursor.close()
+            finally:
+                connection.close()
+            with self._lock:
+                for merge, changes in self._pending:
+                    self._apply(states, merge, changes)
+                self._states = states
+                self._loaded_at = time.monotonic()
+                self._stats["loads"] += 1
+                self._stats["load_seconds"] = round(time.perf_counter() - started, 3)
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            if background:
+                # Nobody is waiting on a reload; keep serving the old bitmaps
+                print(f"Error reloading the cohort index: {e}")
+        finally:
+            with self._lock:
+                self._flight, self._pending = None, []
+            flight.done.set()
+
+    @staticmethod
+    def _apply(states, merge, changes):
+        for user_id, state in changes.items():
+            if state is None:
+                states.pop(user_id, None)
+            elif merge and user_id in states:
+                # Writes by the same customer may commit in either order
+                states[user_id] = _merge(states[user_id], state)
+            else:
+                states[user_id] = state
+
+    def _update(self, merge, changes):
+        if not changes:
+            return
+        with self._lock:
+            self._stats["updates"] += 1
+            if self._flight is not None:
+                self._pending.append((merge, changes))
+            if self._states is not None:
+                self._apply(self._states, merge, changes)
+
+    def add(self, changes):
+        """Apply record_orders() results."""
+        self._update(True, changes)
+
+    def replace(self, changes):
+        """Apply refresh_users() results."""
+        self._update(False, changes)
+
+    def _current(self):
+        # Stale bitmaps are served while one background thread reloads them;
+        # only the first callers, with nothing loaded yet, wait for a load
+        with self._lock:
+            if self._states is not None:
+                if time.monotonic() - self._loaded_at >= self.max_age and self._flight is None:
+                    flight = self._start()
+                    threading.Thread(target=self._run, args=(flight, True), daemon=True).start()
+                return list(self._states.items())
+        self.load()
+        with self._lock:
+            return list(self._states.items())
+
+    def retention(self, window=2, today=None):
+        return retention(self._current(), window, today)
+
+    def matrix(self, period='month', periods=12, since=None, until=None):
+        return matrix(self._current(), period, periods, since, until)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["customers"] = len(self._states) if self._states is not None else 0
+            stats["age_seconds"] = round(time.monotonic() - self._loaded_at, 1) if self._loaded_at else None
+        return stats
+
+
+def customer_names(connection, user_ids, batch_size=1000):
+    """Distinct names of these users, sorted (as GROUP_CONCAT(DISTINCT name) lists them)."""
+    names = set()
+    cursor = connection.cursor()
+    try:
+        user_ids = list(user_ids)
+        for start in range(0, len(user_ids), batch_size):
+            chunk = user_ids[start:start + batch_size]
+            cursor.execute(USER_NAMES_QUERY.format(_placeholders(chunk)), chunk)
+            names.update(row[0] for row in cursor.fetchall() if row[0] is not None)
+    finally:
+        cursor.close()
+    return sorted(names)
+
+
+def with_names(connection, result):
+    """Turn a retention() result into the /sales-report/customer-retention row."""
+    names = customer_names(connection, result.pop("RetainedCustomerIds"))
+    result["RetainedCustomerNames"] = ','.join(names) if names else None
+    return result
+
+
+def verify(connection):
+    """Compare customer_activity with orders and the retention numbers with
+    CUSTOMER_RETENTION_QUERY; return the mismatches."""
+    mismatches = []
+    cursor = connection.cursor()
+    try:
+        expected = order_states(cursor)
+        cursor.execute(LOAD_ACTIVITY)
+        actual = {row[0]: (_day(row[1]), _decode(row[2])) for row in cursor.fetchall()}
+        for user_id in expected.keys() | actual.keys():
+            if expected.get(user_id) != actual.get(user_id):
+                mismatches.append(('customer_activity', user_id, expected.get(user_id), actual.get(user_id)))
+    finally:
+        cursor.close()
+
+    cursor = connection.cursor(dictionary=True)
+    try:
+        cursor.execute(queries.CUSTOMER_RETENTION_QUERY)
+        sql_row = cursor.fetchone()
+    finally:
+        cursor.close()
+    row = with_names(connection, retention(actual.items()))
+    for column in ('RetainedCustomers', 'PreviousPeriodCustomers', 'RetentionRate'):
+        if sql_row[column] != row[column]:
+            mismatches.append(('retention', column, sql_row[column], row[column]))
+    return mismatches
+
+
+def main(argv):
+    if len(argv) != 2 or argv[1] not in ('rebuild', 'verify'):
+        print("Usage: python cohorts.py rebuild|verify")
+        return 2
+
+    from config import connect
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        if argv[1] == 'rebuild':
+            cursor = connection.cursor()
+            try:
+                cursor.execute(CREATE_TABLE)
+                connection.start_transaction()
+                backfill(cursor)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+            finally:
+                cursor.close()
+            print("customer_activity rebuilt from orders")
+        mismatches = verify(connection)
+    finally:
+        connection.close()
+
+    for table, key, expected, actual in mismatches:
+        print(f"{table} {key}: expected {expected}, found {actual}")
+    print("Customer activity matches orders" if not mismatches else f"{len(mismatches)} rows differ from orders")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
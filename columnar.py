@@ -0,0 +1,584 @@
+"""In-memory columnar copy of orders, users and products for the reports.
+
+ColumnarEngine loads the three tables once into NumPy arrays: order prices
+as integer cents, order dates as integer days since 1970-01-01, and product
+names and categories dictionary-encoded as int32 codes. The reports below
+are then vectorized group-bys over those arrays and read nothing from
+MySQL:
+
+    daily_sales()                    /sales-report/daily-sales
+    customer_segmentation()          /analytics/customer-segmentation
+    purchase_frequency()             /analytics/purchase-frequency
+    top_customers()                  /sales-report/top-customers
+    popular_products_by_category()   /trending/popular-products-by-category
+
+Each returns the same rows (names, types, order) as its SQL version. New
+orders are appended in place (append_orders), cancelled ones are masked
+out (delete_orders), and users or products the engine has not seen are
+fetched by id the next time a report runs.
+
+    python columnar.py check    # compare every report with its SQL version,
+                                # after a full load and via the append path
+"""
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+
+import numpy as np
+from mysql.connector import Error
+
+import queries
+import sales_rollups
+from result_cache import Flight
+
+EPOCH = date(1970, 1, 1)
+
+LOAD_ORDERS = """
+    SELECT id, user_id, product_id, total_price, DATE(order_date) AS order_day
+    FROM orders
+    WHERE id > %s
+    ORDER BY id
+"""
+LOAD_USERS = "SELECT id, name, email FROM users"
+LOAD_PRODUCTS = "SELECT id, name, category FROM products"
+
+
+def _cents(value):
+    return int((Decimal(str(value or 0)) * 100).to_integral_value(ROUND_HALF_UP))
+
+
+def _money(cents):
+    return Decimal(int(cents)).scaleb(-2)
+
+
+def _average(total, count, places):
+    # MySQL's AVG() of a DECIMAL keeps 4 more digits than its argument
+    return (Decimal(int(total)) / Decimal(int(count))).quantize(Decimal(1).scaleb(-places), ROUND_HALF_UP)
+
+
+def _day(value):
+    return (value - EPOCH).days
+
+
+def _sum_by(keys, values):
+    """Group `values` by `keys`; returns (unique keys, counts, integer sums)."""
+    unique, inverse = np.unique(keys, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(unique))
+    # float64 sums of integer cents are exact below 2**53
+    sums = np.rint(np.bincount(inverse, weights=values, minlength=len(unique))).astype(np.int64)
+    return unique, counts, sums
+
+
+# Growable 1-D array: appends double the capacity instead of copying each time
+class _Column:
+    def __init__(self, dtype, capacity=1024):
+        self._data = np.empty(capacity, dtype=dtype)
+        self.size = 0
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self._data.dtype)
+        needed = self.size + len(values)
+        if needed > len(self._data):
+            grown = np.empty(max(needed, 2 * len(self._data)), dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = values
+        self.size = needed
+
+    @property
+    def values(self):
+        return self._data[:self.size]
+
+
+# String dictionary: each distinct value gets an int32 code (None is -1)
+class _Dictionary:
+    def __init__(self):
+        self.values = []
+        self._codes = {}
+
+    def encode(self, value):
+        if value is None:
+            return -1
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class ColumnarEngine:
+    def __init__(self, connect):
+        self.connect = connect
+        self._lock = threading.Lock()
+        self.loaded = False
+        # Changes that arrive while load() is reading, applied once it is done
+        self._flight = None  # the load in progress, if any
+        self._pending_appends = []
+        self._pending_deletes = []
+        self._pending_prices = []  # (order id, total price)
+        self._pending_products = set()  # product ids to refetch
+        self._fetch = None  # the _fetch_missing() query in progress, if any
+        self._loads = 0  # completed loads, so a fetch can tell it raced one
+        self._reset()
+
+    def _reset(self):
+        self._order_id = _Column(np.int64)
+        self._user_id = _Column(np.int64)
+        self._product_id = _Column(np.int64)
+        self._cents = _Column(np.int64)
+        self._day = _Column(np.int32)
+        self._live = _Column(np.bool_)
+        self._row_of = {}  # order id -> row
+        self._users = {}  # user id -> (name, email)
+        self._products = {}  # product id -> (name code, category code)
+        self._names = _Dictionary()
+        self._categories = _Dictionary()
+        self._missing_users = set()
+        self._missing_products = set()
+        self._dimensions = None  # sorted id arrays and attributes, rebuilt after changes
+        self._stats = {"orders": 0, "appended": 0, "deleted": 0, "load_seconds": 0.0}
+
+    # -- loading ------------------------------------------------------------
+
+    def load(self, connection=None, max_order_id=None):
+        """Load everything from MySQL (orders up to `max_order_id` when given),
+        or wait for the load already running."""
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = Flight()
+        if leader:
+            self._run(flight, connection, max_order_id)
+        else:
+            flight.done.wait()
+        if flight.error is not None:
+            raise flight.error
+
+    def _run(self, flight, connection, max_order_id):
+        own = connection is None
+        started = time.perf_counter()
+        try:
+            connection = connection or self._connect()
+            cursor = connection.cursor()
+            try:
+                cursor.execute(LOAD_USERS)
+                users = cursor.fetchall()
+                cursor.execute(LOAD_PRODUCTS)
+                products = cursor.fetchall()
+                cursor.execute(LOAD_ORDERS, (0,))
+                orders = cursor.fetchall()
+            finally:
+                cursor.close()
+                if own:
+                    connection.close()
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                # The state from the last load (if any) is kept; bring it up to date
+                if self.loaded:
+                    self._apply_pending()
+                self._clear_pending()
+                self._flight = None
+            flight.done.set()
+            return
+        if max_order_id is not None:
+            orders = [row for row in orders if row[0] <= max_order_id]
+
+        with self._lock:
+            self._reset()
+            self._set_users(users)
+            self._set_products(products)
+            self._append(orders)
+            self._apply_pending()
+            self._clear_pending()
+            self._flight = None
+            self._loads += 1
+            self.loaded = True
+            self._stats["load_seconds"] = round(time.perf_counter() - started, 3)
+        flight.done.set()
+
+    def _connect(self):
+        connection = self.connect()
+        if connection is None:
+            # app.get_primary_connection() has already printed why
+            raise Error("Could not connect to MySQL")
+        return connection
+
+    def _apply_pending(self):
+        self._append(self._pending_appends)
+        self._delete(self._pending_deletes)
+        for order_id, total_price in self._pending_prices:
+            self._set_price(order_id, total_price)
+        self._invalidate(self._pending_products)
+
+    def _clear_pending(self):
+        self._pending_appends, self._pending_deletes = [], []
+        self._pending_prices, self._pending_products = [], set()
+
+    def _set_users(self, rows):
+        for user_id, name, email in rows:
+            self._users[user_id] = (name, email)
+            self._missing_users.discard(user_id)
+        self._dimensions = None
+
+    def _set_products(self, rows):
+        for product_id, name, category in rows:
+            self._products[product_id] = (self._names.encode(name), self._categories.encode(category))
+            self._missing_products.discard(product_id)
+        self._dimensions = None
+
+    def _append(self, rows):
+        rows = [row for row in rows if row[0] not in self._row_of]
+        if not rows:
+            return
+        start = self._order_id.size
+        order_ids = [row[0] for row in rows]
+        self._order_id.extend(order_ids)
+        self._user_id.extend([row[1] for row in rows])
+        self._product_id.extend([row[2] for row in rows])
+        self._cents.extend([_cents(row[3]) for row in rows])
+        self._day.extend([_day(row[4]) for row in rows])
+        self._live.extend(np.ones(len(rows), dtype=np.bool_))
+        self._row_of.update(zip(order_ids, range(start, start + len(rows))))
+        self._missing_users.update(row[1] for row in rows if row[1] not in self._users)
+        self._missing_products.update(row[2] for row in rows if row[2] not in self._products)
+        self._stats["orders"] += len(rows)
+
+    # -- incremental changes ------------------------------------------------
+
+    def append_orders(self, rows):
+        """Add new orders: (id, user_id, product_id, total_price, order date) tuples."""
+        with self._lock:
+            if self._flight is not None:
+                self._pending_appends.extend(rows)
+            elif self.loaded:
+                self._append(rows)
+                self._stats["appended"] += len(rows)
+
+    def delete_orders(self, order_ids):
+        with self._lock:
+            if self._flight is not None:
+                self._pending_deletes.extend(order_ids)
+            else:
+                self._delete(order_ids)
+
+    def _delete(self, order_ids):
+        for order_id in order_ids:
+            row = self._row_of.get(order_id)
+            if row is not None and self._live.values[row]:
+                self._live.values[row] = False
+                self._stats["orders"] -= 1
+                self._stats["deleted"] += 1
+
+    def update_order_price(self, order_id, total_price):
+        with self._lock:
+            if self._flight is not None:
+                self._pending_prices.append((order_id, total_price))
+            else:
+                self._set_price(order_id, total_price)
+
+    def _set_price(self, order_id, total_price):
+        row = self._row_of.get(order_id)
+        if row is not None:
+            self._cents.values[row] = _cents(total_price)
+
+    def invalidate_products(self, *product_ids):
+        """Refetch these products (renamed, recategorized or deleted) before the next report."""
+        with self._lock:
+            if self._flight is not None:
+                # The load may have read them before the change
+                self._pending_products.update(product_ids)
+            else:
+                self._invalidate(product_ids)
+
+    def _invalidate(self, product_ids):
+        for product_id in product_ids:
+            self._products.pop(product_id, None)
+            self._missing_products.add(product_id)
+        self._dimensions = None
+
+    def _fetch_missing(self):
+        # Users and products referenced by appended orders, fetched by id.
+        # Called with the lock held; it is released for the queries, and
+        # concurrent reports wait for the fetch already running.
+        while self._missing_users or self._missing_products or self._fetch is not None:
+            if self._fetch is not None:
+                fetch = self._fetch
+                self._lock.release()
+                try:
+                    fetch.done.wait()
+                finally:
+                    self._lock.acquire()
+                if fetch.error is not None:
+                    raise fetch.error
+                continue
+
+            fetch = self._fetch = Flight()
+            users, products = sorted(self._missing_users), sorted(self._missing_products)
+            # Ids the fetch does not return were deleted; the SQL joins drop them too
+            self._missing_users.clear()
+            self._missing_products.clear()
+            loads = self._loads
+            self._lock.release()
+            try:
+                fetch.value = self._query_missing(users, products)
+            except Exception as e:
+                fetch.error = e
+            finally:
+                self._lock.acquire()
+            self._fetch = None
+            if fetch.error is not None:
+                self._missing_users.update(users)
+                self._missing_products.update(products)
+            elif loads == self._loads:  # otherwise a reload has read newer rows
+                user_rows, product_rows = fetch.value
+                # Ids invalidated again during the fetch stay missing
+                self._set_users([row for row in user_rows if row[0] not in self._missing_users])
+                self._set_products([row for row in product_rows if row[0] not in self._missing_products])
+            fetch.done.set()
+            if fetch.error is not None:
+                raise fetch.error
+
+    def _query_missing(self, users, products):
+        user_rows, product_rows = [], []
+        connection = self._connect()
+        cursor = connection.cursor()
+        try:
+            if users:
+                cursor.execute(LOAD_USERS + f" WHERE id IN ({', '.join(['%s'] * len(users))})", users)
+                user_rows = cursor.fetchall()
+            if products:
+                cursor.execute(LOAD_PRODUCTS + f" WHERE id IN ({', '.join(['%s'] * len(products))})", products)
+                product_rows = cursor.fetchall()
+        finally:
+            cursor.close()
+            connection.close()
+        return user_rows, product_rows
+
+    def _prepare(self):
+        """Load on first use, fetch missing dimension rows, return the dimension arrays."""
+        if not self.loaded:
+            # Concurrent first reports share one load
+            self._lock.release()
+            try:
+                self.load()
+            finally:
+                self._lock.acquire()
+        self._fetch_missing()
+        if self._dimensions is None:
+            user_ids = np.array(sorted(self._users), dtype=np.int64)
+            product_ids = np.array(sorted(self._products), dtype=np.int64)
+            self._dimensions = {
+                "user_ids": user_ids,
+                "product_ids": product_ids,
+                "product_name": np.array([self._products[i][0] for i in product_ids.tolist()], dtype=np.int32),
+                "product_category": np.array([self._products[i][1] for i in product_ids.tolist()], dtype=np.int32),
+            }
+        return self._dimensions
+
+    def _orders(self):
+        live = self._live.values
+        return (self._user_id.values[live], self._product_id.values[live],
+                self._cents.values[live], self._day.values[live])
+
+    @staticmethod
+    def _join(ids, dimension_ids):
+        """Row in `dimension_ids` (sorted) for each of `ids`, and which ids were found."""
+        if len(dimension_ids) == 0:
+            return np.zeros(len(ids), dtype=np.int64), np.zeros(len(ids), dtype=np.bool_)
+        position = np.searchsorted(dimension_ids, ids)
+        position = np.minimum(position, len(dimension_ids) - 1)
+        return position, dimension_ids[position] == ids
+
+    # -- reports ------------------------------------------------------------
+
+    def daily_sales(self):
+        with self._lock:
+            self._prepare()
+            _, _, cents, days = self._orders()
+            unique, _, sums = _sum_by(days, cents)
+        return [{"date": EPOCH + timedelta(days=int(day)), "total_sales": _money(total)}
+                for day, total in zip(unique[::-1].tolist(), sums[::-1].tolist())]
+
+    def _spend_by_user(self, dimensions):
+        user_ids, _, cents, _ = self._orders()
+        _, found = self._join(user_ids, dimensions["user_ids"])
+        return _sum_by(user_ids[found], cents[found])
+
+    def customer_segmentation(self):
+        with self._lock:
+            users, _, spent = self._spend_by_user(self._prepare())
+        segments = np.where(spent < 150000, 1, np.where(spent <= 350000, 2, 0))
+        names = ['High Spender', 'Low Spender', 'Medium Spender']
+        counts = np.bincount(segments, minlength=3)
+        totals = np.rint(np.bincount(segments, weights=spent, minlength=3)).astype(np.int64)
+        rows = [{"CustomerSegment": names[i], "CustomerCount": int(counts[i]),
+                 "AvgSpend": _average(totals[i], counts[i] * 100, 6)}
+                for i in range(3) if counts[i]]
+        if len(users):
+            # WITH ROLLUP's grand total row
+            rows.append({"CustomerSegment": None, "CustomerCount": int(len(users)),
+                         "AvgSpend": _average(int(spent.sum()), len(users) * 100, 6)})
+        return rows
+
+    def purchase_frequency(self):
+        with self._lock:
+            self._prepare()
+            user_ids, _, _, _ = self._orders()
+            _, order_counts = np.unique(user_ids, return_counts=True)
+        # One-time, 2-5 times, 6-10 times, more than 10 times
+        buckets = np.digitize(order_counts, [2, 6, 11])
+        labels = ['One-time', '2-5 times', '6-10 times', 'More than 10 times']
+        customers = np.bincount(buckets, minlength=4)
+        orders = np.bincount(buckets, weights=order_counts, minlength=4)
+        return [{"PurchaseFrequency": labels[i], "CustomerCount": int(customers[i]),
+                 "AvgOrders": _average(round(orders[i]), customers[i], 4)}
+                for i in range(4) if customers[i]]
+
+    def top_customers(self, limit=5):
+        with self._lock:
+            dimensions = self._prepare()
+            users, _, spent = self._spend_by_user(dimensions)
+            top = np.argsort(-spent, kind='stable')[:limit]
+            details = [self._users[user_id] for user_id in users[top].tolist()]
+        return [{"customer_name": name, "email": email, "total_spent": _money(total)}
+                for (name, email), total in zip(details, spent[top].tolist())]
+
+    def popular_products_by_category(self):
+        with self._lock:
+            dimensions = self._prepare()
+            _, product_ids, cents, _ = self._orders()
+            position, found = self._join(product_ids, dimensions["product_ids"])
+            name = dimensions["product_name"][position[found]].astype(np.int64)
+            category = dimensions["product_category"][position[found]].astype(np.int64)
+            # GROUP BY category, name as one int64 key
+            keys, counts, sums = _sum_by((category + 1) << 32 | name, cents[found])
+            categories = list(self._categories.values)
+            names = list(self._names.values)
+        group_category = (keys >> 32) - 1
+        group_name = keys & 0xFFFFFFFF
+        rows = [{"category_name": categories[c] if c >= 0 else None, "product_name": names[n],
+                 "items_sold": int(count), "total_revenue": _money(total)}
+                for c, n, count, total in zip(group_category.tolist(), group_name.tolist(),
+                                              counts.tolist(), sums.tolist())]
+        # ORDER BY category ASC (NULL first), items_sold DESC
+        rows.sort(key=lambda row: (row["category_name"] is not None, (row["category_name"] or '').casefold(),
+                                   -row["items_sold"]))
+        return rows
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"loaded": int(self.loaded), "users": len(self._users), "products": len(self._products),
+                          "capacity": len(self._order_id._data)})
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# Parity check against the SQL versions
+
+# report -> (SQL, engine method, key columns; rows compared as sets on these)
+REPORTS = {
+    'daily_sales': (sales_rollups.DAILY_SALES_QUERY, 'daily_sales', ('date',)),
+    'customer_segmentation': (queries.CUSTOMER_SEGMENTATION_QUERY, 'customer_segmentation', ('CustomerSegment',)),
+    'purchase_frequency': (queries.PURCHASE_FREQUENCY_QUERY, 'purchase_frequency', ('PurchaseFrequency',)),
+    'top_customers': (sales_rollups.TOP_CUSTOMERS_QUERY, 'top_customers', None),
+    'popular_products_by_category': (queries.POPULAR_PRODUCTS_BY_CATEGORY_QUERY, 'popular_products_by_category',
+                                     ('category_name', 'product_name')),
+}
+
+
+def _same(expected, actual):
+    if isinstance(expected, (Decimal, float)) or isinstance(actual, (Decimal, float)):
+        return expected is not None and actual is not None and abs(Decimal(str(expected)) - Decimal(str(actual))) <= Decimal('0.0001')
+    return expected == actual
+
+
+def compare(name, expected, actual):
+    """Differences between the SQL rows and the engine's rows for one report."""
+    _, _, key = REPORTS[name]
+    if key is None:
+        # Ranked with a LIMIT: ties may be cut differently, so compare the ranked values only
+        expected = [{"total_spent": row["total_spent"]} for row in expected]
+        actual = [{"total_spent": row["total_spent"]} for row in actual]
+        pairs = list(zip(expected, actual))
+    else:
+        by_key = {tuple(row[column] for column in key): row for row in actual}
+        pairs = [(row, by_key.pop(tuple(row[column] for column in key), None)) for row in expected]
+        pairs += [(None, row) for row in by_key.values()]
+    differences = []
+    if len(expected) != len(actual):
+        differences.append(f"{name}: {len(expected)} rows from SQL, {len(actual)} from the engine")
+    for sql_row, engine_row in pairs:
+        if sql_row is None or engine_row is None or not all(
+                _same(value, engine_row.get(column)) for column, value in sql_row.items()):
+            differences.append(f"{name}: SQL {sql_row} != engine {engine_row}")
+    return differences
+
+
+def check(connection, engine):
+    differences = []
+    timings = []
+    cursor = connection.cursor(dictionary=True)
+    try:
+        for name, (query, method, _) in REPORTS.items():
+            started = time.perf_counter()
+            cursor.execute(query)
+            expected = cursor.fetchall()
+            sql_seconds = time.perf_counter() - started
+            started = time.perf_counter()
+            actual = getattr(engine, method)()
+            timings.append((name, sql_seconds, time.perf_counter() - started))
+            differences += compare(name, expected, actual)
+    finally:
+        cursor.close()
+    return differences, timings
+
+
+def main(argv):
+    if len(argv) != 2 or argv[1] != 'check':
+        print("Usage: python columnar.py check")
+        return 2
+
+    from config import connect
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        # Full load
+        engine = ColumnarEngine(connect)
+        engine.load(connection)
+        differences, timings = check(connection, engine)
+        for name, sql_seconds, engine_seconds in timings:
+            print(f"{name}: SQL {sql_seconds * 1000:.1f} ms, engine {engine_seconds * 1000:.1f} ms")
+
+        # Append path: load the older half, append the rest in batches
+        cursor = connection.cursor()
+        try:
+            cursor.execute(LOAD_ORDERS, (0,))
+            orders = cursor.fetchall()
+        finally:
+            cursor.close()
+        middle = orders[len(orders) // 2][0] if orders else 0
+        engine = ColumnarEngine(connect)
+        engine.load(connection, max_order_id=middle)
+        newer = [row for row in orders if row[0] > middle]
+        for start in range(0, len(newer), 1000):
+            engine.append_orders(newer[start:start + 1000])
+        appended, _ = check(connection, engine)
+        differences += [f"after appends: {difference}" for difference in appended]
+    finally:
+        connection.close()
+
+    for difference in differences:
+        print(difference)
+    print("Columnar engine matches SQL" if not differences else f"{len(differences)} differences from SQL")
+    return 1 if differences else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,107 @@
+"""Response compression negotiated by Accept-Encoding.
+
+Bodies of at least `min_size` bytes are compressed with brotli (when the
+brotli package is installed and the client accepts it) or gzip. Streamed
+responses, and responses that already vary on Accept-Encoding because
+their view negotiated the encoding itself (cached_response() sends bytes it
+compressed earlier), are left alone.
+"""
+import gzip
+import threading
+import time
+
+from flask import request
+
+from metrics import Histogram
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Preference order when the client gives them the same weight
+ENCODINGS = (('br',) if brotli is not None else ()) + ('gzip',)
+
+# Worth the CPU only for formats that are not compressed already
+COMPRESSIBLE = ('application/json', 'application/msgpack', 'text/')
+
+COMPRESSION_DURATION = Histogram('http_compression_duration_seconds', "Time spent compressing a response body",
+                                 ('encoding',))
+
+
+class Compressor:
+    def __init__(self, min_size=1024, gzip_level=6, brotli_quality=5):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self._lock = threading.Lock()
+        self._stats = {"compressed": 0, "from_cache": 0, "skipped_small": 0,
+                       "bytes_in": 0, "bytes_out": 0, "bytes_saved": 0, "seconds": 0.0}
+
+    def choose(self, mimetype, size):
+        """Return the encoding to send a `size`-byte `mimetype` body in, or None to send it as is."""
+        if not mimetype or not mimetype.startswith(COMPRESSIBLE):
+            return None
+        best, best_quality = None, 0
+        for encoding in ENCODINGS:
+            quality = request.accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        if best is not None and size < self.min_size:
+            with self._lock:
+                self._stats["skipped_small"] += 1
+            return None
+        return best
+
+    def compress(self, body, encoding):
+        started = time.perf_counter()
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=self.brotli_quality)
+        else:
+            compressed = gzip.compress(body, compresslevel=self.gzip_level, mtime=0)
+        elapsed = time.perf_counter() - started
+        COMPRESSION_DURATION.observe(elapsed, encoding)
+        with self._lock:
+            self._stats["compressed"] += 1
+            self._stats["seconds"] += elapsed
+        return compressed
+
+    def record(self, size, compressed_size, from_cache=False):
+        """Count one compressed response of `size` bytes sent as `compressed_size`."""
+        with self._lock:
+            self._stats["bytes_in"] += size
+            self._stats["bytes_out"] += compressed_size
+            self._stats["bytes_saved"] += size - compressed_size
+            if from_cache:
+                self._stats["from_cache"] += 1
+
+    def apply(self, response, body, encoding):
+        """Set `body`, already compressed with `encoding`, as the response body."""
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def init_app(self, app):
+        """Compress every eligible response that is not compressed yet."""
+
+        @app.after_request
+        def compress_response(response):
+            if (response.status_code != 200 or response.direct_passthrough or response.is_streamed
+                    or 'Content-Encoding' in response.headers or 'Accept-Encoding' in response.vary):
+                return response
+            response.vary.add('Accept-Encoding')
+            body = response.get_data()
+            encoding = self.choose(response.mimetype, len(body))
+            if encoding is None:
+                return response
+            compressed = self.compress(body, encoding)
+            if len(compressed) >= len(body):
+                return response
+            self.record(len(body), len(compressed))
+            return self.apply(response, compressed, encoding)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+        stats.update({"min_size": self.min_size, "brotli": int(brotli is not None)})
+        return stats
@@ -0,0 +1,31 @@
+"""MySQL settings from the environment (and .env).
+
+Shared by app.py, async_app.py and the command-line tools, which import
+this instead of app.py so they do not start its pools, queues and
+background threads.
+"""
+import os
+
+import mysql.connector
+from dotenv import load_dotenv
+from mysql.connector import Error
+
+# Load environment variables from .env
+load_dotenv()
+
+# Database connection configuration
+db_config = {
+    'host': os.getenv('MYSQL_HOST', 'localhost'),
+    'user': os.getenv('MYSQL_USER', 'root'),
+    'password': os.getenv('MYSQL_PASSWORD', 'rishabh'),  # Replace with your MySQL root password
+    'database': os.getenv('MYSQL_DATABASE', 'project')
+}
+
+
+def connect(**options):
+    """A new (unpooled) MySQL connection for command-line tools, or None if it fails."""
+    try:
+        return mysql.connector.connect(**db_config, **options)
+    except Error as e:
+        print(f"Error connecting to MySQL: {e}")
+        return None
@@ -0,0 +1,114 @@
+"""Product co-occurrence index behind /analytics/product-cross-sell.
+
+The orders table has no order id shared by the rows of one checkout, so a
+basket is the set of orders rows /place-order writes together: same
+user_id, order_date and total_price (the cart total, repeated per row).
+
+product_pairs keeps a counter for each pair of products bought in the same
+basket, stored in both directions so a product's "frequently bought with"
+list is a single index range. /place-order adds its basket in the order
+transaction. Cancellations are not subtracted; `python cross_sell.py
+rebuild` recomputes the counters from the current orders.
+"""
+import sys
+from itertools import permutations
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS product_pairs (
+        product_id INT NOT NULL,
+        other_product_id INT NOT NULL,
+        co_occurrence INT NOT NULL,
+        PRIMARY KEY (product_id, other_product_id),
+        KEY idx_product_pairs_product_count (product_id, co_occurrence),
+        KEY idx_product_pairs_count (co_occurrence)
+    )
+"""
+
+UPSERT_PAIR = """
+    INSERT INTO product_pairs (product_id, other_product_id, co_occurrence)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE co_occurrence = co_occurrence + VALUES(co_occurrence)
+"""
+
+# Each pair is stored twice; product_id < other_product_id picks one copy
+TOP_PAIRS_QUERY = """
+    SELECT p1.name AS Product1, p2.name AS Product2, pp.co_occurrence AS CoOccurrence
+    FROM product_pairs pp
+    JOIN products p1 ON pp.product_id = p1.id
+    JOIN products p2 ON pp.other_product_id = p2.id
+    WHERE pp.product_id < pp.other_product_id
+    ORDER BY pp.co_occurrence DESC
+    LIMIT %s
+"""
+
+BOUGHT_WITH_QUERY = """
+    SELECT p.id AS ProductID, p.name AS Product, pp.co_occurrence AS CoOccurrence
+    FROM product_pairs pp
+    JOIN products p ON pp.other_product_id = p.id
+    WHERE pp.product_id = %s
+    ORDER BY pp.co_occurrence DESC
+    LIMIT %s
+"""
+
+REBUILD_QUERY = """
+    INSERT INTO product_pairs (product_id, other_product_id, co_occurrence)
+    WITH basket_items AS (
+        SELECT DISTINCT user_id, order_date, total_price, product_id
+        FROM orders
+    )
+    SELECT a.product_id, b.product_id, COUNT(*)
+    FROM basket_items a
+    JOIN basket_items b
+      ON a.user_id = b.user_id
+     AND a.order_date = b.order_date
+     AND a.total_price = b.total_price
+     AND a.product_id <> b.product_id
+    GROUP BY a.product_id, b.product_id
+"""
+
+
+def record_basket(cursor, product_ids):
+    """Count every pair of distinct products in one placed basket."""
+    products = sorted(set(product_ids))
+    if len(products) < 2:
+        return
+    cursor.executemany(UPSERT_PAIR, [(a, b, 1) for a, b in permutations(products, 2)])
+
+
+def rebuild(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute(CREATE_TABLE)
+        connection.start_transaction()
+        cursor.execute("DELETE FROM product_pairs")
+        cursor.execute(REBUILD_QUERY)
+        connection.commit()
+        cursor.execute("SELECT COUNT(*) FROM product_pairs WHERE product_id < other_product_id")
+        return cursor.fetchone()[0]
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def main(argv):
+    if len(argv) != 2 or argv[1] != 'rebuild':
+        print("Usage: python cross_sell.py rebuild")
+        return 2
+
+    from config import connect
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        pairs = rebuild(connection)
+    finally:
+        connection.close()
+    print(f"Product co-occurrence index rebuilt: {pairs} product pairs")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from mysql.connector import Error
+
+
+class PoolTimeout(Error):
+    """Raised when no connection could be borrowed within the timeout."""
+
+
+# A borrowed connection. Everything is forwarded to the real MySQL
+# connection except close(), which hands it back to the pool instead.
+class PooledConnection:
+    def __init__(self, pool, raw, created_at):
+        self._pool = pool
+        self._raw = raw
+        self._created_at = created_at
+        self._returned = False
+
+    def __getattr__(self, name):
+        return getattr(self._raw, name)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self._raw.cursor(*args, **kwargs)
+        if self._pool.wrap_cursor is not None:
+            cursor = self._pool.wrap_cursor(cursor)
+        return cursor
+
+    def close(self):
+        if not self._returned:
+            self._returned = True
+            self._pool._release(self._raw, self._created_at)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Fixed-size pool of MySQL connections with a borrow timeout, a liveness
+# check on checkout and recycling of connections older than `recycle` seconds.
+# `on_wait(seconds)` is called with each borrow's wait time and
+# `wrap_cursor(cursor)` may wrap every cursor handed out (for instrumentation).
+class ConnectionPool:
+    def __init__(self, db_config, size=10, timeout=5.0, recycle=3600, ping_after=30,
+                 on_wait=None, wrap_cursor=None):
+        self.db_config = dict(db_config)
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.on_wait = on_wait
+        self.wrap_cursor = wrap_cursor
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (raw connection, created_at, last_used)
+        self._open = 0
+        self._in_use = 0
+
+        self._stats = {
+            "borrowed": 0,
+            "created": 0,
+            "recycled": 0,
+            "failed_health_checks": 0,
+            "timeouts": 0,
+            "saturated": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+            "peak_in_use": 0,
+        }
+
+    def _connect(self):
+        raw = mysql.connector.connect(**self.db_config)
+        with self._lock:
+            self._stats["created"] += 1
+        return raw, time.monotonic()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Error:
+            pass
+
+    def _forget(self):
+        # A slot was freed without returning a connection to the idle list
+        with self._lock:
+            self._open -= 1
+            self._in_use -= 1
+            self._lock.notify()
+
+    def _healthy(self, raw, created_at, last_used):
+        now = time.monotonic()
+        if self.recycle and now - created_at > self.recycle:
+            with self._lock:
+                self._stats["recycled"] += 1
+            return False
+        if now - last_used < self.ping_after:
+            return True
+        try:
+            raw.ping(reconnect=False)
+            return True
+        except Error:
+            with self._lock:
+                self._stats["failed_health_checks"] += 1
+            return False
+
+    def get_connection(self, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._lock:
+            if not self._idle and self._open >= self.size:
+                self._stats["saturated"] += 1
+            while not self._idle and self._open >= self.size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    if self.on_wait is not None:
+                        self.on_wait(timeout)
+                    raise PoolTimeout(msg=f"Timed out after {timeout}s waiting for a database connection")
+                self._lock.wait(remaining)
+
+            entry = self._idle.popleft() if self._idle else None
+            if entry is None:
+                self._open += 1
+            self._in_use += 1
+
+            waited = time.monotonic() - started
+            self._stats["borrowed"] += 1
+            self._stats["wait_seconds_total"] += waited
+            self._stats["wait_seconds_max"] = max(self._stats["wait_seconds_max"], waited)
+            self._stats["peak_in_use"] = max(self._stats["peak_in_use"], self._in_use)
+
+        if self.on_wait is not None:
+            self.on_wait(waited)
+
+        # Connecting and pinging happen outside the lock
+        try:
+            if entry is not None:
+                raw, created_at, last_used = entry
+                if not self._healthy(raw, created_at, last_used):
+                    self._discard(raw)
+                    raw, created_at = self._connect()
+            else:
+                raw, created_at = self._connect()
+        except Exception:
+            self._forget()
+            raise
+
+        return PooledConnection(self, raw, created_at)
+
+    def _release(self, raw, created_at):
+        # End whatever transaction the borrower left open so the next user
+        # does not inherit its locks or a stale REPEATABLE READ snapshot
+        try:
+            if raw.in_transaction:
+                raw.rollback()
+        except Error:
+            self._discard(raw)
+            self._forget()
+            return
+
+        with self._lock:
+            self._idle.append((raw, created_at, time.monotonic()))
+            self._in_use -= 1
+            self._lock.notify()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+            self._open -= len(idle)
+        for raw, _, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self.size,
+                "open": self._open,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            })
+        stats["wait_seconds_avg"] = (
+            stats["wait_seconds_total"] / stats["borrowed"] if stats["borrowed"] else 0.0
+        )
+        return stats
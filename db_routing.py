@@ -0,0 +1,174 @@
+"""Send read-only queries to MySQL replicas and everything else to the primary.
+
+ReadRouter.get_connection(read_only=True) borrows from the replicas in
+turn, skipping any that is down (a connection to it failed less than
+`retry_after` seconds ago) or lagging (Seconds_Behind_Source above
+`max_lag`, or replication stopped). Lag is read with SHOW REPLICA STATUS
+at most every `check_interval` seconds per replica, by whichever read
+borrows it first once the last reading is stale. With no usable replica
+the read goes to the primary.
+
+Read-your-writes: note_write(key) after a user's write sends that key's
+reads to the primary for `sticky` seconds, by default max_lag +
+check_interval, the longest a replica that passed its last lag check can
+be behind.
+"""
+import threading
+import time
+
+from mysql.connector import Error
+
+from db_pool import PoolTimeout
+
+
+def replication_lag(connection):
+    """Seconds the server is behind its source: 0 if it is not a replica,
+    None if replication is stopped."""
+    cursor = connection.cursor(dictionary=True)
+    try:
+        try:
+            cursor.execute("SHOW REPLICA STATUS")
+            column = 'Seconds_Behind_Source'
+        except Error:
+            cursor.execute("SHOW SLAVE STATUS")  # MySQL before 8.0.22
+            column = 'Seconds_Behind_Master'
+        lags = [row[column] for row in cursor.fetchall()]  # one row per replication channel
+    finally:
+        cursor.close()
+    if any(lag is None for lag in lags):
+        return None
+    return max(lags, default=0)
+
+
+class Replica:
+    def __init__(self, name, pool):
+        self.name = name
+        self.pool = pool
+        self.down_until = 0.0
+        self.lag = None
+        self.lagging = False
+        self.checked_at = None
+        self.checking = False
+        self.last_error = None
+
+
+class ReadRouter:
+    def __init__(self, primary, replicas=(), max_lag=5.0, check_interval=5.0, retry_after=10.0, sticky=None):
+        self.primary = primary
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.sticky = max_lag + check_interval if sticky is None else sticky
+        self._lock = threading.Lock()
+        self._next = 0
+        self._writes = {}  # key -> monotonic time its reads may use replicas again
+        self._stats = {"replica_reads": 0, "sticky_reads": 0, "fallbacks": 0, "replica_failures": 0,
+                       "lag_checks": 0}
+
+    def note_write(self, key):
+        if key is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if len(self._writes) >= 10000:
+                self._writes = {k: until for k, until in self._writes.items() if until > now}
+            self._writes[str(key)] = now + self.sticky
+
+    def _sticky(self, keys):
+        now = time.monotonic()
+        with self._lock:
+            return any(self._writes.get(str(key), 0) > now for key in keys if key is not None)
+
+    def _candidates(self):
+        # Usable replicas, starting after the one the previous read used
+        now = time.monotonic()
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+        ordered = self.replicas[start:] + self.replicas[:start]
+        # A lagging replica is only tried again once its next lag check is due
+        return [replica for replica in ordered if replica.down_until <= now
+                and (not replica.lagging or self._check_due(replica, now))]
+
+    def _check_due(self, replica, now):
+        return replica.checked_at is None or now - replica.checked_at >= self.check_interval
+
+    def _borrow(self, replica):
+        try:
+            connection = replica.pool.get_connection()
+        except PoolTimeout:
+            return None  # busy, not down
+        except Error as e:
+            self._mark_down(replica, e)
+            return None
+
+        now = time.monotonic()
+        with self._lock:
+            check = self._check_due(replica, now) and not replica.checking
+            if check:
+                replica.checking = True
+        if check:
+            try:
+                lag = replication_lag(connection)
+            except Error as e:
+                connection.close()
+                self._mark_down(replica, e)
+                return None
+            finally:
+                with self._lock:
+                    replica.checking = False
+            with self._lock:
+                self._stats["lag_checks"] += 1
+                replica.lag = lag
+                replica.lagging = lag is None or lag > self.max_lag
+                replica.checked_at = now
+        if replica.lagging:
+            connection.close()
+            return None
+        return connection
+
+    def _mark_down(self, replica, error):
+        print(f"Error using replica {replica.name}: {error}")
+        with self._lock:
+            self._stats["replica_failures"] += 1
+            replica.down_until = time.monotonic() + self.retry_after
+            replica.last_error = str(error)
+            replica.checked_at = None  # check its lag again once it is back
+
+    def get_connection(self, read_only=False, keys=()):
+        """Borrow a connection: from a replica when `read_only` and none of
+        `keys` wrote recently, otherwise (or when no replica is usable) from the primary."""
+        if read_only and self.replicas:
+            if self._sticky(keys):
+                counter = "sticky_reads"
+            else:
+                for replica in self._candidates():
+                    connection = self._borrow(replica)
+                    if connection is not None:
+                        with self._lock:
+                            self._stats["replica_reads"] += 1
+                        return connection
+                counter = "fallbacks"
+            with self._lock:
+                self._stats[counter] += 1
+        return self.primary.get_connection()
+
+    def close_all(self):
+        for replica in self.replicas:
+            replica.pool.close_all()
+
+    def stats(self):
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            stats["sticky_keys"] = sum(1 for until in self._writes.values() if until > now)
+        stats["replicas"] = [{
+            "name": replica.name,
+            "down": replica.down_until > now,
+            "lagging": replica.lagging,
+            "lag": replica.lag,
+            "last_error": replica.last_error,
+            "pool": replica.pool.stats(),
+        } for replica in self.replicas]
+        return stats
@@ -0,0 +1,121 @@
+"""Inventory queries over `products` built from request parameters.
+
+    fields=name,price,stock          columns to return (default name,price,stock)
+    filter=discount>0                repeatable; ANDed together
+    category=Phones                  same as filter=category=Phones
+    sort=-stock,name                 "-" for descending (default name)
+    limit=50                         at most MAX_LIMIT
+
+A filter is <field><op><value> with op one of = != > >= < <=; `null` as
+the value with = or != tests IS NULL / IS NOT NULL. Every field name, sort
+key and operator is checked against the whitelists below and only values
+are sent as parameters, so a request can never put its own text in the SQL.
+
+spec() normalizes a request into a hashable tuple, so equivalent requests
+share a catalog cache entry, and build() turns a spec into (sql, params).
+"""
+import re
+from decimal import Decimal, InvalidOperation
+
+# Column -> value parser for filters (None: the column cannot be filtered)
+FIELDS = {
+    'id': int,
+    'name': None,
+    'price': Decimal,
+    'description': None,
+    'category': str,
+    'accessories': None,
+    'image': None,
+    'discount': Decimal,
+    'rebate': Decimal,
+    'warranty': str,  # text such as "1 year" or "6 months"
+    'stock': int,
+}
+OPERATORS = ('>=', '<=', '!=', '=', '>', '<')
+DEFAULT_FIELDS = ('name', 'price', 'stock')
+DEFAULT_SORT = ('name',)
+MAX_LIMIT = 1000
+
+_FILTER = re.compile(r'^\s*(\w+)\s*(>=|<=|!=|=|>|<)\s*(.*?)\s*$')
+
+
+def _parse_filter(text):
+    match = _FILTER.match(text)
+    if match is None:
+        raise ValueError(f"Invalid filter: {text!r}")
+    field, op, raw = match.groups()
+    if FIELDS.get(field) is None:
+        raise ValueError(f"Cannot filter on {field!r}")
+    if raw.lower() == 'null':
+        if op not in ('=', '!='):
+            raise ValueError(f"Only = and != can compare with null: {text!r}")
+        return field, op, None
+    try:
+        value = FIELDS[field](raw)
+    except (ValueError, InvalidOperation):
+        raise ValueError(f"Invalid value for {field}: {raw!r}")
+    return field, op, value
+
+
+def spec(fields=(), filters=(), sort=(), limit=None):
+    """Validate a query and return it as (fields, filters, sort, limit).
+
+    `filters` are filter strings or (field, op, value) tuples.
+    """
+    fields = tuple(dict.fromkeys(fields)) or DEFAULT_FIELDS
+    for field in fields:
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field {field!r}")
+    parsed = []
+    for item in filters:
+        parsed.append(_parse_filter(item) if isinstance(item, str) else item)
+    sort = tuple(dict.fromkeys(sort)) or DEFAULT_SORT
+    for key in sort:
+        if key.lstrip('-') not in FIELDS:
+            raise ValueError(f"Cannot sort on {key!r}")
+    if limit is not None and not 1 <= limit <= MAX_LIMIT:
+        raise ValueError(f"limit must be between 1 and {MAX_LIMIT}")
+    return fields, tuple(sorted(set(parsed), key=repr)), sort, limit
+
+
+def parse(args):
+    """Build a spec from request args (a MultiDict)."""
+    def split(name):
+        return [part.strip() for part in args.get(name, '').split(',') if part.strip()]
+
+    filters = args.getlist('filter')
+    if args.get('category'):
+        filters.append(('category', '=', args['category']))
+    try:
+        limit = int(args['limit']) if args.get('limit') else None
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    return spec(split('fields'), filters, split('sort'), limit)
+
+
+def build(query_spec):
+    """Return (sql, params) for a spec."""
+    fields, filters, sort, limit = query_spec
+    conditions = []
+    params = []
+    for field, op, value in filters:
+        if value is None:
+            conditions.append(f"{field} IS {'NOT ' if op == '!=' else ''}NULL")
+        else:
+            conditions.append(f"{field} {op} %s")
+            params.append(value)
+    sql = f"SELECT {', '.join(fields)} FROM products"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY " + ", ".join(f"{key[1:]} DESC" if key.startswith('-') else key for key in sort)
+    if limit is not None:
+        sql += " LIMIT %s"
+        params.append(limit)
+    return sql, tuple(params)
+
+
+# What the original /inventory/products* routes return
+OVERVIEW = spec(fields=('name', 'price', 'stock'))
+BAR_CHART = spec(fields=('name', 'stock'))
+ON_SALE = spec(fields=('name', 'price', 'discount'), filters=('discount!=null',))
+WITH_REBATES = spec(fields=('name', 'price', 'rebate'), filters=('rebate!=null',))
@@ -0,0 +1,104 @@
+"""Server-sent event channels for the live dashboards.
+
+publish() encodes an event once and appends it to a shared ring of the
+last `backlog` events; it never touches the subscribers, so its cost does
+not depend on how many are connected. Each subscriber is just a position
+in that ring: its stream wakes up, sends every event after its position
+in one write and moves to the newest. A subscriber that falls more than
+`backlog` events behind (or reconnects with a Last-Event-ID the ring no
+longer holds) gets a single `resync` event telling it to reload, so a
+slow client never holds more than the shared ring.
+"""
+import threading
+from collections import deque
+from itertools import islice
+
+import serialization
+
+
+class TooManySubscribers(Exception):
+    pass
+
+
+def _frame(seq, event, payload):
+    data = serialization.dumps_json(payload)
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (seq, event.encode('ascii'), data)
+
+
+class Broadcaster:
+    def __init__(self, name, backlog=256, heartbeat=15.0, max_subscribers=1000):
+        self.name = name
+        self.backlog = backlog
+        self.heartbeat = heartbeat
+        self.max_subscribers = max_subscribers
+        self._frames = deque(maxlen=backlog)
+        self._seq = 0  # id of the newest frame
+        self._cond = threading.Condition()
+        self._closed = False
+        self._subscribers = 0
+        self._stats = {"published": 0, "resyncs": 0, "rejected": 0}
+
+    def publish(self, event, payload):
+        with self._cond:
+            self._seq += 1
+            self._frames.append(_frame(self._seq, event, payload))
+            self._stats["published"] += 1
+            self._cond.notify_all()
+
+    def _resync(self):
+        self._stats["resyncs"] += 1
+        return _frame(self._seq, 'resync', {"channel": self.name})
+
+    def subscribe(self, last_event_id=None):
+        """Return a generator of SSE bytes, starting after `last_event_id` when the ring still has it.
+
+        The caller holds a subscriber slot until the generator is exhausted or
+        closed, so close() it if the response is never sent."""
+        with self._cond:
+            if self._subscribers >= self.max_subscribers:
+                self._stats["rejected"] += 1
+                raise TooManySubscribers(f"{self.name} has {self._subscribers} subscribers")
+            self._subscribers += 1
+            position = self._seq
+            first = b"retry: 3000\n\n"
+            if last_event_id is not None:
+                if self._seq - len(self._frames) <= last_event_id <= self._seq:
+                    position = last_event_id
+                else:
+                    first += self._resync()
+        stream = self._stream(position, first)
+        next(stream)  # run it into its try block, so close() releases the slot
+        return stream
+
+    def _stream(self, position, first):
+        try:
+            yield
+            yield first
+            while True:
+                with self._cond:
+                    self._cond.wait_for(lambda: self._seq > position or self._closed, self.heartbeat)
+                    if self._closed:
+                        return
+                    oldest = self._seq - len(self._frames) + 1
+                    if position + 1 < oldest:
+                        chunk = self._resync()
+                    else:
+                        chunk = b''.join(islice(self._frames, position + 1 - oldest, None))
+                    position = self._seq
+                # Written outside the lock, so a slow socket only holds up its own stream
+                yield chunk or b": keepalive\n\n"
+        finally:
+            with self._cond:
+                self._subscribers -= 1
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({"subscribers": self._subscribers, "last_id": self._seq,
+                          "buffered": len(self._frames)})
+        return stats
@@ -0,0 +1,211 @@
+"""Prometheus-style metrics for routes, SQL queries and the connection pool.
+
+Instruments are plain in-process counters and fixed-bucket histograms; a
+sample costs a bisect and a dict update under a lock. render() produces
+the Prometheus text exposition format served at GET /metrics.
+"""
+import re
+import threading
+import time
+from bisect import bisect_left
+
+from flask import g, has_request_context, request
+from mysql.connector import Error
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{value}"' for name, value in extra]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.buckets = tuple(buckets)
+        self._series = {}  # labels -> [per-bucket counts (last is +Inf), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket in zip(self.buckets + ('+Inf',), counts):
+                    cumulative += bucket
+                    lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """A value read from `collect()` at scrape time; collect returns {labels: value}."""
+
+    def __init__(self, name, help_text, labelnames, collect):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = labelnames
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_labels(self.labelnames, labels)} {value}")
+        return lines
+
+
+REQUEST_DURATION = Histogram('http_request_duration_seconds', "Time spent handling a request",
+                             ('route', 'method'))
+REQUESTS = Counter('http_requests_total', "Responses sent", ('route', 'method', 'status'))
+REQUEST_ERRORS = Counter('http_request_errors_total', "Responses with a 5xx status", ('route', 'method'))
+QUERY_DURATION = Histogram('db_query_duration_seconds', "Time spent in cursor.execute per named query",
+                           ('query',))
+QUERY_ROWS = Counter('db_query_rows_total', "Rows fetched per named query", ('query',))
+QUERY_ERRORS = Counter('db_query_errors_total', "Statements that raised a database error", ('query',))
+POOL_WAIT = Histogram('db_pool_wait_seconds', "Time spent waiting to borrow a pooled connection", ('pool',))
+
+REGISTRY = [REQUEST_DURATION, REQUESTS, REQUEST_ERRORS, QUERY_DURATION, QUERY_ROWS, QUERY_ERRORS, POOL_WAIT]
+
+
+def register(instrument):
+    REGISTRY.append(instrument)
+    return instrument
+
+
+def render():
+    lines = []
+    for instrument in REGISTRY:
+        lines.extend(instrument.render())
+    return '\n'.join(lines) + '\n'
+
+
+# Query names are "<endpoint>.<verb>_<table>", e.g. place_order.update_products
+_VERB = re.compile(r'^\s*(?:WITH\b.*?\)\s*)?(SELECT|INSERT|UPDATE|DELETE|REPLACE|CREATE|LOAD)\b',
+                   re.IGNORECASE | re.DOTALL)
+_TABLE = re.compile(r'\b(?:FROM|INTO|TABLE)\s+`?(\w+)', re.IGNORECASE)
+_UPDATE_TABLE = re.compile(r'\s*`?(\w+)')
+_statement_names = {}
+
+
+def statement_name(query):
+    name = _statement_names.get(query)
+    if name is None:
+        verb = _VERB.match(query)
+        if verb is None:
+            name = 'other'
+        else:
+            pattern = _UPDATE_TABLE.match if verb.group(1).upper() == 'UPDATE' else _TABLE.search
+            table = pattern(query, verb.end())
+            name = f"{verb.group(1).lower()}_{table.group(1) if table else 'other'}"
+        if len(_statement_names) < 2048:
+            _statement_names[query] = name
+    return name
+
+
+def query_name(query):
+    endpoint = request.endpoint if has_request_context() and request.endpoint else 'background'
+    return f"{endpoint}.{statement_name(query)}"
+
+
+# Cursor proxy that times execute()/executemany() and counts fetched rows
+class TimedCursor:
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._name = 'other'
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def _timed(self, method, operation, *args, **kwargs):
+        self._name = query_name(operation)
+        started = time.perf_counter()
+        try:
+            return method(operation, *args, **kwargs)
+        except Error:
+            QUERY_ERRORS.inc(self._name)
+            raise
+        finally:
+            QUERY_DURATION.observe(time.perf_counter() - started, self._name)
+
+    def execute(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.execute, operation, *args, **kwargs)
+
+    def executemany(self, operation, *args, **kwargs):
+        return self._timed(self._cursor.executemany, operation, *args, **kwargs)
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        QUERY_ROWS.inc(self._name, amount=len(rows))
+        return rows
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        QUERY_ROWS.inc(self._name, amount=len(rows))
+        return rows
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            QUERY_ROWS.inc(self._name)
+        return row
+
+
+def init_app(app):
+    """Record duration, status and 5xx errors for every request."""
+
+    @app.before_request
+    def start_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request(response):
+        started = g.pop('metrics_started', None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+            REQUEST_DURATION.observe(time.perf_counter() - started, route, request.method)
+            REQUESTS.inc(route, request.method, str(response.status_code))
+            if response.status_code >= 500:
+                REQUEST_ERRORS.inc(route, request.method)
+        return response
@@ -0,0 +1,263 @@
+"""Versioned schema migrations and EXPLAIN plan checks.
+
+    python migrations.py migrate    # apply pending migrations
+    python migrations.py status     # list applied and pending migrations
+    python migrations.py explain    # EXPLAIN every route query, fail on full table scans
+
+Applied versions are recorded in schema_migrations. A migration is a list
+of steps; a step is either an SQL string or a callable taking the cursor,
+which lets index creation skip indexes that already exist (MySQL has no
+CREATE INDEX IF NOT EXISTS).
+
+`explain` runs EXPLAIN on the SQL behind every route and exits non-zero if
+the plan reads a base table with a full scan (type ALL) where the query
+should use an index. Run it against a database with realistic volume (for
+example the benchmark database); on a near-empty table MySQL may prefer a
+scan regardless of indexes.
+"""
+import re
+import sys
+
+import cohorts
+import cross_sell
+import inventory_query
+import queries
+import reservations
+import sales_rollups
+import snapshots
+from bulk_data import CREATE_PROGRESS_TABLE
+from write_behind import CREATE_OFFSETS_TABLE
+
+CREATE_MIGRATIONS_TABLE = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INT PRIMARY KEY,
+        description VARCHAR(255) NOT NULL,
+        applied_at DATETIME NOT NULL
+    )
+"""
+
+
+def ensure_index(table, name, columns, unique=False):
+    """Step that creates an index unless one already starts with `columns`."""
+    def step(cursor):
+        cursor.execute("""
+            SELECT index_name, GROUP_CONCAT(column_name ORDER BY seq_in_index) AS cols
+            FROM information_schema.statistics
+            WHERE table_schema = DATABASE() AND table_name = %s
+            GROUP BY index_name
+        """, (table,))
+        wanted = [column.lower() for column in columns]
+        for index_name, cols in cursor.fetchall():
+            # Whole column names: an index on email_verified does not cover email
+            if index_name == name or (cols or '').lower().split(',')[:len(wanted)] == wanted:
+                return
+        kind = 'UNIQUE INDEX' if unique else 'INDEX'
+        cursor.execute(f"CREATE {kind} {name} ON {table} ({', '.join(columns)})")
+    step.__doc__ = f"{name} ON {table} ({', '.join(columns)})"
+    return step
+
+
+# (version, description, steps) in the order they must be applied
+MIGRATIONS = [
+    (1, "Rollup, co-occurrence and import progress tables",
+     sales_rollups.CREATE_TABLES + [cross_sell.CREATE_TABLE, CREATE_PROGRESS_TABLE]),
+    (2, "Hot-path indexes", [
+        # login
+        ensure_index('users', 'idx_users_email', ['email']),
+        # past orders, inactive customers, purchase frequency, lifetime value
+        ensure_index('orders', 'idx_orders_user_date', ['user_id', 'order_date', 'total_price']),
+        # retention, average sales, seasonal analysis
+        ensure_index('orders', 'idx_orders_date', ['order_date', 'user_id', 'total_price']),
+        # popular products by category, typeahead popularity
+        ensure_index('orders', 'idx_orders_product', ['product_id', 'total_price']),
+        # top zip codes
+        ensure_index('orders', 'idx_orders_store_location', ['store_location']),
+        # /products?category=
+        ensure_index('products', 'idx_products_category', ['category']),
+        # /accessories?productId=
+        ensure_index('accessories', 'idx_accessories_product', ['product_id']),
+        # most sold products
+        ensure_index('CustomerOrder', 'idx_customerorder_order_name', ['orderName']),
+    ]),
+    (3, "Write-behind queue offsets", [CREATE_OFFSETS_TABLE]),
+    (4, "Stock shards and reservations", reservations.CREATE_TABLES),
+    (5, "Analytics snapshots", [snapshots.CREATE_TABLE]),
+    (6, "Customer activity bitmaps", [cohorts.CREATE_TABLE, cohorts.backfill]),
+]
+
+
+def applied_versions(cursor):
+    cursor.execute(CREATE_MIGRATIONS_TABLE)
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate(connection):
+    cursor = connection.cursor()
+    try:
+        # Serialize concurrent runs (e.g. several app servers deploying at once)
+        cursor.execute("SELECT GET_LOCK('schema_migrations', 30)")
+        if cursor.fetchone()[0] != 1:
+            raise RuntimeError("Another migration run holds the schema_migrations lock")
+        try:
+            done = applied_versions(cursor)
+            applied = []
+            for version, description, steps in MIGRATIONS:
+                if version in done:
+                    continue
+                print(f"Applying {version}: {description}")
+                for step in steps:
+                    if callable(step):
+                        step(cursor)
+                    else:
+                        cursor.execute(step)
+                cursor.execute(
+                    "INSERT INTO schema_migrations (version, description, applied_at) VALUES (%s, %s, NOW())",
+                    (version, description)
+                )
+                connection.commit()
+                applied.append(version)
+            return applied
+        finally:
+            cursor.execute("SELECT RELEASE_LOCK('schema_migrations')")
+            cursor.fetchone()
+    finally:
+        cursor.close()
+
+
+# ---------------------------------------------------------------------------
+# EXPLAIN checks
+
+# (name, sql, sample params, tables a full scan is inherent for)
+PLAN_CHECKS = [
+    ('login', queries.LOGIN_QUERY, ('admin@gmail.com',), ()),
+    ('products', queries.PRODUCTS_QUERY, (), ('products',)),
+    ('products_by_category', queries.PRODUCTS_BY_CATEGORY_QUERY, ('Laptops',), ()),
+    ('product_by_id', queries.PRODUCT_BY_ID_QUERY, (1,), ()),
+    # What /place-order runs: reservations.reserve() picks and decrements
+    # stock shards, confirm() locks and marks the reservation
+    ('reserve_load_shards', reservations.LOAD_SHARDS.format('%s, %s'), (1, 2), ()),
+    ('reserve_take_shard', reservations.TAKE_FROM_SHARD, (1, 1, 0, 1), ()),
+    ('reserve_lock_shards', reservations.LOCK_SHARDS, (1,), ()),
+    ('confirm_lock', reservations.LOCK_RESERVATION, ('0' * 32,), ()),
+    ('confirm_update', reservations.CONFIRM_RESERVATION, ('0' * 32,), ()),
+    ('past_orders', queries.PAST_ORDERS_QUERY, (1,), ()),
+    ('orders_page', "SELECT * FROM orders WHERE id > %s ORDER BY id LIMIT %s", (0, 100), ()),
+    ('orders_by_user', "SELECT * FROM orders WHERE user_id = %s ORDER BY id LIMIT %s", (1, 100), ()),
+    ('order_row_lock', sales_rollups.ORDER_ROW_QUERY, (1,), ()),
+    ('store_locations', queries.STORE_LOCATIONS_QUERY, (), ('store_locations',)),
+    ('accessories', "SELECT * FROM accessories WHERE product_id = %s", (1,), ()),
+    ('inventory', queries.INVENTORY_QUERY, (), ('products',)),
+    ('inventory_bar_chart', queries.INVENTORY_BAR_CHART_QUERY, (), ('products',)),
+    ('inventory_sale', queries.PRODUCTS_ON_SALE_QUERY, (), ('products',)),
+    ('inventory_rebates', queries.PRODUCTS_WITH_REBATES_QUERY, (), ('products',)),
+    ('inventory_low_stock', *inventory_query.build(inventory_query.spec(filters=('stock<10',))), ('products',)),
+    ('top_zipcodes', queries.TOP_ZIPCODES_QUERY, (), ()),
+    ('most_sold', queries.MOST_SOLD_QUERY, (), ()),
+    ('products_sold', sales_rollups.PRODUCTS_SOLD_QUERY, (), ('products', 'sales_daily_product')),
+    ('products_sales_chart', sales_rollups.PRODUCTS_SALES_CHART_QUERY, (), ('products', 'sales_daily_product')),
+    ('daily_sales', sales_rollups.DAILY_SALES_QUERY, (), ()),
+    ('top_customers', sales_rollups.TOP_CUSTOMERS_QUERY, (), ()),
+    ('popular_products_by_category', queries.POPULAR_PRODUCTS_BY_CATEGORY_QUERY, (), ('products',)),
+    ('inactive_customers', queries.INACTIVE_CUSTOMERS_QUERY, (), ('users',)),
+    ('average_sales', queries.AVERAGE_SALES_QUERY, (), ()),
+    ('customer_segmentation', queries.CUSTOMER_SEGMENTATION_QUERY, (), ('users',)),
+    ('customer_lifetime_value', queries.CUSTOMER_LIFETIME_VALUE_QUERY, (), ('users',)),
+    ('seasonal_sales', queries.SEASONAL_SALES_QUERY, (), ()),
+    ('purchase_frequency', queries.PURCHASE_FREQUENCY_QUERY, (), ()),
+    ('cross_sell_top_pairs', cross_sell.TOP_PAIRS_QUERY, (10,), ()),
+    ('cross_sell_bought_with', cross_sell.BOUGHT_WITH_QUERY, (1, 10), ()),
+    # /sales-report/customer-retention and /sales-report/cohorts: the
+    # CohortIndex load, then the names of the retained customers
+    ('cohort_load', cohorts.LOAD_ACTIVITY, (), ('customer_activity',)),
+    ('cohort_names', cohorts.USER_NAMES_QUERY.format('%s, %s'), (1, 2), ()),
+    ('cohort_refresh', cohorts.USER_ORDER_DAYS_QUERY.format('%s'), (1,), ()),
+    ('cohort_record', cohorts.LOCK_ACTIVITY.format('%s'), (1,), ()),
+    ('expired_reservations', "SELECT id FROM stock_reservations WHERE status = 'held' AND expires_at <= NOW() "
+     "ORDER BY expires_at LIMIT 500", (), ()),
+]
+
+_KEYWORDS = {'WHERE', 'JOIN', 'LEFT', 'RIGHT', 'INNER', 'OUTER', 'CROSS', 'ON', 'GROUP', 'ORDER',
+             'LIMIT', 'HAVING', 'WINDOW', 'FOR', 'UNION', 'USING', 'STRAIGHT_JOIN', 'SET'}
+_TABLE_REF = re.compile(r'\b(?:FROM|JOIN|UPDATE)\s+`?(\w+)`?(?:\s+(?:AS\s+)?(\w+))?', re.IGNORECASE)
+
+
+def table_aliases(sql, base_tables):
+    """Map each alias (or bare name) in `sql` that refers to a base table to that table."""
+    aliases = {}
+    for table, alias in _TABLE_REF.findall(sql):
+        match = {name.lower(): name for name in base_tables}.get(table.lower())
+        if match is None:
+            continue  # a CTE or derived table
+        aliases[table] = match
+        if alias and alias.upper() not in _KEYWORDS:
+            aliases[alias] = match
+    return aliases
+
+
+def full_scans(cursor, sql, params, base_tables):
+    """Return the base tables EXPLAIN reads with a full table scan."""
+    cursor.execute("EXPLAIN " + sql, params)
+    columns = [column[0] for column in cursor.description]
+    aliases = table_aliases(sql, base_tables)
+    scans = []
+    for row in cursor.fetchall():
+        plan = dict(zip(columns, row))
+        table = aliases.get(plan.get('table'))
+        if table is not None and plan.get('type') == 'ALL':
+            scans.append(table)
+    return scans
+
+
+def explain(connection):
+    cursor = connection.cursor()
+    try:
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = DATABASE()")
+        base_tables = {row[0] for row in cursor.fetchall()}
+        failures = []
+        for name, sql, params, allowed in PLAN_CHECKS:
+            scans = [table for table in full_scans(cursor, sql, params, base_tables)
+                     if table.lower() not in {t.lower() for t in allowed}]
+            status = 'FULL SCAN ' + ', '.join(scans) if scans else 'ok'
+            print(f"{name:<32} {status}")
+            if scans:
+                failures.append((name, scans))
+        return failures
+    finally:
+        cursor.close()
+
+
+def main(argv):
+    if len(argv) != 2 or argv[1] not in ('migrate', 'status', 'explain'):
+        print("Usage: python migrations.py migrate|status|explain")
+        return 2
+
+    from config import connect
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        if argv[1] == 'migrate':
+            applied = migrate(connection)
+            print(f"Applied {len(applied)} migration(s)" if applied else "Schema is up to date")
+            return 0
+        if argv[1] == 'status':
+            cursor = connection.cursor()
+            done = applied_versions(cursor)
+            cursor.close()
+            for version, description, _ in MIGRATIONS:
+                print(f"{version:>4}  {'applied' if version in done else 'pending':<8} {description}")
+            return 0
+        failures = explain(connection)
+        if failures:
+            print(f"{len(failures)} queries fall back to a full table scan")
+            return 1
+        print("No unexpected full table scans")
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
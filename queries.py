@@ -0,0 +1,171 @@
+"""SQL for the read-only endpoints, shared by app.py and async_app.py.
+
+The sales report queries over the rollup tables live in sales_rollups and
+the cross-sell ones in cross_sell.
+"""
+import inventory_query
+
+# Look up an account by email for /login
+LOGIN_QUERY = "SELECT id, name, email, password, role FROM users WHERE email = %s"
+
+# Get all products or filter by category
+PRODUCTS_QUERY = "SELECT * FROM products"
+PRODUCTS_BY_CATEGORY_QUERY = "SELECT * FROM products WHERE category = %s"
+
+# Get past orders for a specific user
+PAST_ORDERS_QUERY = """
+    SELECT id, name, total_price, delivery_method, status, delivery_date
+    FROM orders
+    WHERE user_id = %s
+"""
+
+# Fetch product details by ID
+PRODUCT_BY_ID_QUERY = "SELECT * FROM products WHERE id = %s"
+
+# Top five zip codes with maximum product sales
+TOP_ZIPCODES_QUERY = """
+    SELECT store_location, COUNT(store_location) AS totalOrders
+    FROM orders
+    GROUP BY store_location
+    ORDER BY totalOrders DESC
+    LIMIT 5
+"""
+
+# Top five most sold products
+MOST_SOLD_QUERY = """
+    SELECT orderName, COUNT(orderName) AS totalSold
+    FROM CustomerOrder
+    GROUP BY orderName
+    ORDER BY totalSold DESC
+    LIMIT 5
+"""
+
+# Fetch all store locations
+STORE_LOCATIONS_QUERY = "SELECT * FROM store_locations"
+
+# The original /inventory/products* queries, now specs of inventory_query
+INVENTORY_QUERY, _ = inventory_query.build(inventory_query.OVERVIEW)
+INVENTORY_BAR_CHART_QUERY, _ = inventory_query.build(inventory_query.BAR_CHART)
+PRODUCTS_ON_SALE_QUERY, _ = inventory_query.build(inventory_query.ON_SALE)
+PRODUCTS_WITH_REBATES_QUERY, _ = inventory_query.build(inventory_query.WITH_REBATES)
+
+# Get popular products by category
+POPULAR_PRODUCTS_BY_CATEGORY_QUERY = """
+    SELECT 
+      p.category AS category_name,
+      p.name AS product_name,
+      COUNT(o.id) AS items_sold,
+      SUM(o.total_price) AS total_revenue
+    FROM orders o
+    JOIN products p ON o.product_id = p.id
+    GROUP BY p.category, p.name
+    ORDER BY p.category ASC, items_sold DESC
+"""
+
+# Get customers who haven't placed an order in the last 30 days
+INACTIVE_CUSTOMERS_QUERY = """
+    SELECT u.name AS customer_name, u.email
+    FROM users u
+    LEFT JOIN orders o ON u.id = o.user_id 
+          AND o.order_date >= DATE_SUB(CURDATE(), INTERVAL 30 DAY)
+    WHERE o.id IS NULL
+"""
+
+# Retention data for 2 interval days
+CUSTOMER_RETENTION_QUERY = """
+    WITH CurrentPeriodCustomers AS (
+      SELECT DISTINCT user_id
+      FROM orders
+      WHERE order_date >= CURDATE() - INTERVAL 2 DAY
+    ),
+    PreviousPeriodCustomers AS (
+      SELECT DISTINCT user_id
+      FROM orders
+      WHERE order_date >= CURDATE() - INTERVAL 4 DAY
+        AND order_date < CURDATE() - INTERVAL 2 DAY
+    )
+    SELECT 
+      COUNT(DISTINCT cmc.user_id) AS RetainedCustomers,
+      COUNT(DISTINCT pmc.user_id) AS PreviousPeriodCustomers,
+      (COUNT(DISTINCT cmc.user_id) / COUNT(DISTINCT pmc.user_id)) * 100 AS RetentionRate,
+      GROUP_CONCAT(DISTINCT u.name) AS RetainedCustomerNames
+    FROM PreviousPeriodCustomers pmc
+    LEFT JOIN CurrentPeriodCustomers cmc ON pmc.user_id = cmc.user_id
+    LEFT JOIN users u ON cmc.user_id = u.id
+"""
+
+# 2 days average sale
+AVERAGE_SALES_QUERY = """
+    SELECT 
+      ROUND(SUM(total_price) / 2, 2) AS average_sales
+    FROM orders
+    WHERE order_date >= CURDATE() - INTERVAL 2 DAY
+"""
+
+# Customer Segmentation Analysis
+CUSTOMER_SEGMENTATION_QUERY = """
+    SELECT 
+      CASE 
+        WHEN TotalSpent < 1500 THEN 'Low Spender'
+        WHEN TotalSpent BETWEEN 1500 AND 3500 THEN 'Medium Spender'
+        ELSE 'High Spender'
+      END AS CustomerSegment,
+      COUNT(*) AS CustomerCount,
+      AVG(TotalSpent) AS AvgSpend
+    FROM (
+      SELECT u.id AS CustomerID, u.name AS CustomerName, SUM(o.total_price) AS TotalSpent
+      FROM users u
+      JOIN orders o ON u.id = o.user_id
+      GROUP BY u.id, u.name
+    ) AS CustomerSpend
+    GROUP BY CustomerSegment WITH ROLLUP
+"""
+
+# Customer Lifetime Value Calculation
+CUSTOMER_LIFETIME_VALUE_QUERY = """
+    SELECT 
+      u.id AS CustomerID,
+      u.name AS CustomerName,
+      COUNT(DISTINCT o.id) AS TotalOrders,
+      SUM(o.total_price) AS TotalSpent,
+      AVG(o.total_price) AS AvgOrderValue,
+      IFNULL(DATEDIFF(MAX(o.order_date), MIN(o.order_date)) / 365.0, 0) AS YearsActive,
+      IFNULL(SUM(o.total_price) / (DATEDIFF(MAX(o.order_date), MIN(o.order_date)) / 365.0), 0) AS AnnualValue
+    FROM users u
+    JOIN orders o ON u.id = o.user_id
+    GROUP BY u.id, u.name
+    ORDER BY AnnualValue DESC
+    LIMIT 10
+"""
+
+# Seasonal Sales Analysis
+SEASONAL_SALES_QUERY = """
+    SELECT 
+      YEAR(order_date) AS Year,
+      QUARTER(order_date) AS Quarter,
+      SUM(total_price) AS Quarterly_Sales,
+      SUM(SUM(total_price)) OVER (PARTITION BY YEAR(order_date) ORDER BY QUARTER(order_date)) AS Cumulative_Yearly_Sales
+    FROM orders
+    GROUP BY Year, Quarter WITH ROLLUP
+"""
+
+# Customer Purchase Frequency Distribution
+PURCHASE_FREQUENCY_QUERY = """
+    WITH PurchaseFrequency AS (
+      SELECT user_id, COUNT(DISTINCT id) AS OrderCount
+      FROM orders
+      GROUP BY user_id
+    )
+    SELECT 
+      CASE 
+        WHEN OrderCount = 1 THEN 'One-time'
+        WHEN OrderCount BETWEEN 2 AND 5 THEN '2-5 times'
+        WHEN OrderCount BETWEEN 6 AND 10 THEN '6-10 times'
+        ELSE 'More than 10 times'
+      END AS PurchaseFrequency,
+      COUNT(*) AS CustomerCount,
+      AVG(OrderCount) AS AvgOrders
+    FROM PurchaseFrequency
+    GROUP BY PurchaseFrequency
+    ORDER BY MIN(OrderCount)
+"""
@@ -0,0 +1,664 @@
+"""Stock reservations with reserve / confirm / release semantics.
+
+The sellable stock of each stock-tracked product lives in stock_shards: up
+to SHARDS rows per product whose `available` counts add up to what can
+still be reserved. A reservation takes its units from one shard with a
+conditional UPDATE (available >= wanted), so stock never goes negative and
+concurrent checkouts of one popular product lock different shard rows
+instead of queueing on its products row. Only when no single shard has
+enough does a reservation lock all of the product's shards and take from
+several. Shards are created from products.stock the first time a product
+is reserved; products with a NULL stock are not tracked.
+
+A reservation (one token, stock_reservations rows for each product) is held
+until the order that uses it commits (confirm) or it is given back
+(release, or reap_expired() once its TTL has passed). products.stock is a
+display copy of the shard totals, refreshed in one batched UPDATE by
+sync_stock() (see StockSyncer) rather than on every checkout.
+
+Because that sync overwrites products.stock with the shard totals, changing
+products.stock alone does not change what can be sold, and is undone by the
+next sync. Restocking has to rewrite the shards in the same transaction:
+set_stock() does this for one product (PUT /products with a `stock` field
+uses it), and resync() does it for every product whose products.stock was
+changed some other way (SQL, `bulk_data.py import products`, which runs it
+itself). Run resync right after such a change, before a checkout of the
+product syncs the old total back.
+
+    python reservations.py init      # create shards for every tracked product that has none
+    python reservations.py resync    # rewrite the shards from products.stock (after a restock outside the API)
+    python reservations.py reap      # release expired holds
+    python reservations.py sync      # copy shard totals to products.stock
+    python reservations.py stress    # concurrent checkouts of one product; fails on overselling
+"""
+import argparse
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import defaultdict
+
+from mysql.connector import Error, errorcode
+
+SHARDS = 8
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS stock_shards (
+        product_id INT NOT NULL,
+        shard TINYINT UNSIGNED NOT NULL,
+        available INT NOT NULL,
+        PRIMARY KEY (product_id, shard),
+        CONSTRAINT chk_stock_shards_available CHECK (available >= 0)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS stock_reservations (
+        id BIGINT AUTO_INCREMENT PRIMARY KEY,
+        token CHAR(32) NOT NULL,
+        product_id INT NOT NULL,
+        shard TINYINT UNSIGNED NULL,
+        quantity INT NOT NULL,
+        status VARCHAR(10) NOT NULL,
+        expires_at DATETIME NOT NULL,
+        KEY idx_stock_reservations_token (token),
+        KEY idx_stock_reservations_expiry (status, expires_at)
+    )
+    """,
+]
+
+INSERT_RESERVATION = """
+    INSERT INTO stock_reservations (token, product_id, shard, quantity, status, expires_at)
+    VALUES (%s, %s, %s, %s, %s, %s)
+"""
+
+# {} is the list of product id placeholders
+LOAD_SHARDS = "SELECT product_id, shard, available FROM stock_shards WHERE product_id IN ({})"
+
+LOCK_SHARDS = "SELECT shard, available FROM stock_shards WHERE product_id = %s ORDER BY shard FOR UPDATE"
+
+TAKE_FROM_SHARD = """
+    UPDATE stock_shards SET available = available - %s
+    WHERE product_id = %s AND shard = %s AND available >= %s
+"""
+
+RETURN_TO_SHARD = """
+    UPDATE stock_shards SET available = available + %s
+    WHERE product_id = %s AND shard = %s
+"""
+
+LOCK_RESERVATION = """
+    SELECT product_id, quantity, status = 'held' AND expires_at > NOW()
+    FROM stock_reservations
+    WHERE token = %s
+    FOR UPDATE
+"""
+
+CONFIRM_RESERVATION = "UPDATE stock_reservations SET status = 'confirmed' WHERE token = %s"
+
+# Lock contention errors worth retrying the whole reservation for
+RETRYABLE = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+
+
+class ReservationError(Exception):
+    def __init__(self, message, products=()):
+        super().__init__(message)
+        self.message = message
+        self.products = list(products)
+
+
+class ProductNotFound(ReservationError):
+    pass
+
+
+class InsufficientStock(ReservationError):
+    pass
+
+
+class ReservationInvalid(ReservationError):
+    """The token is unknown, already used or released, or expired."""
+
+
+def _in(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def _split(stock, shards):
+    count = max(1, min(shards, stock))
+    base, extra = divmod(stock, count)
+    return [base + (1 if i < extra else 0) for i in range(count)]
+
+
+def _init_shards(cursor, product_ids, shards):
+    """Create shards for products that have none; returns {product_id: {shard: available}} for tracked ones."""
+    cursor.execute(f"SELECT id, stock FROM products WHERE id IN ({_in(product_ids)}) FOR UPDATE", product_ids)
+    stock = dict(cursor.fetchall())
+    missing = [pid for pid in product_ids if pid not in stock]
+    if missing:
+        raise ProductNotFound("Product not found", missing)
+
+    tracked = [pid for pid in product_ids if stock[pid] is not None]
+    if not tracked:
+        return {}
+    # IGNORE: a concurrent checkout may have created them since our read
+    cursor.executemany(
+        "INSERT IGNORE INTO stock_shards (product_id, shard, available) VALUES (%s, %s, %s)",
+        [(pid, shard, available) for pid in tracked
+         for shard, available in enumerate(_split(max(stock[pid], 0), shards))]
+    )
+    return _load_shards(cursor, tracked)
+
+
+def _load_shards(cursor, product_ids):
+    cursor.execute(LOAD_SHARDS.format(_in(product_ids)), product_ids)
+    shards = defaultdict(dict)
+    for product_id, shard, available in cursor.fetchall():
+        shards[product_id][shard] = available
+    return shards
+
+
+def _take(cursor, product_id, quantity, shards):
+    """Take `quantity` units of one product; returns [(shard, units)] or None if there are not enough."""
+    # Fast path: one shard that (as of our read) has enough, chosen at random
+    # so concurrent checkouts spread over the shards
+    candidates = [shard for shard, available in shards.items() if available >= quantity]
+    random.shuffle(candidates)
+    for shard in candidates:
+        cursor.execute(TAKE_FROM_SHARD, (quantity, product_id, shard, quantity))
+        if cursor.rowcount == 1:
+            return [(shard, quantity)]
+
+    # Slow path: lock every shard of the product and take from several
+    cursor.execute(LOCK_SHARDS, (product_id,))
+    rows = cursor.fetchall()
+    if sum(available for _, available in rows) < quantity:
+        return None
+    taken = []
+    remaining = quantity
+    for shard, available in sorted(rows, key=lambda row: -row[1]):
+        units = min(available, remaining)
+        if units:
+            cursor.execute(TAKE_FROM_SHARD, (units, product_id, shard, units))
+            taken.append((shard, units))
+            remaining -= units
+        if not remaining:
+            break
+    return taken
+
+
+def reserve(connection, quantities, ttl, shards=SHARDS, attempts=3):
+    """Hold {product_id: quantity} for `ttl` seconds; returns (token, expires_at).
+
+    Commits its own short transaction. Raises ProductNotFound or
+    InsufficientStock (nothing is held then).
+    """
+    token = secrets.token_hex(16)
+    product_ids = sorted(quantities)
+    for attempt in range(attempts):
+        cursor = connection.cursor()
+        try:
+            # READ COMMITTED: a shard UPDATE that does not match skips the row
+            # instead of keeping it locked until commit
+            connection.start_transaction(isolation_level='READ COMMITTED')
+            cursor.execute("SELECT NOW() + INTERVAL %s SECOND", (int(ttl),))
+            expires_at = cursor.fetchone()[0]
+
+            current = _load_shards(cursor, product_ids)
+            new = [pid for pid in product_ids if pid not in current]
+            if new:
+                current.update(_init_shards(cursor, new, shards))
+
+            rows = []
+            short = []
+            # Product id order keeps concurrent multi-product reservations from deadlocking
+            for pid in product_ids:
+                if pid not in current:
+                    rows.append((token, pid, None, quantities[pid], 'held', expires_at))
+                    continue
+                taken = _take(cursor, pid, quantities[pid], current[pid])
+                if taken is None:
+                    short.append(pid)
+                else:
+                    rows.extend((token, pid, shard, units, 'held', expires_at) for shard, units in taken)
+            if short:
+                raise InsufficientStock("Insufficient stock", short)
+
+            cursor.executemany(INSERT_RESERVATION, rows)
+            connection.commit()
+            return token, expires_at
+        except Error as e:
+            connection.rollback()
+            if e.errno not in RETRYABLE or attempt == attempts - 1:
+                raise
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+
+def confirm(cursor, token):
+    """Mark a held reservation as used; returns {product_id: quantity}.
+
+    Runs inside the caller's order transaction, so a rollback leaves the
+    reservation held. Raises ReservationInvalid unless every row of the
+    token is held and unexpired.
+    """
+    cursor.execute(LOCK_RESERVATION, (token,))
+    rows = cursor.fetchall()
+    if not rows or not all(usable for _, _, usable in rows):
+        raise ReservationInvalid("Reservation not found or expired")
+    cursor.execute(CONFIRM_RESERVATION, (token,))
+    reserved = defaultdict(int)
+    for product_id, quantity, _ in rows:
+        reserved[product_id] += quantity
+    return dict(reserved)
+
+
+def _give_back(cursor, rows):
+    """Return (product_id, shard, quantity) rows to their shards, in lock order."""
+    units = defaultdict(int)
+    for product_id, shard, quantity in rows:
+        if shard is not None:
+            units[(product_id, shard)] += quantity
+    for (product_id, shard), quantity in sorted(units.items()):
+        cursor.execute(RETURN_TO_SHARD, (quantity, product_id, shard))
+    return sorted({product_id for product_id, _ in units})
+
+
+def release(connection, token):
+    """Give back a held reservation; returns the stock-tracked product ids it touched."""
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        cursor.execute("""
+            SELECT product_id, shard, quantity FROM stock_reservations
+            WHERE token = %s AND status = 'held'
+            FOR UPDATE
+        """, (token,))
+        rows = cursor.fetchall()
+        if not rows:
+            connection.rollback()
+            return None
+        products = _give_back(cursor, rows)
+        cursor.execute("UPDATE stock_reservations SET status = 'released' WHERE token = %s AND status = 'held'",
+                       (token,))
+        connection.commit()
+        return products
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def reap_expired(connection, limit=500):
+    """Release up to `limit` expired holds; returns the ids of the products they were for."""
+    cursor = connection.cursor()
+    try:
+        connection.start_transaction()
+        # SKIP LOCKED: holds being confirmed right now are left to their checkout
+        cursor.execute("""
+            SELECT id, product_id, shard, quantity FROM stock_reservations
+            WHERE status = 'held' AND expires_at <= NOW()
+            ORDER BY expires_at
+            LIMIT %s
+            FOR UPDATE SKIP LOCKED
+        """, (limit,))
+        rows = cursor.fetchall()
+        if not rows:
+            connection.rollback()
+            return []
+        _give_back(cursor, [row[1:] for row in rows])
+        products = sorted({row[1] for row in rows})
+        ids = [row[0] for row in rows]
+        cursor.execute(f"UPDATE stock_reservations SET status = 'released' WHERE id IN ({_in(ids)})", ids)
+        # Finished reservations are kept for a day for troubleshooting
+        cursor.execute("""
+            DELETE FROM stock_reservations
+            WHERE status <> 'held' AND expires_at < NOW() - INTERVAL 1 DAY
+            LIMIT 1000
+        """)
+        connection.commit()
+        return products
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def reap_all(connection):
+    """Release every expired hold, in batches; returns how many batches ran."""
+    batches = 0
+    while reap_expired(connection):
+        batches += 1
+    return batches
+
+
+def sync_stock(connection, product_ids=None):
+    """Copy shard totals to products.stock (all sharded products when product_ids is None)."""
+    where, params = "", ()
+    if product_ids is not None:
+        if not product_ids:
+            return
+        where, params = f"WHERE product_id IN ({_in(product_ids)})", tuple(product_ids)
+    cursor = connection.cursor()
+    try:
+        cursor.execute(f"""
+            UPDATE products p
+            JOIN (
+                SELECT product_id, SUM(available) AS available
+                FROM stock_shards
+                {where}
+                GROUP BY product_id
+            ) s ON s.product_id = p.id
+            SET p.stock = s.available
+        """, params)
+        connection.commit()
+    finally:
+        cursor.close()
+
+
+def drop_product(cursor, product_id):
+    """Forget a deleted product's shards; run in the transaction that deletes it."""
+    cursor.execute("DELETE FROM stock_shards WHERE product_id = %s", (product_id,))
+
+
+def set_stock(cursor, product_id, stock, shards=SHARDS):
+    """Make `stock` the sellable stock of a product (None: stop tracking it).
+
+    Run in the transaction that sets products.stock, after that UPDATE, so
+    the products row is locked before the shards as in _init_shards().
+    Units held by open reservations are not part of `stock`; a released
+    hold still adds its units back.
+    """
+    cursor.execute(LOCK_SHARDS, (product_id,))
+    existing = [shard for shard, _ in cursor.fetchall()]
+    if stock is None:
+        drop_product(cursor, product_id)
+        return
+    split = _split(max(stock, 0), shards)
+    # Shards past the new count are kept at 0 so holds taken from them can be given back
+    rows = [(product_id, shard, available) for shard, available in enumerate(split)]
+    rows += [(product_id, shard, 0) for shard in existing if shard >= len(split)]
+    cursor.executemany("""
+        INSERT INTO stock_shards (product_id, shard, available) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE available = VALUES(available)
+    """, rows)
+
+
+def resync(connection, product_ids=None, shards=SHARDS):
+    """Rewrite the shards of `product_ids` (every tracked or sharded product when None)
+    from products.stock; returns how many products."""
+    cursor = connection.cursor()
+    try:
+        if product_ids is None:
+            cursor.execute("""
+                SELECT p.id FROM products p
+                WHERE p.stock IS NOT NULL
+                   OR EXISTS (SELECT 1 FROM stock_shards s WHERE s.product_id = p.id)
+            """)
+            product_ids = [row[0] for row in cursor.fetchall()]
+        for start in range(0, len(product_ids), 500):
+            batch = product_ids[start:start + 500]
+            connection.start_transaction()
+            cursor.execute(f"SELECT id, stock FROM products WHERE id IN ({_in(batch)}) FOR UPDATE", batch)
+            for product_id, stock in cursor.fetchall():
+                set_stock(cursor, product_id, stock, shards)
+            connection.commit()
+        return len(product_ids)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def init_all(connection, shards=SHARDS):
+    """Create shards for every stock-tracked product that has none; returns how many products."""
+    cursor = connection.cursor()
+    try:
+        cursor.execute("""
+            SELECT p.id FROM products p
+            WHERE p.stock IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM stock_shards s WHERE s.product_id = p.id)
+        """)
+        product_ids = [row[0] for row in cursor.fetchall()]
+        for start in range(0, len(product_ids), 500):
+            connection.start_transaction()
+            _init_shards(cursor, product_ids[start:start + 500], shards)
+            connection.commit()
+        return len(product_ids)
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+# Keeps products.stock in step with the shards without writing the products
+# row on every checkout: reservations mark their products dirty and one
+# background thread syncs all of them every `interval` seconds, and releases
+# expired holds every `reap_interval` seconds. `on_sync(product_ids)` runs
+# after each sync (e.g. to invalidate cached catalog responses).
+class StockSyncer:
+    def __init__(self, connect, interval=1.0, reap_interval=10.0, on_sync=None):
+        self.connect = connect
+        self.interval = interval
+        self.reap_interval = reap_interval
+        self.on_sync = on_sync
+        self._dirty = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {"syncs": 0, "synced_products": 0, "reaped_products": 0, "errors": 0}
+
+    def mark(self, *product_ids):
+        with self._lock:
+            self._dirty.update(product_ids)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stock-sync', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        next_reap = time.monotonic() + self.reap_interval
+        while True:
+            time.sleep(self.interval)
+            connection = self.connect()
+            if connection is None:
+                continue
+            try:
+                if time.monotonic() >= next_reap:
+                    next_reap = time.monotonic() + self.reap_interval
+                    reaped = reap_expired(connection)
+                    with self._lock:
+                        self._dirty.update(reaped)
+                        self._stats["reaped_products"] += len(reaped)
+                with self._lock:
+                    dirty, self._dirty = sorted(self._dirty), set()
+                if dirty:
+                    try:
+                        sync_stock(connection, dirty)
+                    except Error:
+                        with self._lock:
+                            self._dirty.update(dirty)
+                        raise
+                    with self._lock:
+                        self._stats["syncs"] += 1
+                        self._stats["synced_products"] += len(dirty)
+                    if self.on_sync is not None:
+                        self.on_sync(dirty)
+            except Error as e:
+                print(f"Error syncing stock: {e}")
+                with self._lock:
+                    self._stats["errors"] += 1
+            finally:
+                connection.close()
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["dirty"] = len(self._dirty)
+        return stats
+
+
+# ---------------------------------------------------------------------------
+# Stress test
+
+def stress(pool, stock, threads, seconds, shards, ttl):
+    """Hammer one scratch product with reserve/confirm/release/abandon; returns a list of violations."""
+    connection = pool.get_connection()
+    cursor = connection.cursor()
+    cursor.execute(
+        "INSERT INTO products (name, price, description, category, stock) VALUES (%s, %s, %s, %s, %s)",
+        (f"Reservation stress {time.time_ns()}", 1, "scratch", "Stress", stock)
+    )
+    product_id = cursor.lastrowid
+    connection.commit()
+    cursor.close()
+    connection.close()
+
+    lock = threading.Lock()
+    counts = defaultdict(int)
+    deadline = time.monotonic() + seconds
+
+    def worker(index):
+        rng = random.Random(index)
+        while time.monotonic() < deadline:
+            quantity = rng.randint(1, 3)
+            connection = pool.get_connection()
+            try:
+                try:
+                    token, _ = reserve(connection, {product_id: quantity}, ttl, shards)
+                except InsufficientStock:
+                    with lock:
+                        counts["sold_out"] += 1
+                    continue
+                action = rng.random()
+                if action < 0.6:
+                    cursor = connection.cursor()
+                    try:
+                        connection.start_transaction()
+                        confirm(cursor, token)
+                        connection.commit()
+                        with lock:
+                            counts["confirmed"] += quantity
+                    except ReservationInvalid:
+                        connection.rollback()
+                        with lock:
+                            counts["expired_before_confirm"] += 1
+                    finally:
+                        cursor.close()
+                elif action < 0.8:
+                    release(connection, token)
+                    with lock:
+                        counts["released"] += 1
+                else:
+                    with lock:
+                        counts["abandoned"] += 1
+            except Error as e:
+                with lock:
+                    counts["errors"] += 1
+                print(f"Error in stress worker: {e}")
+            finally:
+                connection.close()
+
+    def reaper():
+        while time.monotonic() < deadline + ttl + 2:
+            connection = pool.get_connection()
+            try:
+                reap_expired(connection)
+            finally:
+                connection.close()
+            time.sleep(0.5)
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    reaper_thread = threading.Thread(target=reaper)
+    for thread in workers + [reaper_thread]:
+        thread.start()
+    for thread in workers + [reaper_thread]:
+        thread.join()
+
+    connection = pool.get_connection()
+    cursor = connection.cursor()
+    try:
+        reap_all(connection)
+        cursor.execute("SELECT MIN(available), SUM(available) FROM stock_shards WHERE product_id = %s",
+                       (product_id,))
+        min_available, total_available = cursor.fetchone()
+        cursor.execute("""
+            SELECT status, COALESCE(SUM(quantity), 0) FROM stock_reservations
+            WHERE product_id = %s GROUP BY status
+        """, (product_id,))
+        by_status = {status: int(total) for status, total in cursor.fetchall()}
+
+        confirmed = by_status.get('confirmed', 0)
+        violations = []
+        if min_available is not None and min_available < 0:
+            violations.append(f"a shard went negative ({min_available})")
+        if confirmed > stock:
+            violations.append(f"oversold: {confirmed} units confirmed from a stock of {stock}")
+        if confirmed != counts["confirmed"]:
+            violations.append(f"{counts['confirmed']} units confirmed by clients but {confirmed} recorded")
+        if by_status.get('held', 0):
+            violations.append(f"{by_status['held']} units still held after every TTL passed")
+        if int(total_available or 0) + confirmed != stock:
+            violations.append(f"stock leaked: {total_available} available + {confirmed} confirmed != {stock}")
+
+        print(f"product {product_id}: stock {stock}, {confirmed} confirmed, {total_available} left; "
+              + ", ".join(f"{key} {value}" for key, value in sorted(counts.items())))
+
+        cursor.execute("DELETE FROM stock_reservations WHERE product_id = %s", (product_id,))
+        cursor.execute("DELETE FROM stock_shards WHERE product_id = %s", (product_id,))
+        cursor.execute("DELETE FROM products WHERE id = %s", (product_id,))
+        connection.commit()
+        return violations
+    finally:
+        cursor.close()
+        connection.close()
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Stock reservation maintenance and stress test")
+    parser.add_argument('command', choices=['init', 'resync', 'reap', 'sync', 'stress'])
+    parser.add_argument('--shards', type=int, default=SHARDS)
+    parser.add_argument('--stock', type=int, default=500, help="stress: units of the scratch product")
+    parser.add_argument('--threads', type=int, default=32, help="stress: concurrent clients")
+    parser.add_argument('--seconds', type=float, default=10, help="stress: how long to run")
+    parser.add_argument('--ttl', type=int, default=2, help="stress: reservation TTL in seconds")
+    args = parser.parse_args(argv[1:])
+
+    from config import connect, db_config
+
+    if args.command == 'stress':
+        from db_pool import ConnectionPool
+
+        pool = ConnectionPool(db_config, size=args.threads + 2, timeout=30)
+        violations = stress(pool, args.stock, args.threads, args.seconds, args.shards, args.ttl)
+        pool.close_all()
+        for violation in violations:
+            print(violation)
+        print("No overselling" if not violations else f"{len(violations)} invariant(s) violated")
+        return 1 if violations else 0
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        if args.command == 'init':
+            print(f"Created shards for {init_all(connection, args.shards)} products")
+        elif args.command == 'resync':
+            print(f"Rewrote shards for {resync(connection, shards=args.shards)} products from products.stock")
+        elif args.command == 'reap':
+            print(f"Released expired holds in {reap_all(connection)} batches")
+        else:
+            sync_stock(connection)
+            print("products.stock updated from the shards")
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
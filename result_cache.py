@@ -0,0 +1,100 @@
+import threading
+import time
+
+
+# One in-progress computation: its leader sets `value` or `error` and then
+# `done`; everyone else waits on `done`. Also used by cohorts.CohortIndex and
+# columnar.ColumnarEngine.
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+# TTL cache for expensive query results with single-flight loading.
+#
+# - Within `ttl` seconds of being computed a result is served as is.
+# - For a further `stale_ttl` seconds the old result is still served, while
+#   one background thread recomputes it (stale-while-revalidate).
+# - Past that, or on a miss, the first caller computes the result and every
+#   concurrent caller for the same key waits for it instead of running the
+#   same query again.
+class ResultCache:
+    def __init__(self, ttl=60, stale_ttl=300):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._entries = {}  # key -> (value, computed_at)
+        self._flights = {}  # key -> Flight
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0, "refreshes": 0, "errors": 0}
+
+    def get(self, key, compute):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, computed_at = entry
+                age = now - computed_at
+                if age < self.ttl:
+                    self._stats["hits"] += 1
+                    return value
+                if age < self.ttl + self.stale_ttl:
+                    self._stats["stale_hits"] += 1
+                    if key not in self._flights:
+                        flight = self._flights[key] = Flight()
+                        self._stats["refreshes"] += 1
+                        threading.Thread(target=self._run, args=(key, compute, flight, True), daemon=True).start()
+                    return value
+
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Flight()
+                self._stats["misses"] += 1
+                leader = True
+            else:
+                self._stats["coalesced"] += 1
+                leader = False
+
+        if leader:
+            self._run(key, compute, flight)
+        else:
+            flight.done.wait()
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def _run(self, key, compute, flight, background=False):
+        try:
+            flight.value = compute()
+            with self._lock:
+                self._entries[key] = (flight.value, time.monotonic())
+        except Exception as e:
+            flight.error = e
+            with self._lock:
+                self._stats["errors"] += 1
+            if background:
+                # Nobody is waiting on a revalidation; keep serving the stale result
+                print(f"Error refreshing cached result {key}: {e}")
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def purge(self, key=None):
+        """Drop one key, or everything when key is None; returns how many entries were dropped."""
+        with self._lock:
+            if key is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                dropped = 1 if self._entries.pop(key, None) is not None else 0
+        return dropped
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"entries": len(self._entries), "in_flight": len(self._flights),
+                          "ttl": self.ttl, "stale_ttl": self.stale_ttl})
+        return stats
@@ -0,0 +1,224 @@
+"""Incrementally maintained sales rollups behind the /sales-report/* routes.
+
+sales_daily_product holds one row per (day, product) and sales_customer one
+row per customer. The order routes update them in the same transaction as
+the orders they write, so the reports never scan the orders table.
+
+Run `python sales_rollups.py rebuild` once after creating the tables (and
+any time orders were changed outside the API) to regenerate the rollups
+from raw orders; `python sales_rollups.py verify` only checks them.
+"""
+import sys
+from collections import defaultdict
+from decimal import Decimal
+
+CREATE_TABLES = [
+    """
+    CREATE TABLE IF NOT EXISTS sales_daily_product (
+        sale_date DATE NOT NULL,
+        product_id INT NOT NULL,
+        items_sold INT NOT NULL,
+        total_sales DECIMAL(14, 2) NOT NULL,
+        PRIMARY KEY (sale_date, product_id),
+        KEY idx_sales_daily_product_product (product_id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS sales_customer (
+        user_id INT PRIMARY KEY,
+        order_count INT NOT NULL,
+        total_spent DECIMAL(14, 2) NOT NULL,
+        KEY idx_sales_customer_total_spent (total_spent)
+    )
+    """,
+]
+
+# items_sold mirrors the reports' COUNT(o.id): one per orders row
+UPSERT_DAILY_PRODUCT = """
+    INSERT INTO sales_daily_product (sale_date, product_id, items_sold, total_sales)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        items_sold = items_sold + VALUES(items_sold),
+        total_sales = total_sales + VALUES(total_sales)
+"""
+
+UPSERT_CUSTOMER = """
+    INSERT INTO sales_customer (user_id, order_count, total_spent)
+    VALUES (%s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        order_count = order_count + VALUES(order_count),
+        total_spent = total_spent + VALUES(total_spent)
+"""
+
+# Report queries, shaped exactly like the old scans of orders
+PRODUCTS_SOLD_QUERY = """
+    SELECT p.name, p.price, CAST(SUM(r.items_sold) AS SIGNED) AS items_sold,
+           SUM(r.total_sales) AS total_sales
+    FROM sales_daily_product r
+    JOIN products p ON r.product_id = p.id
+    GROUP BY p.name, p.price
+"""
+
+PRODUCTS_SALES_CHART_QUERY = """
+    SELECT p.name, SUM(r.total_sales) AS total_sales
+    FROM sales_daily_product r
+    JOIN products p ON r.product_id = p.id
+    GROUP BY p.name
+"""
+
+DAILY_SALES_QUERY = """
+    SELECT sale_date AS date, SUM(total_sales) AS total_sales
+    FROM sales_daily_product
+    GROUP BY sale_date
+    ORDER BY date DESC
+"""
+
+TOP_CUSTOMERS_QUERY = """
+    SELECT u.name AS customer_name, u.email, c.total_spent
+    FROM sales_customer c
+    JOIN users u ON c.user_id = u.id
+    ORDER BY c.total_spent DESC
+    LIMIT 5
+"""
+
+ORDER_ROW_QUERY = """
+    SELECT DATE(order_date) AS sale_date, product_id, user_id, total_price
+    FROM orders
+    WHERE id = %s
+    FOR UPDATE
+"""
+
+
+def apply_orders(cursor, rows, sign=1):
+    """Add (sign=1) or subtract (sign=-1) orders rows from the rollups.
+
+    `rows` are (sale_date, product_id, user_id, total_price) tuples. Must run
+    inside the transaction that writes the orders rows themselves.
+    """
+    daily = defaultdict(lambda: [0, Decimal(0)])
+    customers = defaultdict(lambda: [0, Decimal(0)])
+    for sale_date, product_id, user_id, total_price in rows:
+        price = Decimal(str(total_price or 0)) * sign
+        daily[(sale_date, product_id)][0] += sign
+        daily[(sale_date, product_id)][1] += price
+        customers[user_id][0] += sign
+        customers[user_id][1] += price
+
+    if not daily:
+        return
+
+    cursor.executemany(UPSERT_DAILY_PRODUCT, [
+        (sale_date, product_id, count, total)
+        for (sale_date, product_id), (count, total) in daily.items()
+    ])
+    cursor.executemany(UPSERT_CUSTOMER, [
+        (user_id, count, total) for user_id, (count, total) in customers.items()
+    ])
+
+    # Groups with no orders left disappear, as they would from a GROUP BY
+    if sign < 0:
+        cursor.executemany(
+            "DELETE FROM sales_daily_product WHERE sale_date = %s AND product_id = %s AND items_sold <= 0",
+            list(daily)
+        )
+        cursor.executemany(
+            "DELETE FROM sales_customer WHERE user_id = %s AND order_count <= 0",
+            [(user_id,) for user_id in customers]
+        )
+
+
+def lock_order_row(cursor, order_id):
+    """Lock an orders row and return its rollup tuple, or None if it is missing."""
+    cursor.execute(ORDER_ROW_QUERY, (order_id,))
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    if isinstance(row, dict):
+        return (row['sale_date'], row['product_id'], row['user_id'], row['total_price'])
+    return tuple(row)
+
+
+def rebuild(connection):
+    cursor = connection.cursor()
+    try:
+        for statement in CREATE_TABLES:
+            cursor.execute(statement)
+        connection.start_transaction()
+        cursor.execute("DELETE FROM sales_daily_product")
+        cursor.execute("DELETE FROM sales_customer")
+        cursor.execute("""
+            INSERT INTO sales_daily_product (sale_date, product_id, items_sold, total_sales)
+            SELECT DATE(order_date), product_id, COUNT(id), SUM(total_price)
+            FROM orders
+            GROUP BY DATE(order_date), product_id
+        """)
+        cursor.execute("""
+            INSERT INTO sales_customer (user_id, order_count, total_spent)
+            SELECT user_id, COUNT(id), SUM(total_price)
+            FROM orders
+            GROUP BY user_id
+        """)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def verify(connection):
+    """Compare the rollups with fresh aggregates over orders; return the mismatches."""
+    checks = [
+        ("sales_daily_product", """
+            SELECT DATE(order_date), product_id, COUNT(id), SUM(total_price)
+            FROM orders
+            GROUP BY DATE(order_date), product_id
+        """, "SELECT sale_date, product_id, items_sold, total_sales FROM sales_daily_product"),
+        ("sales_customer", """
+            SELECT user_id, COUNT(id), SUM(total_price)
+            FROM orders
+            GROUP BY user_id
+        """, "SELECT user_id, order_count, total_spent FROM sales_customer"),
+    ]
+    mismatches = []
+    cursor = connection.cursor()
+    try:
+        for table, expected_query, actual_query in checks:
+            cursor.execute(expected_query)
+            expected = {row[:-2]: row[-2:] for row in cursor.fetchall()}
+            cursor.execute(actual_query)
+            actual = {row[:-2]: row[-2:] for row in cursor.fetchall()}
+            for key in expected.keys() | actual.keys():
+                if expected.get(key) != actual.get(key):
+                    mismatches.append((table, key, expected.get(key), actual.get(key)))
+    finally:
+        cursor.close()
+    return mismatches
+
+
+def main(argv):
+    if len(argv) != 2 or argv[1] not in ('rebuild', 'verify'):
+        print("Usage: python sales_rollups.py rebuild|verify")
+        return 2
+
+    from config import connect
+
+    connection = connect()
+    if connection is None:
+        return 1
+    try:
+        if argv[1] == 'rebuild':
+            rebuild(connection)
+            print("Sales rollups rebuilt from orders")
+        mismatches = verify(connection)
+    finally:
+        connection.close()
+
+    for table, key, expected, actual in mismatches:
+        print(f"{table} {key}: expected {expected}, found {actual}")
+    print("Sales rollups match orders" if not mismatches else f"{len(mismatches)} rollup rows differ from orders")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
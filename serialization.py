@@ -0,0 +1,78 @@
+"""Response encoding with content negotiation.
+
+Format comes from the Accept header: application/json (the default) or
+MessagePack (application/msgpack or application/x-msgpack) when the msgpack
+package is installed. JSON is encoded with orjson when it is installed and
+with Flask's encoder otherwise; both give the same values (Decimal as a
+string, dates as HTTP dates, keys sorted), so clients cannot tell which ran.
+
+The `shape` query parameter picks how a list of rows is laid out:
+
+    rows   (default)  [{"name": "A", "stock": 3}, {"name": "B", "stock": 5}]
+    table             {"columns": ["name", "stock"], "rows": [["A", 3], ["B", 5]]}
+
+The table shape sends every column name once instead of once per row.
+"""
+from datetime import date
+from decimal import Decimal
+
+from flask import json
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = 'application/json'
+MSGPACK = 'application/msgpack'
+SHAPES = ('rows', 'table')
+
+# Offered in preference order; JSON wins a tie such as Accept: */*
+OFFERS = [JSON] + ([MSGPACK, 'application/x-msgpack'] if msgpack is not None else [])
+
+
+def _default(value):
+    # Same conversions as Flask's JSON provider
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, date):
+        return http_date(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not serializable")
+
+
+def dumps_json(data):
+    """Encode `data` as JSON bytes."""
+    if orjson is not None:
+        return orjson.dumps(data, default=_default,
+                            option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SORT_KEYS)
+    return json.dumps(data).encode('utf-8')
+
+
+def to_table(rows):
+    """Lay a list of row dicts out as column names plus row arrays."""
+    columns = list(rows[0]) if rows else []
+    return {"columns": columns, "rows": [[row[column] for column in columns] for row in rows]}
+
+
+def negotiate(request):
+    """Return (mimetype, shape) for the current request."""
+    mimetype = request.accept_mimetypes.best_match(OFFERS, default=JSON)
+    if mimetype != JSON:
+        mimetype = MSGPACK
+    shape = request.args.get('shape', 'rows')
+    return mimetype, shape if shape in SHAPES else 'rows'
+
+
+def encode(data, mimetype=JSON, shape='rows'):
+    """Encode `data` (a list of row dicts or a single dict) as `mimetype` bytes in `shape`."""
+    if shape == 'table' and isinstance(data, list):
+        data = to_table(data)
+    if mimetype == MSGPACK:
+        return msgpack.packb(data, default=_default, use_bin_type=True)
+    return dumps_json(data)
@@ -0,0 +1,108 @@
+import hmac
+import secrets
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import bcrypt
+
+# What a session token resolves to; enough to authorize a request without
+# reading the users table
+Principal = namedtuple('Principal', ['user_id', 'email', 'name', 'role'])
+
+
+# In-memory session tokens. Each token maps to its Principal until it is
+# revoked, expires `ttl` seconds after login, or is evicted least-recently-
+# used once more than `max_entries` sessions are live. Lookups are a dict
+# access under a lock.
+class SessionStore:
+    def __init__(self, ttl=8 * 3600, max_entries=100000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._sessions = OrderedDict()  # token -> (principal, expires_at)
+        self._lock = threading.Lock()
+        self._stats = {"issued": 0, "hits": 0, "misses": 0, "expired": 0, "evictions": 0, "revoked": 0}
+
+    def issue(self, principal):
+        token = secrets.token_urlsafe(32)
+        with self._lock:
+            self._sessions[token] = (principal, time.monotonic() + self.ttl)
+            self._stats["issued"] += 1
+            while len(self._sessions) > self.max_entries:
+                self._sessions.popitem(last=False)
+                self._stats["evictions"] += 1
+        return token
+
+    def get(self, token):
+        """Return the Principal for a live token, else None."""
+        with self._lock:
+            entry = self._sessions.get(token)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            principal, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._sessions[token]
+                self._stats["expired"] += 1
+                return None
+            self._sessions.move_to_end(token)
+            self._stats["hits"] += 1
+            return principal
+
+    def revoke(self, token):
+        with self._lock:
+            if self._sessions.pop(token, None) is not None:
+                self._stats["revoked"] += 1
+                return True
+        return False
+
+    def revoke_user(self, user_id):
+        """Drop every session of one user (e.g. after a password or role change)."""
+        with self._lock:
+            tokens = [token for token, (principal, _) in self._sessions.items() if principal.user_id == user_id]
+            for token in tokens:
+                del self._sessions[token]
+            self._stats["revoked"] += len(tokens)
+        return len(tokens)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats.update({"sessions": len(self._sessions), "max_entries": self.max_entries, "ttl": self.ttl})
+        return stats
+
+
+def _is_bcrypt(stored):
+    return stored.startswith(('$2a$', '$2b$', '$2y$'))
+
+
+# Password hashing on a small dedicated thread pool. bcrypt releases the GIL
+# while it works, so hashing runs in parallel with other requests, and the
+# pool size bounds how many cores a burst of logins can take.
+class PasswordHasher:
+    def __init__(self, workers=4, rounds=10):
+        self.rounds = rounds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+
+    def hash(self, password):
+        return self._executor.submit(self._hash, password).result()
+
+    def verify(self, password, stored):
+        """Check `password` against a stored bcrypt hash (or a legacy plaintext value)."""
+        return self._executor.submit(self._verify, password, stored).result()
+
+    def _hash(self, password):
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.rounds)).decode('ascii')
+
+    def _verify(self, password, stored):
+        if _is_bcrypt(stored):
+            return bcrypt.checkpw(password.encode('utf-8'), stored.encode('ascii'))
+        # Rows created before passwords were hashed
+        return hmac.compare_digest(password.encode('utf-8'), stored.encode('utf-8'))
+
+    def needs_rehash(self, stored):
+        return not _is_bcrypt(stored)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,287 @@
+"""Scheduled snapshots of slow, slowly-changing analytics queries.
+
+Each SnapshotJob runs its query every `interval` seconds, give or take
+`jitter` (a fraction of the interval, so jobs and app servers drift apart
+instead of hitting MySQL together), and stores the encoded rows in
+analytics_snapshots together with computed_at. Endpoints serve the stored
+snapshot and never run the query themselves, except once when no snapshot
+exists yet.
+
+A job never overlaps itself: a tick that comes while the previous run is
+still going is skipped, and a MySQL named lock keeps two app servers from
+computing the same snapshot at once (the one that loses the lock serves
+the stored snapshot instead).
+
+    python snapshots.py run [name ...]     # compute now, e.g. from cron
+    python snapshots.py status
+"""
+import heapq
+import json
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from mysql.connector import Error
+
+import queries
+import serialization
+
+CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS analytics_snapshots (
+        name VARCHAR(64) PRIMARY KEY,
+        payload LONGTEXT NOT NULL,
+        computed_at DATETIME NOT NULL,
+        duration_ms INT NOT NULL
+    )
+"""
+
+SAVE_SNAPSHOT = """
+    INSERT INTO analytics_snapshots (name, payload, computed_at, duration_ms)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE payload = VALUES(payload), computed_at = VALUES(computed_at),
+                            duration_ms = VALUES(duration_ms)
+"""
+
+LOAD_SNAPSHOT = "SELECT payload, computed_at FROM analytics_snapshots WHERE name = %s"
+
+_table_ready = False
+
+
+def _ensure_table(cursor):
+    # Also created by migration 5; this covers databases that were not migrated
+    global _table_ready
+    if not _table_ready:
+        cursor.execute(CREATE_TABLE)
+        _table_ready = True
+
+
+# name -> (query, single row): what each endpoint returns
+JOBS = {
+    'seasonal_sales_analysis': (queries.SEASONAL_SALES_QUERY, False),
+    'customer_lifetime_value': (queries.CUSTOMER_LIFETIME_VALUE_QUERY, False),
+}
+
+
+class SnapshotJob:
+    def __init__(self, name, query, one=False):
+        self.name = name
+        self.query = query
+        self.one = one
+        self.data = None
+        self.computed_at = None
+        self.running = False
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._status = {"runs": 0, "failures": 0, "skipped": 0, "last_started": None,
+                        "last_duration": None, "last_error": None}
+
+    def _compute(self, connection):
+        cursor = connection.cursor(dictionary=True)
+        try:
+            _ensure_table(cursor)
+            # Named locks are per server, so one app server computes at a time
+            cursor.execute("SELECT GET_LOCK(%s, 0) AS got", (f"snapshot:{self.name}",))
+            if cursor.fetchone()['got'] != 1:
+                return False
+            try:
+                started = time.perf_counter()
+                cursor.execute(self.query)
+                rows = cursor.fetchall()
+                data = (rows[0] if rows else {}) if self.one else rows
+                payload = serialization.dumps_json(data).decode('utf-8')
+                computed_at = datetime.now().replace(microsecond=0)
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                cursor.execute(SAVE_SNAPSHOT, (self.name, payload, computed_at, duration_ms))
+                connection.commit()
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (f"snapshot:{self.name}",))
+                cursor.fetchall()
+        finally:
+            cursor.close()
+        # Keep what was sent to MySQL, so the endpoint serves exactly the stored JSON
+        with self._lock:
+            self.data, self.computed_at = json.loads(payload), computed_at
+        return True
+
+    def load(self, connection):
+        """Read the stored snapshot into memory; False if there is none."""
+        cursor = connection.cursor()
+        try:
+            _ensure_table(cursor)
+            cursor.execute(LOAD_SNAPSHOT, (self.name,))
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        if row is None:
+            return False
+        with self._lock:
+            self.data, self.computed_at = json.loads(row[0]), row[1]
+        return True
+
+    def run(self, connect, wait=False):
+        """Compute the snapshot now. Returns False without running if a run is
+        already going (after waiting for it to finish when `wait`)."""
+        with self._lock:
+            if self.running:
+                self._status["skipped"] += 1
+                if wait:
+                    self._done.wait_for(lambda: not self.running)
+                return False
+            self.running = True
+            self._status["last_started"] = datetime.now().replace(microsecond=0).isoformat()
+        started = time.perf_counter()
+        error = None
+        connection = connect()
+        try:
+            if connection is None:
+                raise Error(msg="No database connection")
+            if not self._compute(connection):
+                # Another app server is computing it; serve what is stored
+                self.load(connection)
+        except Error as e:
+            error = e
+            print(f"Error computing snapshot {self.name}: {e}")
+        finally:
+            if connection is not None:
+                connection.close()
+            with self._lock:
+                self.running = False
+                self._status["runs"] += 1
+                self._status["last_duration"] = round(time.perf_counter() - started, 3)
+                self._status["last_error"] = str(error) if error else None
+                if error:
+                    self._status["failures"] += 1
+                self._done.notify_all()
+        return error is None
+
+    def latest(self, connect):
+        """(data, computed_at) of the newest snapshot, computing it if there is none yet."""
+        if self.data is None:
+            connection = connect()
+            try:
+                if connection is not None and self.load(connection):
+                    return self.data, self.computed_at
+            finally:
+                if connection is not None:
+                    connection.close()
+            self.run(connect, wait=True)
+            if self.data is None:
+                raise Error(msg=f"Snapshot {self.name} is not available: {self._status['last_error']}")
+        with self._lock:
+            return self.data, self.computed_at
+
+    def status(self):
+        with self._lock:
+            status = dict(self._status)
+            status.update({"name": self.name, "running": self.running,
+                           "computed_at": self.computed_at.isoformat() if self.computed_at else None})
+        return status
+
+
+# Runs every job on its own cadence from one timer thread; the runs
+# themselves go to a small pool so a slow job does not delay the others.
+class SnapshotScheduler:
+    def __init__(self, connect, jobs, interval=300.0, jitter=0.1, workers=2):
+        self.connect = connect
+        self.jobs = {job.name: job for job in jobs}
+        self.interval = interval
+        self.jitter = jitter
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='snapshot')
+        self._heap = []  # (due, name)
+        self._next_run = {}
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+    def _delay(self):
+        return self.interval * (1 + random.uniform(-self.jitter, self.jitter))
+
+    def start(self):
+        with self._cond:
+            if self._thread is not None:
+                return
+            now = time.monotonic()
+            for name in self.jobs:
+                # First runs are spread over the jitter window
+                self._schedule(name, now + random.uniform(0, self.interval * self.jitter))
+            self._thread = threading.Thread(target=self._run, name='snapshot-scheduler', daemon=True)
+            self._thread.start()
+
+    def _schedule(self, name, due):
+        self._next_run[name] = due
+        heapq.heappush(self._heap, (due, name))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and (not self._heap or self._heap[0][0] > time.monotonic()):
+                    self._cond.wait(self._heap[0][0] - time.monotonic() if self._heap else None)
+                if self._stopping:
+                    return
+                _, name = heapq.heappop(self._heap)
+                self._schedule(name, time.monotonic() + self._delay())
+            # A run still going from the last tick makes this one a no-op
+            self._executor.submit(self.jobs[name].run, self.connect)
+
+    def trigger(self, name):
+        """Run a job now in the background; False if it is already running."""
+        job = self.jobs[name]
+        if job.running:
+            return False
+        self._executor.submit(job.run, self.connect)
+        return True
+
+    def close(self):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False)
+
+    def status(self):
+        now = time.monotonic()
+        with self._cond:
+            next_run = dict(self._next_run)
+        jobs = []
+        for name, job in self.jobs.items():
+            status = job.status()
+            status["next_run_in"] = round(next_run[name] - now, 1) if name in next_run else None
+            jobs.append(status)
+        return {"interval": self.interval, "jitter": self.jitter, "started": self._thread is not None, "jobs": jobs}
+
+
+def default_jobs():
+    return [SnapshotJob(name, query, one) for name, (query, one) in JOBS.items()]
+
+
+def main(argv):
+    from config import connect
+
+    command = argv[1] if len(argv) > 1 else 'status'
+    jobs = {job.name: job for job in default_jobs()}
+    names = argv[2:] or list(jobs)
+    unknown = [name for name in names if name not in jobs]
+    if unknown or command not in ('run', 'status'):
+        print(f"Usage: python snapshots.py run|status [{'|'.join(jobs)} ...]")
+        return 2
+
+    failed = False
+    for name in names:
+        job = jobs[name]
+        if command == 'run':
+            failed |= not job.run(connect)
+        else:
+            connection = connect()
+            try:
+                job.load(connection)
+            finally:
+                connection.close()
+        status = job.status()
+        print(f"{name}: computed_at={status['computed_at']} last_duration={status['last_duration']}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,105 @@
+import heapq
+import threading
+from collections import defaultdict
+
+# Longest n-gram kept in the index. Shorter search terms are looked up
+# directly; longer ones intersect their trigrams and verify the candidates.
+GRAM_SIZE = 3
+
+
+def _grams(text):
+    grams = set()
+    for n in range(1, GRAM_SIZE + 1):
+        for i in range(len(text) - n + 1):
+            grams.add(text[i:i + n])
+    return grams
+
+
+# In-memory substring index over product names, ranked by how often each
+# product has been ordered. Matches the old `name LIKE '%term%'` semantics
+# (case-insensitive) without touching MySQL.
+class TypeaheadIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names = {}  # product id -> (name, lowercased name)
+        self._popularity = defaultdict(int)  # product id -> units ordered
+        self._grams = defaultdict(set)  # n-gram -> product ids
+        self.loaded = False
+
+    def build(self, products, popularity):
+        """Replace the index with `products` [(id, name)] and `popularity` {id: units}."""
+        names = {}
+        grams = defaultdict(set)
+        for product_id, name in products:
+            lowered = (name or '').lower()
+            names[product_id] = (name, lowered)
+            for gram in _grams(lowered):
+                grams[gram].add(product_id)
+
+        with self._lock:
+            self._names = names
+            self._grams = grams
+            self._popularity = defaultdict(int, popularity)
+            self.loaded = True
+
+    def _unindex(self, product_id):
+        entry = self._names.pop(product_id, None)
+        if entry is None:
+            return
+        for gram in _grams(entry[1]):
+            ids = self._grams.get(gram)
+            if ids is not None:
+                ids.discard(product_id)
+                if not ids:
+                    del self._grams[gram]
+
+    def add(self, product_id, name):
+        """Index a new product, or re-index one that was renamed."""
+        lowered = (name or '').lower()
+        with self._lock:
+            self._unindex(product_id)
+            self._names[product_id] = (name, lowered)
+            for gram in _grams(lowered):
+                self._grams[gram].add(product_id)
+
+    def remove(self, product_id):
+        with self._lock:
+            self._unindex(product_id)
+            self._popularity.pop(product_id, None)
+
+    def record_sale(self, product_id, quantity=1):
+        with self._lock:
+            self._popularity[product_id] += quantity
+
+    def search(self, term, limit=10):
+        """Return up to `limit` {"id", "name"} dicts whose name contains `term`.
+
+        Names starting with the term come first, then by popularity, then by name.
+        """
+        term = term.lower()
+        if not term:
+            return []
+
+        with self._lock:
+            if len(term) <= GRAM_SIZE:
+                candidates = self._grams.get(term, ())
+            else:
+                postings = []
+                for i in range(len(term) - GRAM_SIZE + 1):
+                    ids = self._grams.get(term[i:i + GRAM_SIZE])
+                    if not ids:
+                        return []
+                    postings.append(ids)
+                postings.sort(key=len)
+                candidates = set(postings[0]).intersection(*postings[1:])
+                candidates = [pid for pid in candidates if term in self._names[pid][1]]
+
+            names = self._names
+            popularity = self._popularity
+            best = heapq.nsmallest(limit, candidates, key=lambda pid: (
+                not names[pid][1].startswith(term), -popularity.get(pid, 0), names[pid][1]
+            ))
+            return [{"id": pid, "name": names[pid][0]} for pid in best]
+
+    def __len__(self):
+        return len(self._names)
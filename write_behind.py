@@ -0,0 +1,378 @@
+import fcntl
+import json
+import os
+import shutil
+import threading
+import time
+from collections import deque
+
+from mysql.connector import Error
+
+CREATE_OFFSETS_TABLE = """
+    CREATE TABLE IF NOT EXISTS write_behind_offsets (
+        queue_name VARCHAR(64) PRIMARY KEY,
+        segment INT NOT NULL,
+        flushed_offset BIGINT NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+"""
+
+SAVE_OFFSET = """
+    INSERT INTO write_behind_offsets (queue_name, segment, flushed_offset, updated_at)
+    VALUES (%s, %s, %s, NOW())
+    ON DUPLICATE KEY UPDATE segment = VALUES(segment), flushed_offset = VALUES(flushed_offset),
+                            updated_at = VALUES(updated_at)
+"""
+
+
+# Durable write-behind queue for rows that do not need to be written in the
+# caller's transaction (e.g. audit records).
+#
+# put() appends the rows to a local spool file (JSON lines, fsync'd) and
+# returns; a background thread inserts them with `insert_query` in batches
+# of up to `batch_size`, or whatever is pending once the oldest row has
+# waited `flush_interval` seconds. Each batch commits together with the
+# spool position it reached (write_behind_offsets), so after a crash or an
+# unflushed shutdown the next start() replays exactly the rows the database
+# does not have yet.
+#
+# Each process spools into its own locked directory, <pid>.<random> under
+# `spool_dir`, so several workers can share one `spool_dir`. Spool files are
+# segments named <name>.<n>.log in it; a new segment starts every
+# `segment_bytes` and fully flushed ones are deleted. Its position is kept in
+# write_behind_offsets under <name>:<directory>.
+#
+# start() claims the directories of processes that are gone (their lock is
+# free): the flusher inserts whatever rows of theirs the database does not
+# have yet and removes them. Segments directly in `spool_dir`, from before
+# per-process directories, are claimed the same way.
+class WriteBehindQueue:
+    def __init__(self, name, insert_query, connect, spool_dir, batch_size=500, flush_interval=1.0,
+                 max_pending=10000, segment_bytes=16 * 1024 * 1024, fsync=True):
+        self.name = name
+        self.insert_query = insert_query
+        self.connect = connect
+        self.spool_dir = spool_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.segment_bytes = segment_bytes
+        self.fsync = fsync
+
+        self._cond = threading.Condition()
+        self._pending = deque()  # (row, segment, end offset, enqueued_at)
+        # Spool writes take _write_lock and fsyncs _sync_lock, never _cond:
+        # rows written but not yet synced wait in _unsynced, and whichever
+        # put() syncs first moves everyone's rows to _pending (group commit)
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._unsynced = []
+        self._written = 0  # puts written to the spool
+        self._synced = 0  # puts synced and queued
+        self._started = False
+        self._stopping = False
+        self._thread = None
+        self._dir = None
+        self._lock_file = None
+        self._file = None
+        self._segment = 0
+        self._offset = 0
+        self._orphans = []  # (directory, offsets key, locked file)
+        self._stats = {"enqueued": 0, "flushed": 0, "batches": 0, "flush_errors": 0,
+                       "replayed": 0, "rejected": 0}
+
+    def _path(self, segment, directory=None):
+        return os.path.join(directory or self._dir, f"{self.name}.{segment:08d}.log")
+
+    def _key(self, directory):
+        if directory == self.spool_dir:
+            return self.name  # segments from before per-process directories
+        return f"{self.name}:{os.path.basename(directory)}"
+
+    def _segments(self, directory):
+        prefix = self.name + '.'
+        segments = []
+        for filename in os.listdir(directory):
+            number = filename[len(prefix):-len('.log')]
+            if filename.startswith(prefix) and filename.endswith('.log') and number.isdigit():
+                segments.append(int(number))
+        return sorted(segments)
+
+    def _open_segment(self, segment):
+        if self._file is not None:
+            if self.fsync:
+                os.fsync(self._file.fileno())  # its unsynced rows are not covered by the new file's fsync
+            self._file.close()
+        self._segment = segment
+        self._file = open(self._path(segment), 'ab')
+        self._offset = self._file.tell()
+
+    def _lock(self, directory):
+        """Open and lock `directory`'s lock file; None if another process holds it or it is gone."""
+        try:
+            lock_file = open(os.path.join(directory, f"{self.name}.lock"), 'w')
+        except OSError:
+            return None
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _claim_orphans(self):
+        # Directories whose lock is free belong to processes that are gone
+        orphans = []
+        candidates = [self.spool_dir] + [
+            os.path.join(self.spool_dir, entry) for entry in sorted(os.listdir(self.spool_dir))
+            if not entry.startswith('.') and os.path.join(self.spool_dir, entry) != self._dir
+            and os.path.isdir(os.path.join(self.spool_dir, entry))
+        ]
+        for directory in candidates:
+            if directory == self.spool_dir and not self._segments(directory):
+                continue
+            lock_file = self._lock(directory)
+            if lock_file is not None:
+                orphans.append((directory, self._key(directory), lock_file))
+        return orphans
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            os.makedirs(self.spool_dir, exist_ok=True)
+            # Locked under a hidden name and then renamed, so no other process
+            # can take the new directory for an orphan before it is locked
+            name = f"{os.getpid()}.{os.urandom(4).hex()}"
+            staging = os.path.join(self.spool_dir, '.' + name)
+            os.mkdir(staging)
+            self._lock_file = self._lock(staging)
+            if self._lock_file is None:
+                raise RuntimeError(f"Could not lock spool directory {staging}")
+            self._dir = os.path.join(self.spool_dir, name)
+            os.rename(staging, self._dir)
+            self._orphans = self._claim_orphans()
+            self._open_segment(1)
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+            self._thread.start()
+            self._started = True
+
+    def wait_for_capacity(self, timeout):
+        """Wait until fewer than max_pending rows are queued; False if still full after `timeout`."""
+        self.start()
+        with self._cond:
+            if self._cond.wait_for(lambda: len(self._pending) < self.max_pending, timeout):
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def put(self, rows):
+        """Spool `rows` (tuples for insert_query) and queue them for the next batch."""
+        self.start()
+        lines = [json.dumps(list(row), default=str).encode('utf-8') + b'\n' for row in rows]
+        with self._write_lock:
+            if self._offset >= self.segment_bytes:
+                self._open_segment(self._segment + 1)
+            self._file.write(b''.join(lines))
+            self._file.flush()
+            now = time.monotonic()
+            for row, line in zip(rows, lines):
+                self._offset += len(line)
+                self._unsynced.append((tuple(row), self._segment, self._offset, now))
+            self._written += 1
+            written = self._written
+
+        with self._sync_lock:
+            if self._synced >= written:
+                return  # an fsync that started after our write covered it
+            with self._write_lock:
+                synced, entries, self._unsynced = self._written, self._unsynced, []
+                # A duplicate descriptor stays valid if a put() rotates the segment meanwhile
+                fileno = os.dup(self._file.fileno())
+            try:
+                if self.fsync:
+                    os.fsync(fileno)
+            finally:
+                os.close(fileno)
+            # Rows enter _pending in spool order, so a flushed position never skips one
+            with self._cond:
+                self._pending.extend(entries)
+                self._stats["enqueued"] += len(entries)
+                self._cond.notify_all()
+            self._synced = synced
+
+    def _load_offset(self, key):
+        connection = self.connect()
+        if connection is None:
+            raise Error(msg="No database connection")
+        cursor = connection.cursor()
+        try:
+            cursor.execute(CREATE_OFFSETS_TABLE)
+            cursor.execute("SELECT segment, flushed_offset FROM write_behind_offsets WHERE queue_name = %s",
+                           (key,))
+            return cursor.fetchone() or (0, 0)
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _unflushed(self, directory, key):
+        """The rows in `directory`'s segments the database has not committed yet."""
+        segments = self._segments(directory)
+        flushed_segment, flushed_offset = self._load_offset(key)
+        if flushed_segment not in segments:
+            # The segment a flush last reached is never deleted, so the spool
+            # was cleared by hand and none of its rows are in the database
+            flushed_segment, flushed_offset = 0, 0
+        rows = []
+        for segment in segments:
+            if segment < flushed_segment:
+                continue
+            offset = flushed_offset if segment == flushed_segment else 0
+            with open(self._path(segment, directory), 'rb') as handle:
+                handle.seek(offset)
+                for line in handle:
+                    if not line.endswith(b'\n'):
+                        break  # torn write from a crash; the caller never got an answer for it
+                    offset += len(line)
+                    rows.append((tuple(json.loads(line)), segment, offset, time.monotonic()))
+        return rows
+
+    def _replay(self, directory, key, lock_file):
+        """Insert an orphaned directory's unflushed rows, then remove its spool."""
+        rows = self._unflushed(directory, key)
+        for start in range(0, len(rows), self.batch_size):
+            self._flush(rows[start:start + self.batch_size], key)
+        # Every row is committed with the final position, so removing the
+        # files now cannot lose any; a crash before this only replays nothing
+        for segment in self._segments(directory):
+            os.remove(self._path(segment, directory))
+        os.remove(lock_file.name)
+        lock_file.close()
+        if directory != self.spool_dir:
+            shutil.rmtree(directory, ignore_errors=True)
+        try:
+            self._forget_offset(key)
+        except Error as e:
+            print(f"Error removing write-behind offset {key}: {e}")  # harmless leftover row
+        with self._cond:
+            self._stats["replayed"] += len(rows)
+
+    def _forget_offset(self, key):
+        connection = self.connect()
+        if connection is None:
+            raise Error(msg="No database connection")
+        cursor = connection.cursor()
+        try:
+            cursor.execute("DELETE FROM write_behind_offsets WHERE queue_name = %s", (key,))
+            connection.commit()
+        finally:
+            cursor.close()
+            connection.close()
+
+    def _flush(self, batch, key=None):
+        connection = self.connect()
+        if connection is None:
+            raise Error(msg="No database connection")
+        cursor = connection.cursor()
+        try:
+            connection.start_transaction()
+            cursor.executemany(self.insert_query, [row for row, _, _, _ in batch])
+            _, segment, offset, _ = batch[-1]
+            cursor.execute(SAVE_OFFSET, (key or self._key(self._dir), segment, offset))
+            connection.commit()
+        except Error:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+            connection.close()
+
+        if key is not None:
+            return
+        # Segments before the one this batch ended in are fully flushed
+        for old in range(segment - 1, 0, -1):
+            try:
+                os.remove(self._path(old))
+            except OSError:
+                break
+
+    def _next_batch(self):
+        with self._cond:
+            while True:
+                if len(self._pending) >= self.batch_size:
+                    break
+                if self._pending:
+                    waited = time.monotonic() - self._pending[0][3]
+                    if self._stopping or waited >= self.flush_interval:
+                        break
+                    self._cond.wait(self.flush_interval - waited)
+                elif self._stopping:
+                    return None
+                else:
+                    self._cond.wait()
+            return [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+
+    def _run(self):
+        backoff = 0.5
+        while self._orphans:
+            try:
+                self._replay(*self._orphans[0])
+                self._orphans.pop(0)
+            except (Error, OSError, ValueError) as e:
+                print(f"Error replaying write-behind spool {self._orphans[0][0]}: {e}")
+                if self._stopping:
+                    return
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+        backoff = 0.5
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._flush(batch)
+            except Error as e:
+                print(f"Error flushing write-behind queue {self.name}: {e}")
+                with self._cond:
+                    self._stats["flush_errors"] += 1
+                    if self._stopping:
+                        return  # rows stay in the spool for the next start
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+                continue
+            backoff = 0.5
+            with self._cond:
+                for _ in batch:
+                    self._pending.popleft()
+                self._stats["flushed"] += len(batch)
+                self._stats["batches"] += 1
+                self._cond.notify_all()
+
+    def close(self, timeout=10.0):
+        """Flush what is pending (waiting up to `timeout` seconds) and stop the flusher."""
+        with self._cond:
+            if not self._started:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._write_lock:
+            self._file.close()
+        with self._cond:
+            self._lock_file.close()  # the next process to start claims what is left
+            for _, _, lock_file in self._orphans:
+                lock_file.close()
+            self._orphans = []
+            self._started = False
+            if self._pending:
+                print(f"Write-behind queue {self.name}: {len(self._pending)} rows left in the spool for next start")
+                self._pending.clear()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({"pending": len(self._pending), "max_pending": self.max_pending,
+                          "segment": self._segment, "segment_bytes": self._offset})
+        return stats